@@ -11,6 +11,16 @@ from app.core.settings import settings
 from app.models.user import SQLModel
 from app.models.royalty import Royalty
 from app.models.portfolio import Portfolio
+from app.models.job import IngestJob
+from app.models.snapshot import RoyaltySnapshot
+from app.models.rollup import AccountRollup, PortfolioRollup
+from app.models.change import AccountChangeSeq, ChangeTombstone
+from app.models.royalty_import import RoyaltyImportRow
+from app.models.account_deletion import AccountDeletion
+from app.models.month_close import MonthClose
+from app.models.alert import Alert, AlertRule
+from app.models.idempotency import IdempotencyRecord
+from app.models import search  # noqa: F401  (pg_trgm extension and SQLite FTS5 search DDL)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,48 @@
+"""Add trigram search indexes for book titles and portfolio names
+
+Revision ID: 0a7e4d93c5f2
+Revises: f3d8a2c6b190
+Create Date: 2026-10-19 18:22:47.630158
+
+Postgres gets pg_trgm GIN indexes on the base tables. SQLite gets the FTS5
+title_search table, the triggers that keep it in sync, and a backfill.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.models.search import SQLITE_SEARCH_BACKFILL, SQLITE_SEARCH_DDL, SQLITE_SEARCH_DROP
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7e4d93c5f2'
+down_revision: Union[str, None] = 'f3d8a2c6b190'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_TRIGGERS = [
+    'royalty_search_insert', 'royalty_search_update', 'royalty_search_delete',
+    'portfolio_search_insert', 'portfolio_search_update', 'portfolio_search_delete',
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_royalty_book_title_trgm', 'royalty', ['book_title'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'book_title': 'gin_trgm_ops'})
+        op.create_index('ix_portfolio_name_trgm', 'portfolio', ['portfolio_name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'portfolio_name': 'gin_trgm_ops'})
+    elif op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL + SQLITE_SEARCH_BACKFILL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_portfolio_name_trgm', table_name='portfolio')
+        op.drop_index('ix_royalty_book_title_trgm', table_name='royalty')
+    elif op.get_bind().dialect.name == 'sqlite':
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for statement in SQLITE_SEARCH_DROP:
+            op.execute(statement)
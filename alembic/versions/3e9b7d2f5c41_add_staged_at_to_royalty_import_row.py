@@ -0,0 +1,29 @@
+"""Add staged_at to royalty_import_row
+
+Revision ID: 3e9b7d2f5c41
+Revises: b7e4a1c9d352
+Create Date: 2026-10-19 22:41:07.318552
+
+Staged batches are now committed while the report streams in, so rows can outlive
+a crashed import; staged_at lets later imports clear them. Rows present before this
+migration were left behind by failed imports and are dropped.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3e9b7d2f5c41'
+down_revision: Union[str, None] = 'b7e4a1c9d352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM royalty_import_row')
+    op.add_column('royalty_import_row', sa.Column('staged_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('royalty_import_row', 'staged_at')
@@ -0,0 +1,36 @@
+"""Hash-partition royalty and portfolio by account_identifier
+
+Revision ID: 6b2f8e1d4a93
+Revises: 0a7e4d93c5f2
+Create Date: 2026-10-19 19:05:12.418320
+
+Only runs on Postgres with PARTITION_COUNT > 0; the tables are copied into
+partitioned replacements (composite primary keys, composite royalty -> portfolio
+foreign key) and swapped in. Otherwise this revision is a no-op.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.core.settings import settings
+from app.db.partitioning import convert_to_partitioned, convert_to_unpartitioned
+
+# revision identifiers, used by Alembic.
+revision: str = '6b2f8e1d4a93'
+down_revision: Union[str, None] = '0a7e4d93c5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql' or settings.PARTITION_COUNT <= 0:
+        return
+    for statement in convert_to_partitioned(settings.PARTITION_COUNT):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql' or settings.PARTITION_COUNT <= 0:
+        return
+    for statement in convert_to_unpartitioned():
+        op.execute(statement)
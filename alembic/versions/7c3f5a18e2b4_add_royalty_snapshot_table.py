@@ -0,0 +1,44 @@
+"""Add royalty_snapshot table
+
+Revision ID: 7c3f5a18e2b4
+Revises: 4b7e2c91d0a3
+Create Date: 2026-10-19 11:40:07.562910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3f5a18e2b4'
+down_revision: Union[str, None] = '4b7e2c91d0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('royalty_snapshot',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('book_title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('captured_at', sa.DateTime(), nullable=False),
+    sa.Column('ebook_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('print_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('kenp_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('total_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('total_royalties_usd', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_royalty_snapshot_account_captured', 'royalty_snapshot', ['account_identifier', 'captured_at'], unique=False)
+    op.create_index('ix_royalty_snapshot_account_title_captured', 'royalty_snapshot', ['account_identifier', 'book_title', 'captured_at'], unique=False)
+    op.create_index('ix_royalty_snapshot_captured_brin', 'royalty_snapshot', ['captured_at'], unique=False, postgresql_using='brin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_royalty_snapshot_captured_brin', table_name='royalty_snapshot')
+    op.drop_index('ix_royalty_snapshot_account_title_captured', table_name='royalty_snapshot')
+    op.drop_index('ix_royalty_snapshot_account_captured', table_name='royalty_snapshot')
+    op.drop_table('royalty_snapshot')
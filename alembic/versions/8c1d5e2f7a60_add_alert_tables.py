@@ -0,0 +1,54 @@
+"""Add alert_rule and alert tables
+
+Revision ID: 8c1d5e2f7a60
+Revises: 6b2f8e1d4a93
+Create Date: 2026-10-19 19:41:30.552817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d5e2f7a60'
+down_revision: Union[str, None] = '6b2f8e1d4a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('alert_rule',
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('threshold', sa.Float(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alert_rule_account_identifier'), 'alert_rule', ['account_identifier'], unique=False)
+    op.create_table('alert',
+    sa.Column('rule_id', sa.Integer(), nullable=False),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('subject_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('subject_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('reference', sa.Float(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('triggered_at', sa.DateTime(), nullable=False),
+    sa.Column('resolved_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alert_account_status', 'alert', ['account_identifier', 'status'], unique=False)
+    op.create_index('ix_alert_rule_subject', 'alert', ['rule_id', 'subject_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alert_rule_subject', table_name='alert')
+    op.drop_index('ix_alert_account_status', table_name='alert')
+    op.drop_table('alert')
+    op.drop_index(op.f('ix_alert_rule_account_identifier'), table_name='alert_rule')
+    op.drop_table('alert_rule')
@@ -0,0 +1,56 @@
+"""Add account_rollup and portfolio_rollup tables
+
+Revision ID: a91d4e6f3c27
+Revises: 7c3f5a18e2b4
+Create Date: 2026-10-19 14:02:55.104387
+
+Run `python -m scripts.rebuild_rollups` once after upgrading to populate them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91d4e6f3c27'
+down_revision: Union[str, None] = '7c3f5a18e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _totals_columns():
+    return [
+        sa.Column('ebook_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('print_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('kenp_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('total_royalties', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('total_royalties_usd', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('spend', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('title_count', sa.Integer(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table('account_rollup',
+    *_totals_columns(),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('portfolio_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('account_identifier')
+    )
+    op.create_table('portfolio_rollup',
+    *_totals_columns(),
+    sa.Column('portfolio_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('portfolio_id')
+    )
+    op.create_index(op.f('ix_portfolio_rollup_account_identifier'), 'portfolio_rollup', ['account_identifier'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_portfolio_rollup_account_identifier'), table_name='portfolio_rollup')
+    op.drop_table('portfolio_rollup')
+    op.drop_table('account_rollup')
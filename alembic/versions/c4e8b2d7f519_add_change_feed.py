@@ -0,0 +1,52 @@
+"""Add change sequence columns and tables for the change feed
+
+Revision ID: c4e8b2d7f519
+Revises: a91d4e6f3c27
+Create Date: 2026-10-19 15:20:41.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8b2d7f519'
+down_revision: Union[str, None] = 'a91d4e6f3c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('account_change_seq',
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('account_identifier')
+    )
+    op.create_table('change_tombstone',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('entity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_change_tombstone_account_seq', 'change_tombstone', ['account_identifier', 'change_seq'], unique=False)
+
+    # Existing rows start at sequence 0, i.e. they are only returned by a full (since=0) sync.
+    op.add_column('royalty', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('portfolio', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_royalty_account_change_seq', 'royalty', ['account_identifier', 'change_seq'], unique=False)
+    op.create_index('ix_portfolio_account_change_seq', 'portfolio', ['account_identifier', 'change_seq'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_portfolio_account_change_seq', table_name='portfolio')
+    op.drop_index('ix_royalty_account_change_seq', table_name='royalty')
+    op.drop_column('portfolio', 'change_seq')
+    op.drop_column('royalty', 'change_seq')
+    op.drop_index('ix_change_tombstone_account_seq', table_name='change_tombstone')
+    op.drop_table('change_tombstone')
+    op.drop_table('account_change_seq')
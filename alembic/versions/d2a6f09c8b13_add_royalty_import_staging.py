@@ -0,0 +1,42 @@
+"""Add royalty_import_row staging table for bulk CSV imports
+
+Revision ID: d2a6f09c8b13
+Revises: c4e8b2d7f519
+Create Date: 2026-10-19 16:05:12.774019
+
+The table is UNLOGGED on Postgres: rows only live inside one import transaction,
+so they do not need to survive a crash and skipping the WAL makes COPY faster.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6f09c8b13'
+down_revision: Union[str, None] = 'c4e8b2d7f519'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    prefixes = ['UNLOGGED'] if op.get_bind().dialect.name == 'postgresql' else []
+    op.create_table('royalty_import_row',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('import_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('book_title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('period_end', sa.DateTime(), nullable=False),
+    sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('currency', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    prefixes=prefixes,
+    )
+    op.create_index('ix_royalty_import_row_import', 'royalty_import_row', ['import_id', 'account_identifier'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_royalty_import_row_import', table_name='royalty_import_row')
+    op.drop_table('royalty_import_row')
@@ -0,0 +1,35 @@
+"""Add account_deletion table for background account purges
+
+Revision ID: e5b1c3a9d724
+Revises: d2a6f09c8b13
+Create Date: 2026-10-19 17:10:33.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c3a9d724'
+down_revision: Union[str, None] = 'd2a6f09c8b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('account_deletion',
+    sa.Column('account_identifier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=True),
+    sa.Column('royalties_deleted', sa.Integer(), nullable=False),
+    sa.Column('portfolios_deleted', sa.Integer(), nullable=False),
+    sa.Column('requested_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('account_identifier')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('account_deletion')
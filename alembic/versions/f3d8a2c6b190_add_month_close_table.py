@@ -0,0 +1,36 @@
+"""Add month_close table for the scheduled month-end close
+
+Revision ID: f3d8a2c6b190
+Revises: e5b1c3a9d724
+Create Date: 2026-10-19 17:48:05.119364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3d8a2c6b190'
+down_revision: Union[str, None] = 'e5b1c3a9d724'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('month_close',
+    sa.Column('month', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('timezone', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('cutoff', sa.DateTime(), nullable=False),
+    sa.Column('accounts', sa.Integer(), nullable=False),
+    sa.Column('updated_titles', sa.Integer(), nullable=False),
+    sa.Column('applied', sa.Boolean(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('month_close')
@@ -0,0 +1,49 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.api.deps import visible_account
+from app.db.session import get_session
+from app.crud import alert_crud, deletion_crud
+from app.models.alert import AlertRead, AlertRuleCreate, AlertRuleRead
+
+router = APIRouter()
+
+@router.post("/rules", response_model=AlertRuleRead, status_code=status.HTTP_201_CREATED)
+async def create_alert_rule(rule_create: AlertRuleCreate, session: AsyncSession = Depends(get_session)):
+    """
+    Adds a threshold rule for an account. Rules are evaluated at ingest time against the
+    rows each write changes; `spend_over_royalties` rules also check current portfolios once.
+    """
+    await deletion_crud.ensure_not_deleting(session, rule_create.account_identifier)
+    return await alert_crud.create_rule(session, rule_create)
+
+@router.get("/rules", response_model=List[AlertRuleRead])
+async def list_alert_rules(
+    account_identifier: str = Depends(visible_account),
+    session: AsyncSession = Depends(get_session),
+):
+    return await alert_crud.get_rules(session, account_identifier)
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_alert_rule(rule_id: int, session: AsyncSession = Depends(get_session)):
+    """
+    Deletes a rule and its alerts.
+    """
+    rule = await alert_crud.get_rule_by_id(session, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    await alert_crud.delete_rule(session, rule)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("", response_model=List[AlertRead])
+async def list_alerts(
+    account_identifier: str = Depends(visible_account),
+    status: Optional[Literal["active", "resolved"]] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Returns the account's alerts, newest first. Active alerts resolve by themselves
+    once a later write clears their condition.
+    """
+    return await alert_crud.get_alerts(session, account_identifier, status, limit)
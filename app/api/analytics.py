@@ -0,0 +1,45 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.api.deps import visible_account
+from app.db.session import get_session
+from app.crud import analytics_crud
+from app.schemas.analytics import PortfolioAnalytics, PortfolioProfitability
+
+router = APIRouter()
+
+@router.get("/portfolios", response_model=PortfolioAnalytics)
+async def get_portfolio_analytics(
+    account_identifier: str = Depends(visible_account),
+    sort_by: Literal["roas", "acos", "spend", "royalties", "title_count", "portfolio_name"] = "roas",
+    order: Literal["asc", "desc"] = "desc",
+    min_roas: Optional[float] = Query(default=None, ge=0),
+    max_roas: Optional[float] = Query(default=None, ge=0),
+    max_acos: Optional[float] = Query(default=None, ge=0),
+    min_spend: Optional[float] = Query(default=None, ge=0),
+    linked_only: bool = False,
+    limit: int = Query(default=500, ge=1, le=5000),
+    offset: int = Query(default=0, ge=0),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Per-portfolio ad spend against the royalties of linked books, with ROAS
+    (royalties / spend) and ACoS (spend / royalties, in percent).
+    """
+    rows = await analytics_crud.get_portfolio_profitability(
+        session,
+        account_identifier,
+        sort_by=sort_by,
+        descending=order == "desc",
+        min_roas=min_roas,
+        max_roas=max_roas,
+        max_acos=max_acos,
+        min_spend=min_spend,
+        linked_only=linked_only,
+        limit=limit,
+        offset=offset,
+    )
+    return PortfolioAnalytics(
+        account_identifier=account_identifier,
+        portfolios=[PortfolioProfitability.model_validate(row._mapping) for row in rows],
+    )
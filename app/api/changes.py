@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.api.deps import visible_account
+from app.db.session import get_session
+from app.crud import change_crud
+from app.schemas.changes import ChangeFeed
+
+router = APIRouter()
+
+@router.get("", response_model=ChangeFeed)
+async def get_changes(
+    account_identifier: str = Depends(visible_account),
+    since: int = Query(default=0, ge=0),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Returns the account's royalties and portfolios inserted or updated after the `since`
+    cursor and the IDs of those deleted after it. Start with since=0 (a full snapshot)
+    and pass the returned cursor on the next call.
+    """
+    return await change_crud.get_changes(session, account_identifier, since)
@@ -1,13 +1,21 @@
 import re
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.invalidation import LocalCache, invalidation_bus
+from app.core.settings import settings
 from app.db.session import get_session
-from app.crud import portfolio_crud, royalty_crud
-from app.schemas.dashboard import DashboardData, LinkedPortfolio
+from app.crud import deletion_crud, portfolio_crud, rollup_crud, royalty_crud
+from app.schemas.dashboard import AccountSummary, DashboardData, LinkedPortfolio
 from app.models.portfolio import PortfolioRead
+from app.services.change_stream import stream_changes
 
 router = APIRouter()
 
+# Account summaries keyed by account_identifier; evicted by every write to the account.
+summary_cache = LocalCache(invalidation_bus, "account", settings.SUMMARY_CACHE_SECONDS)
+
 def natural_sort_key(s):
     """
     A key for natural sorting. Extracts numbers from a string and returns them as integers.
@@ -41,3 +49,40 @@ async def get_dashboard_data(session: AsyncSession = Depends(get_session)):
         unlinked_royalties=unlinked_royalties,
         unlinked_portfolios=unlinked_portfolios,
     )
+
+@router.get("/summary", response_model=AccountSummary)
+async def get_account_summary(account_identifier: str, include_portfolios: bool = True, session: AsyncSession = Depends(get_session)):
+    """
+    Returns precomputed royalty and spend totals for an account (and each of its portfolios)
+    from the rollup tables, without reading individual royalty rows.
+    Responses are cached in-process until the account is written to.
+    """
+    cached = summary_cache.get(account_identifier, include_portfolios)
+    if cached is not None:
+        return cached
+    generation = summary_cache.generation(account_identifier)
+    if await deletion_crud.is_deleting(session, account_identifier):
+        raise HTTPException(status_code=404, detail="Account is being deleted")
+    account = await rollup_crud.get_account_rollup(session, account_identifier)
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    portfolios = await rollup_crud.get_portfolio_rollups(session, account_identifier) if include_portfolios else []
+    summary = AccountSummary(account=account, portfolios=portfolios)
+    summary_cache.set(account_identifier, summary, include_portfolios, generation)
+    return summary
+
+@router.get("/stream")
+async def stream_dashboard_changes(
+    account_identifier: str,
+    last_event_id: Optional[str] = Header(default=None),
+):
+    """
+    Server-sent events describing changes to an account's royalties, portfolios and links,
+    so clients can refetch only when something changed instead of polling the dashboard.
+    Reconnecting clients send Last-Event-ID to receive the events they missed.
+    """
+    return StreamingResponse(
+        stream_changes(account_identifier, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
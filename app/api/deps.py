@@ -0,0 +1,12 @@
+from fastapi import Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.crud import deletion_crud
+from app.db.session import get_session
+
+async def visible_account(account_identifier: str, session: AsyncSession = Depends(get_session)) -> str:
+    """
+    The `account_identifier` query parameter, or a 404 while the account is being deleted.
+    """
+    if await deletion_crud.is_deleting(session, account_identifier):
+        raise HTTPException(status_code=404, detail="Account is being deleted")
+    return account_identifier
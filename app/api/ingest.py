@@ -0,0 +1,134 @@
+"""
+Versioned ingest of rows the client has already extracted from the KDP pages.
+Skips HTML parsing entirely and feeds the same aggregation and upsert steps
+as the /parse endpoints.
+"""
+import time
+from contextlib import ExitStack
+from typing import AsyncIterator, List
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.crud import deletion_crud
+from app.db.session import get_session
+from app.schemas.ingest import AccountIngestV1, IngestBatchV1, IngestReportV1
+from app.services.html_stream import PayloadTooLarge, UnsupportedEncoding, iter_decompressed
+from app.services.ingest import ingest_structured
+from app.services.ingest_scheduler import ingest_scheduler
+
+router = APIRouter()
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+INGEST_V1_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": IngestBatchV1.model_json_schema()},
+            "application/x-ndjson": {
+                "schema": {"type": "string", "description": "One AccountIngestV1 object per line"},
+            },
+        },
+    }
+}
+
+async def _iter_lines(pieces: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Splits the body into lines. Each chunk is scanned once (from where the last scan
+    stopped), so a long line costs linear time; a line over `max_line_bytes` is rejected.
+    """
+    buffer = bytearray()
+    scanned = 0
+    async for piece in pieces:
+        buffer += piece
+        start = 0
+        while True:
+            end = buffer.find(b"\n", scanned)
+            if end == -1:
+                break
+            if end - start > max_line_bytes:
+                raise PayloadTooLarge(f"NDJSON line exceeds {max_line_bytes} bytes")
+            yield bytes(buffer[start:end])
+            start = scanned = end + 1
+        del buffer[:start]
+        scanned = len(buffer)
+        if scanned > max_line_bytes:
+            raise PayloadTooLarge(f"NDJSON line exceeds {max_line_bytes} bytes")
+    yield bytes(buffer)
+
+async def _read_ndjson(pieces: AsyncIterator[bytes]) -> List[AccountIngestV1]:
+    """
+    Validates each line as it arrives, so the raw body is never held in full.
+    """
+    accounts: List[AccountIngestV1] = []
+    seen = set()
+    line_number = 0
+    async for line in _iter_lines(pieces, settings.MAX_INGEST_LINE_BYTES):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            account = AccountIngestV1.model_validate_json(line)
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, "loc": ("body", line_number, *error["loc"])} for error in e.errors(include_url=False)
+            ])
+        if account.accountIdentifier in seen:
+            raise RequestValidationError([{
+                "type": "value_error", "loc": ("body", line_number, "accountIdentifier"),
+                "msg": f"Account {account.accountIdentifier} appears more than once", "input": account.accountIdentifier,
+            }])
+        seen.add(account.accountIdentifier)
+        accounts.append(account)
+    if not accounts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty NDJSON body")
+    return accounts
+
+async def _read_json(pieces: AsyncIterator[bytes]) -> List[AccountIngestV1]:
+    body = b"".join([piece async for piece in pieces])
+    try:
+        return IngestBatchV1.model_validate_json(body).accounts
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+@router.post("/v1", response_model=IngestReportV1, openapi_extra=INGEST_V1_OPENAPI)
+async def ingest_v1(request: Request, session: AsyncSession = Depends(get_session)):
+    """
+    Ingests pre-extracted royalty and portfolio rows for one or more accounts.
+    Send `{"accounts": [...]}` as JSON, or one account object per line as NDJSON;
+    gzip/deflate bodies are accepted. The whole body is validated, and no account may be
+    being deleted (409) or have a full ingest queue (429), before anything is written;
+    then each account is aggregated and upserted like an HTML ingest. Each account commits on its own: one that still fails
+    while writing is reported with an `error` and the other accounts are applied.
+    """
+    started = time.perf_counter()
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    pieces = iter_decompressed(request.stream(), request.headers.get("content-encoding"), settings.MAX_INGEST_BODY_BYTES)
+    try:
+        if media_type in NDJSON_MEDIA_TYPES:
+            accounts = await _read_ndjson(pieces)
+        else:
+            accounts = await _read_json(pieces)
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(e))
+    except UnsupportedEncoding as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    deleting = await deletion_crud.deleting_among(session, [account.accountIdentifier for account in accounts])
+    if deleting:
+        raise deletion_crud.AccountDeleting(deleting[0])
+
+    results = []
+    rows = 0
+    with ExitStack() as admitted:
+        for account in accounts:
+            admitted.enter_context(ingest_scheduler.admit(account.accountIdentifier))
+        for account in accounts:
+            rows += len(account.royalties or []) + len(account.portfolios or [])
+            results.append(await ingest_structured(session, account))
+    return IngestReportV1(accounts=results, rows=rows, seconds=round(time.perf_counter() - started, 3))
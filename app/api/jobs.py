@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.session import get_session
+from app.models.job import IngestJobRead
+from app.crud import job_crud
+
+router = APIRouter()
+
+@router.get("/{job_id}", response_model=IngestJobRead)
+async def get_job_status(job_id: int, session: AsyncSession = Depends(get_session)):
+    """
+    Returns the status of a background ingest job.
+    """
+    job = await job_crud.get_job_by_id(session, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,77 +1,75 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
-from bs4 import BeautifulSoup
 
+from app.api.uploads import KDP_UPLOAD_OPENAPI, is_raw_upload, parse_raw_upload, read_json_payload, read_raw_upload, upload_account, upload_size
 from app.db.session import get_session
-from app.schemas.kdp import KDPPayload
+from app.models.account_deletion import AccountDeletionRead
+from app.models.job import IngestJobRead
 from app.models.portfolio import PortfolioRead
-from app.crud import portfolio_crud, royalty_crud
+from app.crud import deletion_crud, job_crud, portfolio_crud
+from app.services.export import EXPORT_FORMATS, export_portfolios
+from app.services.capture import capture_payload
+from app.services.ingest import extract_portfolio_rows_from_tree, ingest_portfolio_rows, ingest_portfolios
+from app.services.ingest_scheduler import ingest_scheduler
 
 router = APIRouter()
 
-@router.post("/parse_portfolios", response_model=List[PortfolioRead])
-async def parse_portfolio_html(payload: KDPPayload, session: AsyncSession = Depends(get_session)):
+@router.post(
+    "/parse_portfolios",
+    response_model=List[PortfolioRead],
+    responses={202: {"model": IngestJobRead, "description": "Payload queued for background processing"}},
+    openapi_extra=KDP_UPLOAD_OPENAPI,
+)
+async def parse_portfolio_html(
+    request: Request,
+    background: bool = False,
+    account_identifier: Optional[str] = None,
+    x_account_identifier: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+):
     """
     This endpoint receives raw Advertising Portfolio HTML,
     parses it, extracts a list of portfolio names and their spend, and saves it to the database.
+    The HTML comes either as a JSON KDPPayload or as a raw text/html body (optionally gzip or
+    deflate encoded) with the account in `account_identifier` or the X-Account-Identifier header;
+    raw bodies are parsed incrementally while they upload.
+    With `background=true` the payload is queued and a 202 with the job is returned immediately.
     """
-    print(f"Received Portfolio HTML from account: {payload.accountIdentifier}")
-    print("Starting Portfolio HTML parsing...")
-
-    soup = BeautifulSoup(payload.htmlContent, 'lxml')
-
-    try:
-        extracted_data = []
-
-        name_elements = soup.select('a[data-e2e-id="entityNameRenderer"]')
-        spend_elements = soup.select('div[data-e2e-id="tableCell_cell_spend"] div[data-e2e-id="currencyRenderer"]')
-
-        if not name_elements:
-            print("Warning: No portfolio names found with selector 'a[data-e2e-id=\"entityNameRenderer\"]'")
-        if not spend_elements:
-             print("Warning: No spend values found with selector 'div[data-e2e-id=\"tableCell_cell_spend\"] div[data-e2e-id=\"currencyRenderer\"]'")
-
-        for name_tag, spend_tag in zip(name_elements, spend_elements):
-            name = name_tag.get_text(strip=True)
-            spend = spend_tag.get_text(strip=True)
-
-            extracted_data.append({
-                "portfolio_name": name,
-                "spend": spend
-            })
-
-        print("Successfully extracted portfolio data:")
-        print(extracted_data)
-
-        # Aggregate data to handle duplicates
-        aggregated_data = {}
-        for item in extracted_data:
-            name = item['portfolio_name']
-            spend_str = item['spend'].replace('$', '').replace(',', '').strip()
-            try:
-                spend = float(spend_str)
-            except ValueError:
-                spend = 0.0
-            
-            if name in aggregated_data:
-                aggregated_data[name]['spend'] += spend
-            else:
-                aggregated_data[name] = {'portfolio_name': name, 'spend': spend}
-        
-        final_data = list(aggregated_data.values())
-        for item in final_data:
-            item['spend'] = f"${item['spend']:,.2f}"
-
-        print("Aggregated portfolio data:")
-        print(final_data)
-
-        portfolios = await portfolio_crud.upsert_portfolio_data(session, payload.accountIdentifier, final_data)
-        return portfolios
-
-    except Exception as e:
-        print(f"Error parsing Portfolio HTML: {e}")
-        raise HTTPException(status_code=500, detail=f"Error parsing Portfolio HTML: {str(e)}")
+    root = html_content = None
+    if is_raw_upload(request):
+        account = upload_account(account_identifier, x_account_identifier)
+        if background:
+            html_content = await read_raw_upload(request)
+        else:
+            root = await parse_raw_upload(request)
+    else:
+        payload = await read_json_payload(request)
+        account, html_content = payload.accountIdentifier, payload.htmlContent
+    await capture_payload("portfolios", account, html_content, root)
+
+    if background:
+        job = await job_crud.enqueue_job(session, "portfolios", account, html_content)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(IngestJobRead.model_validate(job)),
+        )
+
+    with ingest_scheduler.admit(account):
+        try:
+            if root is not None:
+                return await ingest_portfolio_rows(session, account, extract_portfolio_rows_from_tree(root), upload_size(request))
+            portfolios = await ingest_portfolios(session, account, html_content)
+            return portfolios
+
+        except deletion_crud.AccountDeleting:
+            raise
+        except Exception as e:
+            print(f"Error parsing Portfolio HTML: {e}")
+            raise HTTPException(status_code=500, detail=f"Error parsing Portfolio HTML: {str(e)}")
 
 @router.get("/portfolios", response_model=List[PortfolioRead])
 async def get_portfolios(session: AsyncSession = Depends(get_session)):
@@ -85,16 +83,46 @@ async def get_portfolios(session: AsyncSession = Depends(get_session)):
         print(f"Error fetching portfolios: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching portfolios: {str(e)}")
 
-
-@router.delete("/portfolios/{account_identifier}")
+@router.get("/portfolios/export")
+async def export_portfolio_data(
+    format: Literal["csv", "ndjson"] = "csv",
+    account_identifier: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Streams portfolios as CSV or NDJSON, optionally limited to one account and an updated_at range.
+    """
+    rows = export_portfolios(
+        session, format,
+        account_identifier=account_identifier, updated_since=updated_since, updated_before=updated_before,
+    )
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="portfolios.{format}"'},
+    )
+
+@router.delete("/portfolios/{account_identifier}", status_code=status.HTTP_202_ACCEPTED, response_model=AccountDeletionRead)
 async def delete_all_data_by_account_identifier(account_identifier: str, session: AsyncSession = Depends(get_session)):
     """
     Deletes all portfolio and royalty data for a given account identifier.
+    The account is hidden from reads and rejects ingests immediately; its rows are then
+    purged in small batches by a background job. Poll the /deletion endpoint for progress.
     """
     try:
-        await royalty_crud.delete_royalty_by_account_id(session, account_identifier)
-        await portfolio_crud.delete_portfolio_by_account_id(session, account_identifier)
-        return {"message": f"All data for account {account_identifier} has been deleted."}
+        return await deletion_crud.start_deletion(session, account_identifier)
     except Exception as e:
         print(f"Error deleting data for account {account_identifier}: {e}")
         raise HTTPException(status_code=500, detail=f"Error deleting data for account {account_identifier}: {str(e)}")
+
+@router.get("/portfolios/{account_identifier}/deletion", response_model=AccountDeletionRead)
+async def get_account_deletion(account_identifier: str, session: AsyncSession = Depends(get_session)):
+    """
+    Returns the status and progress of an account deletion.
+    """
+    deletion = await deletion_crud.get_deletion(session, account_identifier)
+    if not deletion:
+        raise HTTPException(status_code=404, detail="No deletion requested for this account")
+    return deletion
@@ -1,115 +1,104 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
-from bs4 import BeautifulSoup
 
+from app.api.uploads import KDP_UPLOAD_OPENAPI, is_raw_upload, parse_raw_upload, read_json_payload, read_raw_upload, upload_account, upload_size
+from app.api.deps import visible_account
 from app.db.session import get_session
-from app.schemas.kdp import KDPPayload
+from app.models.job import IngestJobRead
 from app.models.royalty import RoyaltyRead
-from app.crud import royalty_crud, portfolio_crud
+from app.crud import deletion_crud, job_crud, royalty_crud, portfolio_crud
+from app.schemas.history import RoyaltyHistory
+from app.schemas.imports import ImportReport
+from app.schemas.matching import MatchProposal
+from app.services.capture import capture_payload
+from app.services.csv_import import import_royalty_csv
+from app.services.export import EXPORT_FORMATS, export_royalties
+from app.services.history import build_history
+from app.services.ingest import extract_royalty_rows_from_tree, ingest_royalties, ingest_royalty_rows
+from app.services.ingest_scheduler import ingest_scheduler
+from app.services.matcher import match_account
 
 router = APIRouter()
 
 class LinkPortfolioRequest(SQLModel):
     portfolio_id: int
 
-@router.post("/parse", response_model=List[RoyaltyRead])
-async def parse_kdp_html(payload: KDPPayload, session: AsyncSession = Depends(get_session)):
+class RoyaltyPortfolioPair(SQLModel):
+    royalty_id: int
+    portfolio_id: int
+
+class BulkLinkRequest(SQLModel):
+    links: List[RoyaltyPortfolioPair]
+
+@router.post(
+    "/parse",
+    response_model=List[RoyaltyRead],
+    responses={202: {"model": IngestJobRead, "description": "Payload queued for background processing"}},
+    openapi_extra=KDP_UPLOAD_OPENAPI,
+)
+async def parse_kdp_html(
+    request: Request,
+    background: bool = False,
+    account_identifier: Optional[str] = None,
+    x_account_identifier: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+):
     """
     This endpoint receives raw KDP Royalties Estimator HTML,
     parses it, extracts the tabular data, and saves it to the database.
+    The HTML comes either as a JSON KDPPayload or as a raw text/html body (optionally gzip or
+    deflate encoded) with the account in `account_identifier` or the X-Account-Identifier header;
+    raw bodies are parsed incrementally while they upload.
+    With `background=true` the payload is queued and a 202 with the job is returned immediately.
     """
-    print(f"Received HTML from account: {payload.accountIdentifier}")
-    print("Starting HTML parsing...")
-    print(payload.htmlContent[:500])  # Print the first 500 characters for debugging
+    root = html_content = None
+    if is_raw_upload(request):
+        account = upload_account(account_identifier, x_account_identifier)
+        if background:
+            html_content = await read_raw_upload(request)
+        else:
+            root = await parse_raw_upload(request)
+    else:
+        payload = await read_json_payload(request)
+        account, html_content = payload.accountIdentifier, payload.htmlContent
+    await capture_payload("royalties", account, html_content, root)
 
-    soup = BeautifulSoup(payload.htmlContent, 'lxml')
+    if background:
+        job = await job_crud.enqueue_job(session, "royalties", account, html_content)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(IngestJobRead.model_validate(job)),
+        )
 
-    try:
-        extracted_data = []
-
-        table_rows = soup.select("div.ui.items.no-margin.unstackable > div.item")
-
-        for row in table_rows:
-            if not row.select_one("img"):
-                print("Skipping summary row...")
-                continue
-
-            title_element = row.select_one(".truncate-overflow")
-            title = title_element.get_text(strip=True) if title_element else "Title Not Found"
-
-            def clean_royalty_value(value):
-                return value.replace('$', '').replace(',', '').strip()
-
-            # More specific selectors to target each royalty value individually
-            royalty_values = row.select(".sixteen.wide.computer.column .row .right.aligned.column")
-
-            if len(royalty_values) >= 5:
-                ebook_royalties = clean_royalty_value(royalty_values[0].get_text(strip=True))
-                print_royalties = clean_royalty_value(royalty_values[1].get_text(strip=True))
-                kenp_royalties = clean_royalty_value(royalty_values[2].get_text(strip=True))
-                total_royalties = clean_royalty_value(royalty_values[3].get_text(strip=True))
-                total_royalties_usd = clean_royalty_value(royalty_values[4].get_text(strip=True))
-            else:
-                ebook_royalties, print_royalties, kenp_royalties, total_royalties, total_royalties_usd = ["0.00"] * 5
-
-            extracted_data.append({
-                "bookTitle": title,
-                "eBookRoyalties": ebook_royalties,
-                "printRoyalties": print_royalties,
-                "kenpRoyalties": kenp_royalties,
-                "totalRoyalties": total_royalties,
-                "totalRoyaltiesUSD": total_royalties_usd,
-            })
-
-        print("Successfully extracted data:")
-        print(extracted_data)
-
-        # Aggregate data to handle duplicates
-        aggregated_data = {}
-        for item in extracted_data:
-            title = item['bookTitle']
-            
-            def to_float(value):
-                try:
-                    return float(value)
-                except (ValueError, TypeError):
-                    return 0.0
-
-            if title in aggregated_data:
-                aggregated_data[title]['eBookRoyalties'] += to_float(item['eBookRoyalties'])
-                aggregated_data[title]['printRoyalties'] += to_float(item['printRoyalties'])
-                aggregated_data[title]['kenpRoyalties'] += to_float(item['kenpRoyalties'])
-                aggregated_data[title]['totalRoyalties'] += to_float(item['totalRoyalties'])
-                aggregated_data[title]['totalRoyaltiesUSD'] += to_float(item['totalRoyaltiesUSD'])
-            else:
-                aggregated_data[title] = {
-                    'bookTitle': title,
-                    'eBookRoyalties': to_float(item['eBookRoyalties']),
-                    'printRoyalties': to_float(item['printRoyalties']),
-                    'kenpRoyalties': to_float(item['kenpRoyalties']),
-                    'totalRoyalties': to_float(item['totalRoyalties']),
-                    'totalRoyaltiesUSD': to_float(item['totalRoyaltiesUSD']),
-                }
-
-        final_data = list(aggregated_data.values())
-        for item in final_data:
-            item['eBookRoyalties'] = f"{item['eBookRoyalties']:.2f}"
-            item['printRoyalties'] = f"{item['printRoyalties']:.2f}"
-            item['kenpRoyalties'] = f"{item['kenpRoyalties']:.2f}"
-            item['totalRoyalties'] = f"{item['totalRoyalties']:.2f}"
-            item['totalRoyaltiesUSD'] = f"{item['totalRoyaltiesUSD']:.2f}"
-
-        print("Aggregated royalty data:")
-        print(final_data)
-
-        royalties = await royalty_crud.upsert_royalty_data(session, payload.accountIdentifier, final_data)
-        return royalties
+    with ingest_scheduler.admit(account):
+        try:
+            if root is not None:
+                return await ingest_royalty_rows(session, account, extract_royalty_rows_from_tree(root), upload_size(request))
+            royalties = await ingest_royalties(session, account, html_content)
+            return royalties
 
-    except Exception as e:
-        print(f"Error parsing HTML: {e}")
-        raise HTTPException(status_code=500, detail=f"Error parsing HTML: {str(e)}")
+        except deletion_crud.AccountDeleting:
+            raise
+        except Exception as e:
+            print(f"Error parsing HTML: {e}")
+            raise HTTPException(status_code=500, detail=f"Error parsing HTML: {str(e)}")
+
+@router.post("/import_csv", response_model=ImportReport)
+async def import_kdp_csv(account_identifier: str, request: Request, session: AsyncSession = Depends(get_session)):
+    """
+    Imports a KDP royalty report CSV sent as the raw request body. The body is parsed
+    as it streams in, so reports of hundreds of MB are never held in memory.
+    Monthly totals become royalty history and set each title's last_month_royalty.
+    """
+    try:
+        return await import_royalty_csv(session, account_identifier, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/", response_model=List[RoyaltyRead])
 async def get_royalties(session: AsyncSession = Depends(get_session)):
@@ -123,6 +112,47 @@ async def get_royalties(session: AsyncSession = Depends(get_session)):
         print(f"Error fetching royalties: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching royalties: {str(e)}")
 
+@router.get("/export")
+async def export_royalty_data(
+    format: Literal["csv", "ndjson"] = "csv",
+    account_identifier: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Streams royalties as CSV or NDJSON, optionally limited to one account and an updated_at range.
+    Rows are read through a server-side cursor, so exports of any size run in constant memory.
+    """
+    rows = export_royalties(
+        session, format,
+        account_identifier=account_identifier, updated_since=updated_since, updated_before=updated_before,
+    )
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="royalties.{format}"'},
+    )
+
+@router.get("/history", response_model=RoyaltyHistory)
+async def get_royalty_history(
+    account_identifier: str = Depends(visible_account),
+    book_title: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_titles: bool = True,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Returns royalty time series for an account (or a single title) over [start, end).
+    Defaults to the last 90 days.
+    """
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=90)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return await build_history(session, account_identifier, start, end, book_title, include_titles)
+
 @router.patch("/{royalty_id}/link", response_model=RoyaltyRead)
 async def link_royalty_to_portfolio(
     royalty_id: int,
@@ -158,3 +188,69 @@ async def unlink_royalty_from_portfolio(
 
     updated_royalty = await royalty_crud.unlink_portfolio(session, royalty)
     return updated_royalty
+
+
+async def _validate_bulk_links(session: AsyncSession, bulk_request: BulkLinkRequest, unlinking: bool) -> None:
+    """
+    Validates all pairs with two queries: every royalty and portfolio must exist and belong
+    to the same account. When unlinking, each royalty must currently be linked to the given portfolio.
+    """
+    royalty_ids = [pair.royalty_id for pair in bulk_request.links]
+    if len(set(royalty_ids)) != len(royalty_ids):
+        raise HTTPException(status_code=400, detail="Each royalty may appear only once per request")
+
+    royalty_states = await royalty_crud.get_royalty_link_states(session, royalty_ids)
+    missing_royalties = sorted(set(royalty_ids) - set(royalty_states))
+    if missing_royalties:
+        raise HTTPException(status_code=404, detail=f"Royalties not found: {missing_royalties}")
+
+    portfolio_ids = list({pair.portfolio_id for pair in bulk_request.links})
+    portfolio_accounts = await portfolio_crud.get_portfolio_accounts(session, portfolio_ids)
+    missing_portfolios = sorted(set(portfolio_ids) - set(portfolio_accounts))
+    if missing_portfolios:
+        raise HTTPException(status_code=404, detail=f"Portfolios not found: {missing_portfolios}")
+
+    for pair in bulk_request.links:
+        account_identifier, current_portfolio_id = royalty_states[pair.royalty_id]
+        if portfolio_accounts[pair.portfolio_id] != account_identifier:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Royalty {pair.royalty_id} and portfolio {pair.portfolio_id} belong to different accounts",
+            )
+        if unlinking and current_portfolio_id != pair.portfolio_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Royalty {pair.royalty_id} is not linked to portfolio {pair.portfolio_id}",
+            )
+
+@router.post("/link_bulk", response_model=List[RoyaltyRead])
+async def link_royalties_bulk(bulk_request: BulkLinkRequest, session: AsyncSession = Depends(get_session)):
+    """
+    Links many royalties to portfolios in one transaction.
+    """
+    await _validate_bulk_links(session, bulk_request, unlinking=False)
+    links = {pair.royalty_id: pair.portfolio_id for pair in bulk_request.links}
+    return await royalty_crud.set_portfolio_links(session, links)
+
+@router.post("/unlink_bulk", response_model=List[RoyaltyRead])
+async def unlink_royalties_bulk(bulk_request: BulkLinkRequest, session: AsyncSession = Depends(get_session)):
+    """
+    Unlinks many royalties from their portfolios in one transaction.
+    """
+    await _validate_bulk_links(session, bulk_request, unlinking=True)
+    links = {pair.royalty_id: None for pair in bulk_request.links}
+    return await royalty_crud.set_portfolio_links(session, links)
+
+@router.post("/match", response_model=List[MatchProposal])
+async def match_royalties_to_portfolios(
+    account_identifier: str = Depends(visible_account),
+    apply: bool = False,
+    min_score: float = Query(default=0.6, ge=0.0, le=1.0),
+    include_linked: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Proposes portfolio links for an account's royalties by matching book titles to portfolio names.
+    With `apply=true`, unambiguous proposals are linked immediately.
+    """
+    return await match_account(session, account_identifier, min_score, apply=apply, include_linked=include_linked)
@@ -0,0 +1,27 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.api.deps import visible_account
+from app.db.session import get_session
+from app.crud import search_crud
+from app.schemas.search import SearchResults
+
+router = APIRouter()
+
+SEARCH_KINDS = {"all": ("royalty", "portfolio"), "royalties": ("royalty",), "portfolios": ("portfolio",)}
+
+@router.get("", response_model=SearchResults)
+async def search(
+    q: str = Query(min_length=1, max_length=200),
+    account_identifier: str = Depends(visible_account),
+    kind: Literal["all", "royalties", "portfolios"] = "all",
+    fuzzy: bool = True,
+    limit: int = Query(default=20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Searches an account's book titles and portfolio names. Substring matches rank first;
+    with `fuzzy=true` near matches (typos, missing letters) follow, ordered by trigram similarity.
+    """
+    results = await search_crud.search_titles(session, account_identifier, q, SEARCH_KINDS[kind], fuzzy, limit)
+    return SearchResults(account_identifier=account_identifier, query=q, results=results)
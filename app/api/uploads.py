@@ -0,0 +1,91 @@
+"""
+Request body handling shared by the HTML parse endpoints, which accept either the
+JSON KDPPayload or the raw page as a text/html body (optionally gzip/deflate encoded).
+"""
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.core.settings import settings
+from app.schemas.kdp import KDPPayload
+from app.services.html_stream import PayloadTooLarge, UnsupportedEncoding, parse_html_stream, read_html_stream
+
+RAW_HTML_MEDIA_TYPES = ("text/html", "text/plain", "application/octet-stream")
+
+# Documents both accepted bodies, since the endpoints read the request themselves.
+KDP_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": KDPPayload.model_json_schema()},
+            "text/html": {"schema": {"type": "string"}},
+        },
+    }
+}
+
+def is_raw_upload(request: Request) -> bool:
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return media_type in RAW_HTML_MEDIA_TYPES
+
+def _charset(request: Request) -> Optional[str]:
+    for parameter in request.headers.get("content-type", "").split(";")[1:]:
+        name, _, value = parameter.strip().partition("=")
+        if name.lower() == "charset" and value:
+            return value.strip('"')
+    return None
+
+def upload_account(account_identifier: Optional[str], header_account_identifier: Optional[str]) -> str:
+    account = account_identifier or header_account_identifier
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Raw HTML uploads need an account_identifier query parameter or X-Account-Identifier header",
+        )
+    return account
+
+async def read_json_payload(request: Request) -> KDPPayload:
+    try:
+        return KDPPayload.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+def _check_declared_size(request: Request) -> None:
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_HTML_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail="HTML upload too large")
+
+async def _read_upload(request: Request, reader):
+    _check_declared_size(request)
+    try:
+        return await reader(
+            request.stream(),
+            request.headers.get("content-encoding"),
+            settings.MAX_HTML_UPLOAD_BYTES,
+            _charset(request),
+        )
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(e))
+    except UnsupportedEncoding as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+async def parse_raw_upload(request: Request):
+    """
+    Streams the body into lxml's incremental parser and returns the document root.
+    """
+    return await _read_upload(request, parse_html_stream)
+
+async def read_raw_upload(request: Request) -> str:
+    """
+    Decodes the body to text, for payloads queued as background jobs.
+    """
+    return await _read_upload(request, read_html_stream)
+
+def upload_size(request: Request) -> int:
+    """
+    Declared length of a streamed body, to weigh its ingest for scheduling (0 when chunked).
+    """
+    content_length = request.headers.get("content-length", "")
+    return int(content_length) if content_length.isdigit() else 0
@@ -0,0 +1,11 @@
+def parse_amount(value: str | None) -> float:
+    """
+    Parses a scraped money string such as "$1,234.56" or "6.00" into a float.
+    Blank or malformed values count as 0.
+    """
+    if value is None:
+        return 0.0
+    try:
+        return float(value.replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return 0.0
@@ -0,0 +1,146 @@
+import asyncio
+import secrets
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Set
+from app.core.invalidation import invalidation_bus
+from app.core.settings import settings
+from app.schemas.events import ChangeEvent
+
+class Subscription:
+    """
+    One listener's bounded queue of events for an account.
+    """
+
+    def __init__(self, account_identifier: str, queue_size: int):
+        self.account_identifier = account_identifier
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Set when events were dropped because the listener fell behind.
+        self.overflowed = False
+
+    def offer(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self) -> ChangeEvent:
+        return await self.queue.get()
+
+    def drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+
+class ChangeBroker:
+    """
+    Fan-out of account change events to this process's listeners.
+
+    Publishing is a dictionary lookup plus a non-blocking put per listener, so
+    thousands of idle subscribers cost one parked coroutine each and no database
+    work. Each published event is also handed to `relay`, which forwards it to the
+    other processes (see `receive`), so a listener gets every worker's changes.
+    A short per-account history lets reconnecting clients resume from the
+    last event id they saw; ids embed a per-process epoch, so ids from another
+    process or a previous run are recognized as unresumable (the client refetches).
+    """
+
+    def __init__(self, history_size: int, queue_size: int, relay: Optional[Callable[[dict], bool]] = None):
+        self.epoch = secrets.token_hex(4)
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self._sequence = 0
+        self._history: Dict[str, Deque[ChangeEvent]] = {}
+        self._evicted: Dict[str, int] = {}  # Newest sequence dropped from each account's history
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._relay = relay
+
+    @property
+    def sequence(self) -> int:
+        """
+        The sequence number of the most recently published event.
+        """
+        return self._sequence
+
+    def publish(self, account_identifier: str, event_type: str, data: dict) -> ChangeEvent:
+        event = self._deliver(account_identifier, event_type, data, datetime.utcnow())
+        if self._relay is not None:
+            message = {"account_identifier": account_identifier, "type": event_type, "data": data, "created_at": event.created_at}
+            if not self._relay(message):
+                # Too large to relay (long id lists): other processes' clients get a marker and refetch.
+                self._relay({**message, "data": {"truncated": True}})
+        return event
+
+    def receive(self, message: dict) -> None:
+        """
+        Delivers an event relayed from another process, under an id of this broker.
+        """
+        created_at = datetime.fromisoformat(message["created_at"]) if message.get("created_at") else datetime.utcnow()
+        self._deliver(message["account_identifier"], message["type"], message.get("data") or {}, created_at)
+
+    def _deliver(self, account_identifier: str, event_type: str, data: dict, created_at: datetime) -> ChangeEvent:
+        self._sequence += 1
+        event = ChangeEvent(
+            id=f"{self.epoch}-{self._sequence}",
+            account_identifier=account_identifier,
+            type=event_type,
+            data=data,
+            created_at=created_at,
+        )
+        history = self._history.setdefault(account_identifier, deque(maxlen=self.history_size))
+        if len(history) == self.history_size:
+            self._evicted[account_identifier] = self.sequence_of(history[0].id)
+        history.append(event)
+        for subscription in self._subscribers.get(account_identifier, ()):
+            subscription.offer(event)
+        return event
+
+    def subscribe(self, account_identifier: str) -> Subscription:
+        subscription = Subscription(account_identifier, self.queue_size)
+        self._subscribers.setdefault(account_identifier, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.account_identifier)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.account_identifier]
+
+    def subscriber_count(self, account_identifier: Optional[str] = None) -> int:
+        if account_identifier is not None:
+            return len(self._subscribers.get(account_identifier, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+    def sequence_of(self, event_id: Optional[str]) -> Optional[int]:
+        """
+        The sequence number of an id issued by this broker, or None.
+        """
+        if not event_id:
+            return None
+        epoch, _, sequence = event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def events_since(self, account_identifier: str, event_id: str) -> Optional[List[ChangeEvent]]:
+        """
+        Events for the account published after `event_id`, or None when the
+        history no longer reaches back that far (the client must refetch).
+        """
+        sequence = self.sequence_of(event_id)
+        if sequence is None:
+            return None
+        if self._evicted.get(account_identifier, 0) > sequence:
+            return None
+        history = self._history.get(account_identifier, ())
+        return [e for e in history if self.sequence_of(e.id) > sequence]
+
+CHANGE_RELAY = "change"
+
+change_broker = ChangeBroker(
+    settings.SSE_HISTORY_SIZE, settings.SSE_QUEUE_SIZE,
+    relay=lambda message: invalidation_bus.relay(CHANGE_RELAY, message),
+)
+invalidation_bus.add_relay_handler(CHANGE_RELAY, change_broker.receive)
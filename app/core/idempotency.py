@@ -0,0 +1,365 @@
+"""
+Idempotency-Key support for write requests.
+
+A POST/PUT/PATCH/DELETE carrying an Idempotency-Key header is executed at most once
+per key and caller: the first request claims the key and its response is stored for
+IDEMPOTENCY_TTL_SECONDS; a retry with the same key and the same request replays the
+stored response (with an Idempotent-Replayed header) without running the endpoint,
+and a duplicate arriving while the original is still running waits for it (up to
+IDEMPOTENCY_WAIT_SECONDS, then 409). Reusing a key for a different request is a 422.
+While the original runs, its claim is a lease of IDEMPOTENCY_LEASE_SECONDS that the
+owner renews, so a slow request keeps its key however long it takes, and the key of a
+crashed one frees up once the lease runs out. Responses with a 5xx or 429 status are
+not stored, so those retries run again. Keyed requests are buffered to fingerprint them,
+so their bodies are limited to IDEMPOTENCY_MAX_REQUEST_BYTES (413 above that).
+Keys are scoped to the caller (see caller_identity), so two clients that happen to pick
+the same key never see each other's responses.
+
+The "database" store keeps claims in the idempotency_record table and so covers every
+worker and replica; the "memory" store only covers one process.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.responses import JSONResponse
+
+from app.core.settings import settings
+from app.db.dialect import upsert_insert
+from app.db.session import acquire_writer, engine
+from app.models.idempotency import IdempotencyRecord
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+DATABASE_POLL_SECONDS = 0.2
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+class Claim(NamedTuple):
+    owner: bool  # True: this request claimed the key and must run
+    fingerprint: str  # Fingerprint of the request that holds the key
+    response: Optional[StoredResponse]  # Set once that request has finished
+
+@dataclass
+class _MemoryEntry:
+    fingerprint: str
+    expires_at: float
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    response: Optional[StoredResponse] = None
+
+class MemoryIdempotencyStore:
+    """
+    Claims and responses in a dictionary; waiting duplicates park on an event.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _MemoryEntry] = {}
+        self._next_sweep = 0.0
+
+    def _sweep(self, now: float) -> None:
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + 60
+        for key in [key for key, entry in self._entries.items() if entry.expires_at < now]:
+            del self._entries[key]
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < now:
+            self._entries[key] = _MemoryEntry(fingerprint, now + settings.IDEMPOTENCY_LEASE_SECONDS)
+            return Claim(True, fingerprint, None)
+        return Claim(False, entry.fingerprint, entry.response)
+
+    async def wait(self, key: str, timeout: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        try:
+            await asyncio.wait_for(entry.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def renew(self, key: str, fingerprint: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.fingerprint == fingerprint and entry.response is None:
+            entry.expires_at = time.monotonic() + settings.IDEMPOTENCY_LEASE_SECONDS
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.fingerprint != fingerprint:
+            return
+        entry.response = response
+        entry.expires_at = time.monotonic() + settings.IDEMPOTENCY_TTL_SECONDS
+        entry.done.set()
+
+    async def release(self, key: str, fingerprint: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.fingerprint == fingerprint and entry.response is None:
+            del self._entries[key]
+            entry.done.set()
+
+class DatabaseIdempotencyStore:
+    """
+    Claims with INSERT ... ON CONFLICT DO NOTHING; waiting duplicates poll the record.
+    A pending claim is a lease the owner renews, so a crashed original does not block
+    its key for the whole TTL. Expired records are swept once a minute.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._next_sweep = 0.0
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            await acquire_writer(session)
+            now = datetime.utcnow()
+            expired = IdempotencyRecord.expires_at < now
+            if time.monotonic() >= self._next_sweep:
+                self._next_sweep = time.monotonic() + 60
+                await session.exec(delete(IdempotencyRecord).where(expired))
+            else:
+                await session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.key == key, expired))
+            statement = upsert_insert(session, IdempotencyRecord).values(
+                key=key, fingerprint=fingerprint, status="pending", created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+            ).on_conflict_do_nothing(index_elements=["key"]).returning(IdempotencyRecord.key)
+            claimed = (await session.exec(statement)).first() is not None
+            record = None if claimed else (await session.exec(select(IdempotencyRecord).where(IdempotencyRecord.key == key))).first()
+            await session.commit()
+        if claimed:
+            return Claim(True, fingerprint, None)
+        if record is None:
+            # Released between the insert and the read: report it as in flight, the caller retries.
+            return Claim(False, fingerprint, None)
+        response = None
+        if record.status == "done":
+            response = StoredResponse(
+                record.status_code,
+                [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers)],
+                record.body,
+            )
+        return Claim(False, record.fingerprint, response)
+
+    async def wait(self, key: str, timeout: float) -> None:
+        await asyncio.sleep(min(DATABASE_POLL_SECONDS, timeout))
+
+    async def renew(self, key: str, fingerprint: str) -> None:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            await acquire_writer(session)
+            await session.exec(
+                update(IdempotencyRecord)
+                .where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.fingerprint == fingerprint,
+                    IdempotencyRecord.status == "pending",
+                )
+                .values(expires_at=datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS))
+            )
+            await session.commit()
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        headers = json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.headers])
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            await acquire_writer(session)
+            await session.exec(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.key == key, IdempotencyRecord.fingerprint == fingerprint)
+                .values(
+                    status="done", status_code=response.status_code, headers=headers, body=response.body,
+                    expires_at=datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+                )
+            )
+            await session.commit()
+
+    async def release(self, key: str, fingerprint: str) -> None:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            await acquire_writer(session)
+            await session.exec(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.fingerprint == fingerprint,
+                    IdempotencyRecord.status == "pending",
+                )
+            )
+            await session.commit()
+
+idempotency_store = None
+
+def get_idempotency_store():
+    global idempotency_store
+    if idempotency_store is None:
+        if settings.IDEMPOTENCY_BACKEND == "memory":
+            idempotency_store = MemoryIdempotencyStore()
+        else:
+            idempotency_store = DatabaseIdempotencyStore(engine)
+    return idempotency_store
+
+def request_fingerprint(scope: dict, body: bytes) -> str:
+    digest = hashlib.sha256()
+    headers = dict(scope["headers"])
+    for part in (
+        scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""),
+        headers.get(b"content-type", b""), headers.get(b"content-encoding", b""),
+    ):
+        digest.update(part)
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+def caller_identity(scope: dict) -> str:
+    """
+    Hash of who is calling: the Authorization header and the account named in the
+    `account_identifier` query parameter or X-Account-Identifier header.
+    """
+    headers = dict(scope["headers"])
+    credentials = headers.get(b"authorization", b"").decode("latin-1")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    account = query.get("account_identifier", [""])[0] or headers.get(b"x-account-identifier", b"").decode("latin-1")
+    digest = hashlib.sha256()
+    for part in (credentials, account):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+async def _read_body(receive, max_bytes: int) -> Optional[bytes]:
+    """
+    The whole request body, or None once it grows past `max_bytes`.
+    """
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if size > max_bytes:
+            return None
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware applying Idempotency-Key semantics to write requests (see the module docstring).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            return await self.app(scope, receive, send)
+        raw_key = dict(scope["headers"]).get(b"idempotency-key")
+        if raw_key is None:
+            return await self.app(scope, receive, send)
+        if not raw_key.strip() or len(raw_key) > MAX_KEY_LENGTH:
+            response = JSONResponse(status_code=400, content={"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"})
+            return await response(scope, receive, send)
+
+        # The body is buffered to fingerprint and replay it, so keyed requests are capped;
+        # streamed uploads (raw /parse, /import_csv) larger than that must be sent without a key.
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        too_large = content_length.isdigit() and int(content_length) > settings.IDEMPOTENCY_MAX_REQUEST_BYTES
+        body = None if too_large else await _read_body(receive, settings.IDEMPOTENCY_MAX_REQUEST_BYTES)
+        if body is None:
+            response = JSONResponse(status_code=413, content={
+                "detail": f"Requests with an Idempotency-Key are limited to {settings.IDEMPOTENCY_MAX_REQUEST_BYTES} bytes",
+            })
+            return await response(scope, receive, send)
+        fingerprint = request_fingerprint(scope, body)
+        key = f"{scope['method']} {scope['path']} {caller_identity(scope)} {raw_key.decode('latin-1').strip()}"
+        store = get_idempotency_store()
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            claim = await store.claim(key, fingerprint)
+            if claim.owner:
+                break
+            if claim.fingerprint != fingerprint:
+                response = JSONResponse(status_code=422, content={"detail": "Idempotency-Key was already used for a different request"})
+                return await response(scope, receive, send)
+            if claim.response is not None:
+                return await self._replay(claim.response, send)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                response = JSONResponse(status_code=409, content={"detail": "A request with this Idempotency-Key is still in progress"})
+                return await response(scope, receive, send)
+            await store.wait(key, remaining)
+
+        await self._run_and_store(scope, body, receive, send, store, key, fingerprint)
+
+    async def _replay(self, response: StoredResponse, send) -> None:
+        await send({"type": "http.response.start", "status": response.status_code, "headers": response.headers + [REPLAYED_HEADER]})
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _renew(self, store, key: str, fingerprint: str, done: asyncio.Event) -> None:
+        """
+        Keeps the claim's lease alive until `done` is set.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(done.wait(), settings.IDEMPOTENCY_LEASE_SECONDS / 3)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await store.renew(key, fingerprint)
+            except Exception as e:
+                print(f"Error renewing idempotency claim {key}: {e}")
+
+    async def _run_and_store(self, scope, body: bytes, receive, send, store, key: str, fingerprint: str) -> None:
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        started: dict = {}
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                started.update(status=message["status"], headers=list(message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        done = asyncio.Event()
+        renewer = asyncio.create_task(self._renew(store, key, fingerprint, done))
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await store.release(key, fingerprint)
+            raise
+        finally:
+            # Stopped between renewals rather than cancelled, so it never abandons a write mid-transaction.
+            done.set()
+            await renewer
+        if started and started["status"] < 500 and started["status"] != 429 and size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+            await store.complete(key, fingerprint, StoredResponse(started["status"], started["headers"], b"".join(chunks)))
+        else:
+            await store.release(key, fingerprint)
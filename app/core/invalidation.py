@@ -0,0 +1,214 @@
+"""
+Cross-process cache invalidation.
+
+Write paths call `invalidation_bus.publish(session, scope, key)` before they
+commit. When the transaction commits, local caches are evicted right away and,
+on Postgres, a NOTIFY queued in the same transaction reaches every other process
+listening on the channel (other uvicorn workers and replicas). Rolled back
+transactions publish nothing. On SQLite the bus is a pure in-process loopback.
+
+The listener's connection also relays other small messages between processes
+(`relay`), such as change stream events, which are published after the commit.
+"""
+import asyncio
+import json
+import secrets
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+
+_PENDING_KEY = "pending_invalidations"
+
+# handler(scope, key); scope and key are None when everything must be evicted.
+InvalidationHandler = Callable[[Optional[str], Optional[str]], None]
+
+NOTIFY_PAYLOAD_LIMIT = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+class InvalidationBus:
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.origin = secrets.token_hex(8)  # Lets the listener skip this process's own notifications
+        self._handlers: List[InvalidationHandler] = []
+        self._relay_handlers: Dict[str, Callable[[dict], None]] = {}
+        self._outbox: Optional[asyncio.Queue] = None  # Set while the listener is connected
+
+    def add_handler(self, handler: InvalidationHandler) -> None:
+        self._handlers.append(handler)
+
+    def remove_handler(self, handler: InvalidationHandler) -> None:
+        self._handlers.remove(handler)
+
+    def add_relay_handler(self, kind: str, handler: Callable[[dict], None]) -> None:
+        self._relay_handlers[kind] = handler
+
+    def relay(self, kind: str, body: dict) -> bool:
+        """
+        Sends `body` to the `kind` handler of every other process, outside any transaction.
+        Best effort: nothing is sent while the listener is disconnected (or on SQLite).
+        Returns False when the body is too large for a notification.
+        """
+        payload = json.dumps({"origin": self.origin, "relay": kind, "body": body}, default=str)
+        if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_LIMIT:
+            return False
+        if self._outbox is not None:
+            self._outbox.put_nowait(payload)
+        return True
+
+    async def _send_relayed(self, connection: Any, outbox: asyncio.Queue) -> None:
+        # One sender per connection: asyncpg runs one query at a time, and this keeps the order.
+        while True:
+            payload = await outbox.get()
+            try:
+                await connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except Exception as e:
+                print(f"Relay send error: {e}")
+
+    def deliver(self, scope: Optional[str], key: Optional[str]) -> None:
+        for handler in list(self._handlers):
+            try:
+                handler(scope, key)
+            except Exception as e:
+                print(f"Invalidation handler error: {e}")
+
+    async def publish(self, session: AsyncSession, scope: str, key: str) -> None:
+        """
+        Queues an invalidation that takes effect only if the session's transaction commits.
+        """
+        session.info.setdefault(_PENDING_KEY, []).append((scope, key))
+        if session.bind.dialect.name == "postgresql":
+            payload = json.dumps({"origin": self.origin, "scope": scope, "key": key})
+            await session.exec(select(func.pg_notify(self.channel, payload)))
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") == self.origin:
+            return
+        if "relay" in message:
+            handler = self._relay_handlers.get(message["relay"])
+            if handler is not None:
+                try:
+                    handler(message.get("body") or {})
+                except Exception as e:
+                    print(f"Relay handler error: {e}")
+        else:
+            self.deliver(message.get("scope"), message.get("key"))
+
+    async def listen(self, dsn: str, stop: asyncio.Event, retry_seconds: float = 5.0) -> None:
+        """
+        Holds a dedicated asyncpg connection LISTENing on the channel until `stop` is set,
+        reconnecting after failures. Every (re)connect evicts all local entries, since
+        notifications sent while disconnected are lost.
+        """
+        import asyncpg
+
+        while not stop.is_set():
+            connection = sender = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                self.deliver(None, None)
+                self._outbox = asyncio.Queue()
+                sender = asyncio.create_task(self._send_relayed(connection, self._outbox))
+                print(f"Listening for cache invalidations on '{self.channel}'.")
+                waiters = [asyncio.create_task(stop.wait()), asyncio.create_task(lost.wait())]
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+                if not stop.is_set():
+                    print("Invalidation listener connection lost; reconnecting.")
+            except Exception as e:
+                print(f"Invalidation listener error: {e}")
+            finally:
+                self._outbox = None
+                if sender is not None:
+                    sender.cancel()
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            if not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=retry_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+class LocalCache:
+    """
+    Small in-process cache whose entries are tagged with an invalidation scope and key
+    and evicted when the bus reports a write to them. The TTL bounds staleness if a
+    notification is ever missed.
+
+    Every invalidation also bumps the key's generation. Callers read `generation(key)`
+    before computing a value and pass it to `set`, which drops the value if a write was
+    reported in between, so a result computed from pre-write data is never cached.
+    """
+
+    def __init__(self, bus: InvalidationBus, scope: str, ttl_seconds: float, max_entries: int = 10000):
+        self.scope = scope
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, Hashable], Tuple[float, Any]] = {}
+        self._generations: Dict[str, int] = {}
+        self._clears = 0  # Bumped by full evictions, which invalidate every key's generation
+        bus.add_handler(self._invalidate)
+
+    def get(self, key: str, variant: Hashable = None) -> Any:
+        entry = self._entries.get((key, variant))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop((key, variant), None)
+            return None
+        return value
+
+    def generation(self, key: str) -> Tuple[int, int]:
+        return self._clears, self._generations.get(key, 0)
+
+    def set(self, key: str, value: Any, variant: Hashable = None, generation: Optional[Tuple[int, int]] = None) -> None:
+        if generation is not None and generation != self.generation(key):
+            return  # Invalidated while the value was being computed
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[(key, variant)] = (time.monotonic() + self.ttl_seconds, value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+        self._clears += 1
+
+    def _invalidate(self, scope: Optional[str], key: Optional[str]) -> None:
+        if scope is None:
+            self.clear()
+        elif scope == self.scope:
+            if len(self._generations) >= self.max_entries:
+                self._generations.clear()
+                self._clears += 1
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[entry_key]
+
+def listener_dsn(database_url: str) -> str:
+    """
+    Converts the SQLAlchemy URL into a DSN asyncpg accepts.
+    """
+    return database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+invalidation_bus = InvalidationBus(settings.INVALIDATION_CHANNEL)
+
+@event.listens_for(Session, "after_commit")
+def _deliver_pending(session: Session) -> None:
+    for scope, key in session.info.pop(_PENDING_KEY, ()):
+        invalidation_bus.deliver(scope, key)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -7,6 +7,96 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
 
+    # Production server (python -m app.server); every worker process has its own engine pool
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # Worker processes; 0 = one per CPU (always 1 on SQLite)
+    SERVER_KEEPALIVE_SECONDS: int = 75  # Longer than the proxy's idle timeout, so it never reuses a closed connection
+    SERVER_BACKLOG: int = 2048  # Pending TCP connections queued per worker socket
+    SERVER_LIMIT_CONCURRENCY: int = 0  # Connections per worker before 503s; 0 = unlimited
+    SERVER_MAX_REQUESTS: int = 0  # Recycle a worker after this many requests; 0 = never
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30  # Time in-flight requests get to finish on SIGTERM
+    FORWARDED_ALLOW_IPS: str = "*"  # Trust X-Forwarded-* from the platform proxy
+    DB_POOL_SIZE: int = 5  # Per worker process (Postgres)
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+
+    # Hash partitions for royalty and portfolio on Postgres; 0 keeps plain tables.
+    # Changing it on an existing database needs the matching alembic migration.
+    PARTITION_COUNT: int = 0
+
+    # Embedded SQLite profile (applied to every connection when DATABASE_URL is sqlite)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # Safe with WAL: a crash can lose the last commits, never corrupt
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # Page cache per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_SINGLE_WRITER: bool = True  # Queue write transactions in-process; reads stay concurrent
+
+    # Background ingest job queue
+    INGEST_WORKERS: int = 1  # Worker coroutines started with the app; 0 to run workers as separate processes
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_STALE_SECONDS: int = 600  # Running jobs older than this are assumed abandoned and reclaimed
+    JOB_MAX_ATTEMPTS: int = 3
+
+    # Scheduling of parse/upsert work (app/services/ingest_scheduler.py). Every limit applies
+    # per worker process: with WEB_CONCURRENCY workers the effective caps are that many times larger.
+    INGEST_MAX_CONCURRENT: int = 4  # Ingests running at once across all accounts, per process
+    INGEST_MAX_CONCURRENT_PER_ACCOUNT: int = 1  # Per process
+    INGEST_MAX_QUEUED_PER_ACCOUNT: int = 3  # Further parse requests for the account get a 429 (per process)
+
+    # Royalty-to-portfolio matching
+    AUTO_MATCH_ON_INGEST: bool = False  # Link unambiguous matches after every ingest
+    AUTO_MATCH_MIN_SCORE: float = 0.8
+
+    # Server-sent change events
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # Comment line sent on idle streams so proxies keep them open
+    SSE_HISTORY_SIZE: int = 200  # Recent events kept per account for Last-Event-ID resume
+    SSE_QUEUE_SIZE: int = 100  # Events buffered per connection before it must resync from history
+
+    # Cross-process cache invalidation (LISTEN/NOTIFY on Postgres)
+    INVALIDATION_CHANNEL: str = "kdp_invalidation"
+    SUMMARY_CACHE_SECONDS: float = 300.0  # Upper bound on staleness if a notification is missed
+
+    # Idempotency-Key handling for write requests
+    IDEMPOTENCY_BACKEND: str = "database"  # "database" (shared by all workers) or "memory" (one process)
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60  # How long a stored response is replayed
+    IDEMPOTENCY_WAIT_SECONDS: float = 60.0  # Duplicates wait this long for the in-flight original
+    IDEMPOTENCY_LEASE_SECONDS: float = 30.0  # Claim of an in-flight request, renewed every third of this while it runs
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 5 * 1024 * 1024  # Larger responses are not stored
+    IDEMPOTENCY_MAX_REQUEST_BYTES: int = 5 * 1024 * 1024  # Keyed requests are buffered; larger bodies get a 413
+
+    # Raw HTML uploads
+    MAX_HTML_UPLOAD_BYTES: int = 50 * 1024 * 1024  # Limit on the decompressed body
+
+    # Ingest capture for replay (scripts/replay_captures.py); off while INGEST_CAPTURE_DIR is empty
+    INGEST_CAPTURE_DIR: str = ""
+    INGEST_CAPTURE_SAMPLE_RATE: float = 1.0  # Share of payloads captured
+    INGEST_CAPTURE_MAX_BYTES: int = 5 * 1024 * 1024  # Larger HTML payloads are not captured
+
+    # Structured (pre-extracted) ingest
+    MAX_INGEST_BODY_BYTES: int = 50 * 1024 * 1024  # Limit on the decompressed JSON/NDJSON body
+    MAX_INGEST_LINE_BYTES: int = 10 * 1024 * 1024  # Limit on one NDJSON line (one account)
+
+    # Month-end close (sets royalty.last_month_royalty)
+    MONTH_CLOSE_ENABLED: bool = True  # Run the scheduler inside the API process
+    MONTH_CLOSE_TIMEZONE: str = "UTC"  # Months end at midnight in this timezone
+    MONTH_CLOSE_DELAY_SECONDS: int = 60  # Wait after midnight before closing
+    MONTH_CLOSE_BATCH_ACCOUNTS: int = 500  # Accounts updated per statement and transaction
+    MONTH_CLOSE_RETRY_SECONDS: int = 300
+
+    # Title and portfolio name search
+    SEARCH_FUZZY_THRESHOLD: float = 0.5  # Share of the query's trigrams a fuzzy match must contain
+    SEARCH_CANDIDATES: int = 200  # FTS5 candidates scored per query on SQLite
+
+    # Account deletion
+    PURGE_BATCH_SIZE: int = 1000  # Rows deleted per transaction by the background purge
+
+    # Bulk CSV import
+    IMPORT_BATCH_SIZE: int = 10000  # Report rows staged per COPY / executemany batch
+    IMPORT_STAGING_MAX_AGE_SECONDS: int = 86400  # Staged rows older than this belong to an abandoned import
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
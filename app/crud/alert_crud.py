@@ -0,0 +1,174 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.locks import lock_account
+from app.models.alert import Alert, AlertRule, AlertRuleCreate
+from app.models.portfolio import Portfolio
+from app.models.rollup import PortfolioRollup
+
+# (royalty_id, book_title, total_royalties_usd before, total_royalties_usd after) for one changed title.
+TitleChange = Tuple[int, str, float, float]
+
+async def create_rule(session: AsyncSession, rule_create: AlertRuleCreate) -> AlertRule:
+    """
+    Stores a rule. Spend rules are evaluated once against the account's current portfolios
+    (from the rollups); from then on every rule only sees the rows each write changes.
+    """
+    await lock_account(session, rule_create.account_identifier)
+    rule = AlertRule.model_validate(rule_create)
+    session.add(rule)
+    await session.flush()
+    if rule.kind == "spend_over_royalties":
+        result = await session.exec(
+            select(PortfolioRollup.portfolio_id).where(PortfolioRollup.account_identifier == rule.account_identifier)
+        )
+        await evaluate_portfolios(session, [rule.account_identifier], result.all())
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+async def get_rules(session: AsyncSession, account_identifier: str) -> List[AlertRule]:
+    result = await session.exec(
+        select(AlertRule).where(AlertRule.account_identifier == account_identifier).order_by(AlertRule.id)
+    )
+    return list(result.all())
+
+async def get_rule_by_id(session: AsyncSession, rule_id: int) -> AlertRule | None:
+    result = await session.exec(select(AlertRule).where(AlertRule.id == rule_id))
+    return result.first()
+
+async def delete_rule(session: AsyncSession, rule: AlertRule) -> None:
+    """
+    Deletes a rule together with its alerts.
+    """
+    await session.exec(delete(Alert).where(Alert.rule_id == rule.id))
+    await session.delete(rule)
+    await session.commit()
+
+async def get_alerts(session: AsyncSession, account_identifier: str, status: Optional[str], limit: int) -> List[Alert]:
+    """
+    The account's alerts, newest first, optionally only "active" or "resolved" ones.
+    """
+    statement = select(Alert).where(Alert.account_identifier == account_identifier)
+    if status is not None:
+        statement = statement.where(Alert.status == status)
+    result = await session.exec(statement.order_by(Alert.triggered_at.desc(), Alert.id.desc()).limit(limit))
+    return list(result.all())
+
+async def delete_account_alerts(session: AsyncSession, account_identifier: str) -> None:
+    """
+    Removes an account's rules and alerts. Does not commit.
+    """
+    await session.exec(delete(Alert).where(Alert.account_identifier == account_identifier))
+    await session.exec(delete(AlertRule).where(AlertRule.account_identifier == account_identifier))
+
+async def _rules_of_kind(session: AsyncSession, account_identifiers: List[str], kind: str) -> List[AlertRule]:
+    if not account_identifiers:
+        return []
+    result = await session.exec(
+        select(AlertRule).where(AlertRule.account_identifier.in_(account_identifiers), AlertRule.kind == kind)
+    )
+    return list(result.all())
+
+async def _active_alerts(session: AsyncSession, rules: List[AlertRule], subject_ids: List[int]) -> Dict[tuple, Alert]:
+    if not subject_ids:
+        return {}
+    result = await session.exec(
+        select(Alert).where(
+            Alert.rule_id.in_([rule.id for rule in rules]),
+            Alert.subject_id.in_(subject_ids),
+            Alert.status == "active",
+        )
+    )
+    return {(alert.rule_id, alert.subject_id): alert for alert in result.all()}
+
+def _resolve(session: AsyncSession, alert: Alert, now: datetime) -> None:
+    alert.status = "resolved"
+    alert.resolved_at = now
+    session.add(alert)
+
+def _dropped(before: float, after: float, threshold: float) -> bool:
+    return before > 0 and after < before and before - after >= threshold * before
+
+async def evaluate_royalty_changes(
+    session: AsyncSession, account_identifier: str, changes: List[TitleChange], removed_ids: List[int],
+) -> None:
+    """
+    Applies the account's royalty_drop rules to the titles changed (and removed) by one write.
+    Costs two indexed queries plus work proportional to the change. Does not commit.
+    """
+    if not changes and not removed_ids:
+        return
+    rules = await _rules_of_kind(session, [account_identifier], "royalty_drop")
+    if not rules:
+        return
+    active = await _active_alerts(session, rules, [change[0] for change in changes] + list(removed_ids))
+    now = datetime.utcnow()
+    for rule in rules:
+        for royalty_id, book_title, before, after in changes:
+            alert = active.get((rule.id, royalty_id))
+            if alert is None:
+                if _dropped(before, after, rule.threshold):
+                    session.add(Alert(
+                        rule_id=rule.id, account_identifier=account_identifier, subject_type="royalty",
+                        subject_id=royalty_id, subject_name=book_title, value=after, reference=before, triggered_at=now,
+                    ))
+            elif _dropped(alert.reference, after, rule.threshold):
+                alert.value = after
+                session.add(alert)
+            else:
+                _resolve(session, alert, now)
+        for royalty_id in removed_ids:
+            if (rule.id, royalty_id) in active:
+                _resolve(session, active[(rule.id, royalty_id)], now)
+
+async def evaluate_portfolios(
+    session: AsyncSession, account_identifiers: List[str], portfolio_ids: Iterable[int], removed_ids: Iterable[int] = (),
+) -> None:
+    """
+    Applies spend_over_royalties rules to the given portfolios, whose rollups (spend and
+    linked royalties) a write just changed. Call after the rollups are updated. Does not commit.
+    """
+    portfolio_ids = list(portfolio_ids)
+    removed_ids = list(removed_ids)
+    if not portfolio_ids and not removed_ids:
+        return
+    rules = await _rules_of_kind(session, account_identifiers, "spend_over_royalties")
+    if not rules:
+        return
+    rows = []
+    if portfolio_ids:
+        result = await session.exec(
+            select(
+                PortfolioRollup.portfolio_id, PortfolioRollup.account_identifier,
+                PortfolioRollup.spend, PortfolioRollup.total_royalties_usd, Portfolio.portfolio_name,
+            )
+            .join(Portfolio, Portfolio.id == PortfolioRollup.portfolio_id)
+            .where(PortfolioRollup.portfolio_id.in_(portfolio_ids))
+        )
+        rows = result.all()
+    active = await _active_alerts(session, rules, portfolio_ids + removed_ids)
+    now = datetime.utcnow()
+    for rule in rules:
+        for row in rows:
+            if row.account_identifier != rule.account_identifier:
+                continue
+            excess = round(float(row.spend) - float(row.total_royalties_usd), 2)
+            alert = active.get((rule.id, row.portfolio_id))
+            if excess > rule.threshold:
+                if alert is None:
+                    session.add(Alert(
+                        rule_id=rule.id, account_identifier=rule.account_identifier, subject_type="portfolio",
+                        subject_id=row.portfolio_id, subject_name=row.portfolio_name,
+                        value=excess, reference=float(row.total_royalties_usd), triggered_at=now,
+                    ))
+                else:
+                    alert.value = excess
+                    alert.reference = float(row.total_royalties_usd)
+                    session.add(alert)
+            elif alert is not None:
+                _resolve(session, alert, now)
+        for portfolio_id in removed_ids:
+            if (rule.id, portfolio_id) in active:
+                _resolve(session, active[(rule.id, portfolio_id)], now)
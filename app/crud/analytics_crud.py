@@ -0,0 +1,71 @@
+from typing import List, Optional
+from sqlalchemy import Float, cast, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.crud.rollup_crud import sql_amount
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+SORT_FIELDS = ("roas", "acos", "spend", "royalties", "title_count", "portfolio_name")
+
+async def get_portfolio_profitability(
+    session: AsyncSession,
+    account_identifier: str,
+    sort_by: str = "roas",
+    descending: bool = True,
+    min_roas: Optional[float] = None,
+    max_roas: Optional[float] = None,
+    max_acos: Optional[float] = None,
+    min_spend: Optional[float] = None,
+    linked_only: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List:
+    """
+    Computes spend, linked royalties, ROAS and ACoS per portfolio in one grouped query.
+    Ratios are NULL when their divisor is zero; threshold filters never match NULL ratios.
+    """
+    # Cast to float so SQLite does not fall back to integer division on whole amounts.
+    spend = cast(sql_amount(Portfolio.spend), Float)
+    royalties = cast(func.coalesce(func.sum(sql_amount(Royalty.total_royalties_usd)), 0), Float)
+    grouped = (
+        select(
+            Portfolio.id.label("portfolio_id"),
+            Portfolio.portfolio_name.label("portfolio_name"),
+            spend.label("spend"),
+            royalties.label("royalties"),
+            func.count(Royalty.id).label("title_count"),
+        )
+        .select_from(Portfolio)
+        .outerjoin(Royalty, Royalty.portfolio_id == Portfolio.id)
+        .where(Portfolio.account_identifier == account_identifier)
+        .group_by(Portfolio.id, Portfolio.portfolio_name, Portfolio.spend)
+        .subquery()
+    )
+    roas = (grouped.c.royalties / func.nullif(grouped.c.spend, 0)).label("roas")
+    acos = (grouped.c.spend * 100 / func.nullif(grouped.c.royalties, 0)).label("acos")
+    statement = select(
+        grouped.c.portfolio_id, grouped.c.portfolio_name, grouped.c.spend,
+        grouped.c.royalties, grouped.c.title_count, roas, acos,
+    )
+
+    if min_roas is not None:
+        statement = statement.where(roas >= min_roas)
+    if max_roas is not None:
+        statement = statement.where(roas <= max_roas)
+    if max_acos is not None:
+        statement = statement.where(acos <= max_acos)
+    if min_spend is not None:
+        statement = statement.where(grouped.c.spend >= min_spend)
+    if linked_only:
+        statement = statement.where(grouped.c.title_count > 0)
+
+    sort_columns = {"roas": roas, "acos": acos, **{name: grouped.c[name] for name in SORT_FIELDS[2:]}}
+    sort_column = sort_columns[sort_by]
+    order = sort_column.desc() if descending else sort_column.asc()
+    statement = statement.order_by(order.nulls_last(), grouped.c.portfolio_id).offset(offset)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    result = await session.exec(statement)
+    return list(result.all())
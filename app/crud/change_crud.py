@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.dialect import upsert_insert
+from app.db.session import acquire_writer
+from app.models.change import AccountChangeSeq, ChangeTombstone
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+from app.schemas.changes import ChangeFeed
+
+async def next_change_seq(session: AsyncSession, account_identifier: str) -> int:
+    """
+    Allocates the account's next change sequence number. Does not commit.
+    The counter row stays locked until commit, so sequence numbers become visible in order.
+    """
+    await acquire_writer(session)
+    statement = upsert_insert(session, AccountChangeSeq).values(account_identifier=account_identifier, last_seq=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=["account_identifier"],
+        set_={"last_seq": AccountChangeSeq.last_seq + 1},
+    ).returning(AccountChangeSeq.last_seq)
+    result = await session.exec(statement)
+    return result.scalar_one()
+
+async def next_change_seqs(session: AsyncSession, account_identifiers: List[str]) -> Dict[str, int]:
+    """
+    next_change_seq for many accounts with a single INSERT ... ON CONFLICT ... RETURNING. Does not commit.
+    """
+    if not account_identifiers:
+        return {}
+    await acquire_writer(session)
+    statement = upsert_insert(session, AccountChangeSeq).values(
+        [{"account_identifier": account_identifier, "last_seq": 1} for account_identifier in account_identifiers]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["account_identifier"],
+        set_={"last_seq": AccountChangeSeq.last_seq + 1},
+    ).returning(AccountChangeSeq.account_identifier, AccountChangeSeq.last_seq)
+    result = await session.exec(statement)
+    return {account_identifier: last_seq for account_identifier, last_seq in result.all()}
+
+async def record_tombstones(session: AsyncSession, account_identifier: str, entity: str, entity_ids: List[int], change_seq: int) -> None:
+    """
+    Records deleted rows with one executemany INSERT. Does not commit.
+    """
+    if not entity_ids:
+        return
+    now = datetime.utcnow()
+    await session.exec(
+        insert(ChangeTombstone.__table__),
+        params=[
+            {"account_identifier": account_identifier, "entity": entity, "entity_id": entity_id,
+             "change_seq": change_seq, "deleted_at": now}
+            for entity_id in entity_ids
+        ],
+    )
+
+async def get_changes(session: AsyncSession, account_identifier: str, since: int = 0) -> ChangeFeed:
+    """
+    Rows of an account written after cursor `since`, plus the IDs of rows deleted after it.
+    A cursor of 0 returns the full current state. Every query is bounded by the cursor
+    read first, so writes committing mid-request are picked up by the next call.
+    """
+    result = await session.exec(
+        select(AccountChangeSeq.last_seq).where(AccountChangeSeq.account_identifier == account_identifier)
+    )
+    cursor = result.first() or 0
+
+    def changed(model):
+        statement = select(model).where(model.account_identifier == account_identifier, model.change_seq <= cursor)
+        if since:
+            statement = statement.where(model.change_seq > since)
+        return statement.order_by(model.change_seq, model.id)
+
+    royalties = list((await session.exec(changed(Royalty))).all())
+    portfolios = list((await session.exec(changed(Portfolio))).all())
+
+    deleted = {"royalty": [], "portfolio": []}
+    if since:
+        result = await session.exec(
+            select(ChangeTombstone.entity, ChangeTombstone.entity_id)
+            .where(
+                ChangeTombstone.account_identifier == account_identifier,
+                ChangeTombstone.change_seq > since,
+                ChangeTombstone.change_seq <= cursor,
+            )
+            .order_by(ChangeTombstone.change_seq, ChangeTombstone.id)
+        )
+        for entity, entity_id in result.all():
+            deleted[entity].append(entity_id)
+
+    return ChangeFeed(
+        account_identifier=account_identifier,
+        cursor=max(cursor, since),
+        royalties=royalties,
+        portfolios=portfolios,
+        deleted_royalty_ids=deleted["royalty"],
+        deleted_portfolio_ids=deleted["portfolio"],
+    )
@@ -0,0 +1,168 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.events import change_broker
+from app.core.invalidation import invalidation_bus
+from app.core.settings import settings
+from app.crud import alert_crud, job_crud, rollup_crud
+from app.db.locks import lock_account
+from app.models.account_deletion import AccountDeletion
+from app.models.change import ChangeTombstone
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+from app.models.snapshot import RoyaltySnapshot
+
+PURGE_JOB_KIND = "purge"
+
+class AccountDeleting(Exception):
+    """
+    Raised by writes to an account whose deletion is in progress.
+    """
+    def __init__(self, account_identifier: str):
+        super().__init__(f"Account {account_identifier} is being deleted")
+        self.account_identifier = account_identifier
+
+def deleting_accounts():
+    """
+    Subquery of the accounts currently being deleted, for hiding their rows from reads.
+    """
+    return select(AccountDeletion.account_identifier).where(AccountDeletion.status == "deleting")
+
+def visible(model):
+    """
+    WHERE clause that excludes rows of accounts being deleted.
+    """
+    return model.account_identifier.not_in(deleting_accounts())
+
+async def get_deletion(session: AsyncSession, account_identifier: str) -> AccountDeletion | None:
+    result = await session.exec(select(AccountDeletion).where(AccountDeletion.account_identifier == account_identifier))
+    return result.first()
+
+async def is_deleting(session: AsyncSession, account_identifier: str) -> bool:
+    result = await session.exec(
+        select(AccountDeletion.account_identifier)
+        .where(AccountDeletion.account_identifier == account_identifier, AccountDeletion.status == "deleting")
+    )
+    return result.first() is not None
+
+async def deleting_among(session: AsyncSession, account_identifiers: List[str]) -> List[str]:
+    """
+    The given accounts whose deletion is in progress.
+    """
+    if not account_identifiers:
+        return []
+    result = await session.exec(
+        select(AccountDeletion.account_identifier)
+        .where(AccountDeletion.account_identifier.in_(account_identifiers), AccountDeletion.status == "deleting")
+    )
+    return list(result.all())
+
+async def ensure_not_deleting(session: AsyncSession, account_identifier: str) -> None:
+    """
+    Rejects a write to an account being deleted. Call after lock_account.
+    """
+    if await is_deleting(session, account_identifier):
+        raise AccountDeleting(account_identifier)
+
+async def start_deletion(session: AsyncSession, account_identifier: str) -> AccountDeletion:
+    """
+    Flips the account to "deleting" and queues its purge job in one transaction.
+    Requesting a deletion that is already running returns it unchanged.
+    """
+    await lock_account(session, account_identifier)
+    deletion = await get_deletion(session, account_identifier)
+    if deletion is not None and deletion.status == "deleting":
+        return deletion
+    if deletion is None:
+        deletion = AccountDeletion(account_identifier=account_identifier)
+    else:
+        deletion.status = "deleting"
+        deletion.royalties_deleted = 0
+        deletion.portfolios_deleted = 0
+        deletion.requested_at = datetime.utcnow()
+        deletion.finished_at = None
+    session.add(deletion)
+    await invalidation_bus.publish(session, "account", account_identifier)
+    # enqueue_job commits the deletion row together with the job.
+    job = await job_crud.enqueue_job(session, PURGE_JOB_KIND, account_identifier, "")
+    job_id = job.id
+    deletion = await get_deletion(session, account_identifier)
+    deletion.job_id = job_id
+    session.add(deletion)
+    await session.commit()
+    await session.refresh(deletion)
+    change_broker.publish(account_identifier, "account.deleting", {"job_id": job_id})
+    return deletion
+
+async def _purge_batch(session: AsyncSession, account_identifier: str, model, counter: Optional[str] = None) -> int:
+    """
+    Deletes up to PURGE_BATCH_SIZE rows of `model` for the account, with the progress
+    update, in one short transaction. Returns the number of rows deleted.
+    """
+    await lock_account(session, account_identifier)
+    result = await session.exec(
+        select(model.id)
+        .where(model.account_identifier == account_identifier)
+        .order_by(model.id)
+        .limit(settings.PURGE_BATCH_SIZE)
+    )
+    ids = list(result.all())
+    if not ids:
+        return 0
+    await session.exec(delete(model).where(model.id.in_(ids)))
+    if counter is not None:
+        deletion = await get_deletion(session, account_identifier)
+        setattr(deletion, counter, getattr(deletion, counter) + len(ids))
+        session.add(deletion)
+    await session.commit()
+    return len(ids)
+
+# Purge order: royalties reference portfolios. History and change feed tombstones go too,
+# so nothing of the account stays readable or resurfaces if its identifier is reused.
+PURGED_TABLES = (
+    (Royalty, "royalties_deleted"),
+    (Portfolio, "portfolios_deleted"),
+    (RoyaltySnapshot, None),
+    (ChangeTombstone, None),
+)
+
+async def purge_account(session: AsyncSession, account_identifier: str, payload: str = "") -> int:
+    """
+    Background job handler: deletes the account's royalties, portfolios, royalty history
+    and change tombstones in bounded batches, then clears its rollups and marks the
+    deletion finished. Safe to rerun after a crash, since every batch commits its own progress.
+    Returns the number of royalty and portfolio rows deleted by this run.
+    """
+    deletion = await get_deletion(session, account_identifier)
+    if deletion is None or deletion.status != "deleting":
+        return 0
+
+    deleted = 0
+    for model, counter in PURGED_TABLES:
+        while True:
+            count = await _purge_batch(session, account_identifier, model, counter)
+            if not count:
+                break
+            if counter is not None:
+                deleted += count
+            print(f"Purged {count} {model.__tablename__} rows for account {account_identifier}")
+
+    await lock_account(session, account_identifier)
+    await rollup_crud.reset_account_royalties(session, account_identifier)
+    await rollup_crud.delete_account_portfolio_rollups(session, account_identifier)
+    await alert_crud.delete_account_alerts(session, account_identifier)
+    deletion = await get_deletion(session, account_identifier)
+    deletion.status = "deleted"
+    deletion.finished_at = datetime.utcnow()
+    session.add(deletion)
+    await invalidation_bus.publish(session, "account", account_identifier)
+    await session.commit()
+    await session.refresh(deletion)
+    change_broker.publish(account_identifier, "royalties.deleted", {})
+    change_broker.publish(account_identifier, "portfolios.deleted", {})
+    change_broker.publish(account_identifier, "account.deleted", {
+        "royalties": deletion.royalties_deleted, "portfolios": deletion.portfolios_deleted,
+    })
+    return deleted
@@ -0,0 +1,133 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import case, delete, distinct, exists, func, insert, literal, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.dialect import format_amount
+from app.models.royalty import Royalty
+from app.models.royalty_import import RoyaltyImportRow
+from app.models.snapshot import RoyaltySnapshot
+
+STAGING_COLUMNS = ("import_id", "account_identifier", "book_title", "period_end", "kind", "currency", "amount", "staged_at")
+
+async def clear_staging(session: AsyncSession, import_id: str) -> None:
+    """
+    Removes the staging rows of one import that failed.
+    """
+    await session.exec(delete(RoyaltyImportRow).where(RoyaltyImportRow.import_id == import_id))
+
+async def clear_abandoned_staging(session: AsyncSession, staged_before: datetime) -> None:
+    """
+    Removes staging rows left behind by imports whose process died before merging or cleaning up.
+    """
+    await session.exec(delete(RoyaltyImportRow).where(RoyaltyImportRow.staged_at < staged_before))
+
+async def stage_rows(session: AsyncSession, rows: List[tuple]) -> None:
+    """
+    Loads parsed report lines (tuples in STAGING_COLUMNS order) into the staging table.
+    Postgres uses COPY on the session's own connection, so the rows belong to the
+    open transaction; other databases fall back to an executemany INSERT. Does not commit.
+    """
+    if not rows:
+        return
+    if session.bind.dialect.name == "postgresql":
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            RoyaltyImportRow.__tablename__, records=rows, columns=STAGING_COLUMNS,
+        )
+    else:
+        await session.exec(insert(RoyaltyImportRow.__table__), params=[dict(zip(STAGING_COLUMNS, row)) for row in rows])
+
+def _monthly_totals(import_id: str):
+    """
+    Per-title, per-month royalty totals of an import, in the snapshot column layout.
+    """
+    staged = RoyaltyImportRow
+    def by_kind(kind: str):
+        return func.sum(case((staged.kind == kind, staged.amount), else_=0))
+    return (
+        select(
+            staged.account_identifier,
+            staged.book_title,
+            staged.period_end,
+            by_kind("ebook").label("ebook_royalties"),
+            by_kind("print").label("print_royalties"),
+            by_kind("kenp").label("kenp_royalties"),
+            func.sum(staged.amount).label("total_royalties"),
+            func.sum(case((staged.currency == "USD", staged.amount), else_=0)).label("total_royalties_usd"),
+        )
+        .where(staged.import_id == import_id)
+        .group_by(staged.account_identifier, staged.book_title, staged.period_end)
+    )
+
+async def merge_import(
+    session: AsyncSession,
+    import_id: str,
+    account_identifier: str,
+    last_month_end: datetime,
+    change_seq: int,
+) -> dict:
+    """
+    Merges staged rows with set-based statements and deletes them. Does not commit.
+
+    Every month becomes one snapshot per title (replacing snapshots an earlier import
+    wrote for the same months). The latest month ending on or before `last_month_end`
+    sets royalty.last_month_royalty; titles missing from the account are inserted
+    with zero current-period values.
+    """
+    monthly = _monthly_totals(import_id).subquery()
+    periods = select(distinct(RoyaltyImportRow.period_end)).where(RoyaltyImportRow.import_id == import_id)
+    await session.exec(
+        delete(RoyaltySnapshot).where(
+            RoyaltySnapshot.account_identifier == account_identifier,
+            RoyaltySnapshot.captured_at.in_(periods),
+        )
+    )
+    snapshot_table = RoyaltySnapshot.__table__
+    result = await session.exec(
+        insert(snapshot_table).from_select(
+            ["account_identifier", "book_title", "captured_at", "ebook_royalties", "print_royalties",
+             "kenp_royalties", "total_royalties", "total_royalties_usd"],
+            select(*monthly.c),
+        )
+    )
+    counts = {"snapshots": result.rowcount, "updated_titles": 0, "inserted_titles": 0}
+
+    result = await session.exec(
+        select(func.max(RoyaltyImportRow.period_end)).where(
+            RoyaltyImportRow.import_id == import_id, RoyaltyImportRow.period_end <= last_month_end
+        )
+    )
+    last_period = result.first()
+    if last_period is not None:
+        last_month = select(monthly.c.book_title, monthly.c.total_royalties_usd).where(monthly.c.period_end == last_period).subquery()
+        last_month_value = format_amount(session, last_month.c.total_royalties_usd)
+        result = await session.exec(
+            update(Royalty)
+            .where(Royalty.account_identifier == account_identifier, Royalty.book_title == last_month.c.book_title)
+            .values(last_month_royalty=last_month_value, change_seq=change_seq)
+            .execution_options(synchronize_session=False)
+        )
+        counts["updated_titles"] = result.rowcount
+
+        royalty_table = Royalty.__table__
+        already_present = exists().where(
+            royalty_table.c.account_identifier == account_identifier,
+            royalty_table.c.book_title == last_month.c.book_title,
+        )
+        zero = literal("0.00")
+        result = await session.exec(
+            insert(royalty_table).from_select(
+                ["account_identifier", "book_title", "ebook_royalties", "print_royalties", "kenp_royalties",
+                 "total_royalties", "total_royalties_usd", "last_month_royalty", "change_seq", "updated_at"],
+                select(
+                    literal(account_identifier), last_month.c.book_title, zero, zero, zero, zero, zero,
+                    last_month_value, literal(change_seq), literal(datetime.utcnow()),
+                ).where(~already_present),
+            )
+        )
+        counts["inserted_titles"] = result.rowcount
+
+    await session.exec(delete(RoyaltyImportRow).where(RoyaltyImportRow.import_id == import_id))
+    return counts
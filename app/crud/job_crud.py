@@ -0,0 +1,195 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.settings import settings
+from app.db.session import acquire_writer
+from app.models.job import IngestJob
+
+ABANDONED_CHECK_SECONDS = 60
+_next_abandoned_check = 0.0
+
+async def enqueue_job(session: AsyncSession, kind: str, account_identifier: str, payload: str) -> IngestJob:
+    """
+    Stores a pending ingest job and returns it with its assigned ID.
+    """
+    await acquire_writer(session)
+    job = IngestJob(kind=kind, account_identifier=account_identifier, payload=payload)
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+async def get_job_by_id(session: AsyncSession, job_id: int) -> IngestJob | None:
+    """
+    Fetches a job by its ID.
+    """
+    statement = select(IngestJob).where(IngestJob.id == job_id)
+    result = await session.exec(statement)
+    return result.first()
+
+def _claimable():
+    """
+    Pending jobs, plus running jobs whose worker appears to have died.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return (
+        or_(
+            IngestJob.status == "pending",
+            (IngestJob.status == "running") & (IngestJob.started_at < stale_before),
+        )
+        & (IngestJob.attempts < settings.JOB_MAX_ATTEMPTS)
+    )
+
+def _abandoned():
+    """
+    Running jobs whose worker appears to have died on their last allowed attempt.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return (
+        (IngestJob.status == "running")
+        & (IngestJob.started_at < stale_before)
+        & (IngestJob.attempts >= settings.JOB_MAX_ATTEMPTS)
+    )
+
+async def fail_abandoned_jobs(session: AsyncSession) -> int:
+    """
+    Marks abandoned jobs as failed, since they can no longer be reclaimed. Returns how many.
+    """
+    await acquire_writer(session)
+    result = await session.exec(
+        update(IngestJob)
+        .where(_abandoned())
+        .values(
+            status="failed", payload="", finished_at=datetime.utcnow(),
+            error=f"Worker stopped responding on attempt {settings.JOB_MAX_ATTEMPTS}",
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+async def claim_next_job(session: AsyncSession) -> IngestJob | None:
+    """
+    Claims the oldest claimable job and marks it running.
+    On Postgres the row is locked with FOR UPDATE SKIP LOCKED so concurrent workers
+    never block on each other; other databases use a compare-and-set UPDATE instead.
+    """
+    global _next_abandoned_check
+    if time.monotonic() >= _next_abandoned_check:
+        _next_abandoned_check = time.monotonic() + ABANDONED_CHECK_SECONDS
+        if await fail_abandoned_jobs(session):
+            print("Failed ingest jobs abandoned on their last attempt.")
+    if session.bind.dialect.name == "postgresql":
+        statement = (
+            select(IngestJob)
+            .where(_claimable())
+            .order_by(IngestJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.exec(statement)
+        job = result.first()
+        if job is None:
+            await session.rollback()
+            return None
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        job.attempts += 1
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    # Fallback: retry when another worker wins the race for the same row.
+    for _ in range(5):
+        await acquire_writer(session)
+        result = await session.exec(select(IngestJob.id).where(_claimable()).order_by(IngestJob.id).limit(1))
+        job_id = result.first()
+        if job_id is None:
+            await session.rollback()
+            return None
+        claimed = await session.exec(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, _claimable())
+            .values(status="running", started_at=datetime.utcnow(), attempts=IngestJob.attempts + 1)
+        )
+        await session.commit()
+        if claimed.rowcount == 1:
+            return await get_job_by_id(session, job_id)
+    return None
+
+async def mark_job_started(session: AsyncSession, job_id: int) -> None:
+    """
+    Restarts a running job's clock. Called once its ingest has a scheduler slot, so time
+    spent queued behind other accounts never counts toward JOB_STALE_SECONDS.
+    """
+    await acquire_writer(session)
+    await session.exec(
+        update(IngestJob)
+        .where(IngestJob.id == job_id, IngestJob.status == "running")
+        .values(started_at=datetime.utcnow())
+    )
+    await session.commit()
+
+async def has_newer_pending_job(session: AsyncSession, job: IngestJob) -> bool:
+    """
+    True when a later job of the same kind is waiting for the same account.
+    """
+    statement = (
+        select(IngestJob.id)
+        .where(
+            IngestJob.kind == job.kind,
+            IngestJob.account_identifier == job.account_identifier,
+            IngestJob.status == "pending",
+            IngestJob.id > job.id,
+        )
+        .limit(1)
+    )
+    result = await session.exec(statement)
+    return result.first() is not None
+
+async def supersede_job(session: AsyncSession, job: IngestJob) -> IngestJob:
+    """
+    Marks a job as skipped because a newer payload for the same account replaces it.
+    """
+    await acquire_writer(session)
+    job.status = "superseded"
+    job.payload = ""
+    job.finished_at = datetime.utcnow()
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+async def complete_job(session: AsyncSession, job: IngestJob, result_count: int) -> IngestJob:
+    """
+    Marks a job as done. The payload is cleared since it is no longer needed.
+    """
+    await acquire_writer(session)
+    job.status = "done"
+    job.result_count = result_count
+    job.error = None
+    job.payload = ""
+    job.finished_at = datetime.utcnow()
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+async def fail_job(session: AsyncSession, job: IngestJob, error: str) -> IngestJob:
+    """
+    Records a failure. The job goes back to pending until it runs out of attempts.
+    """
+    await acquire_writer(session)
+    job.error = error
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        job.status = "failed"
+        job.payload = ""
+        job.finished_at = datetime.utcnow()
+    else:
+        job.status = "pending"
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
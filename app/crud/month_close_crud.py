@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import case, exists, func, or_, union_all, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.events import change_broker
+from app.core.invalidation import invalidation_bus
+from app.core.settings import settings
+from app.crud import change_crud, deletion_crud, rollup_crud
+from app.db.dialect import format_amount
+from app.db.session import acquire_writer
+from app.models.month_close import MonthClose
+from app.models.royalty import Royalty
+from app.models.snapshot import RoyaltySnapshot
+
+def parse_month(month: str) -> tuple:
+    """
+    Validates a "YYYY-MM" string and returns (year, month).
+    """
+    moment = datetime.strptime(month, "%Y-%m")
+    return moment.year, moment.month
+
+def month_cutoff(month: str, tz_name: str) -> datetime:
+    """
+    The instant `month` ends in timezone `tz_name`, as a naive UTC datetime like every stored timestamp.
+    """
+    year, number = parse_month(month)
+    year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    local_start = datetime(year, number, 1, tzinfo=ZoneInfo(tz_name))
+    return local_start.astimezone(timezone.utc).replace(tzinfo=None)
+
+def previous_month(now: datetime, tz_name: str) -> str:
+    """
+    The last month that has fully ended at `now` (timezone-aware) in timezone `tz_name`.
+    """
+    local = now.astimezone(ZoneInfo(tz_name))
+    year, number = (local.year - 1, 12) if local.month == 1 else (local.year, local.month - 1)
+    return f"{year:04d}-{number:02d}"
+
+async def get_month_close(session: AsyncSession, month: str) -> MonthClose | None:
+    result = await session.exec(select(MonthClose).where(MonthClose.month == month))
+    return result.first()
+
+async def is_closed(session: AsyncSession, month: str) -> bool:
+    result = await session.exec(
+        select(MonthClose.month).where(MonthClose.month == month, MonthClose.finished_at.is_not(None))
+    )
+    return result.first() is not None
+
+def _month_end_values(account_identifiers: List[str], cutoff: datetime):
+    """
+    Each title's total_royalties_usd in effect at `cutoff`: its last snapshot captured before it.
+    Titles with no such snapshot (rows older than the snapshot history) use their current
+    value when the row has not been written since the cutoff.
+    """
+    ranked = select(
+        RoyaltySnapshot.account_identifier,
+        RoyaltySnapshot.book_title,
+        RoyaltySnapshot.total_royalties_usd,
+        func.row_number().over(
+            partition_by=(RoyaltySnapshot.account_identifier, RoyaltySnapshot.book_title),
+            order_by=(RoyaltySnapshot.captured_at.desc(), RoyaltySnapshot.id.desc()),
+        ).label("rank"),
+    ).where(
+        RoyaltySnapshot.account_identifier.in_(account_identifiers),
+        RoyaltySnapshot.captured_at < cutoff,
+    ).subquery()
+    snapshot_values = select(ranked.c.account_identifier, ranked.c.book_title, ranked.c.total_royalties_usd).where(ranked.c.rank == 1)
+    has_snapshot = exists().where(
+        RoyaltySnapshot.account_identifier == Royalty.account_identifier,
+        RoyaltySnapshot.book_title == Royalty.book_title,
+        RoyaltySnapshot.captured_at < cutoff,
+    )
+    unchanged_values = select(
+        Royalty.account_identifier,
+        Royalty.book_title,
+        rollup_crud.sql_amount(Royalty.total_royalties_usd).label("total_royalties_usd"),
+    ).where(Royalty.account_identifier.in_(account_identifiers), Royalty.updated_at < cutoff, ~has_snapshot)
+    return union_all(snapshot_values, unchanged_values).subquery()
+
+async def close_accounts(session: AsyncSession, account_identifiers: List[str], cutoff: datetime) -> Dict[str, int]:
+    """
+    Sets last_month_royalty for every title of the given accounts with one UPDATE ... FROM.
+    Rows already holding the right value are left alone. Does not commit.
+    Returns {account_identifier: titles updated} for the accounts that changed.
+    """
+    month_end = _month_end_values(account_identifiers, cutoff)
+    value = format_amount(session, month_end.c.total_royalties_usd)
+    change_seqs = await change_crud.next_change_seqs(session, account_identifiers)
+    result = await session.exec(
+        update(Royalty)
+        .where(
+            Royalty.account_identifier == month_end.c.account_identifier,
+            Royalty.book_title == month_end.c.book_title,
+            or_(Royalty.last_month_royalty.is_(None), Royalty.last_month_royalty != value),
+        )
+        .values(last_month_royalty=value, change_seq=case(change_seqs, value=Royalty.account_identifier))
+        .returning(Royalty.account_identifier)
+        .execution_options(synchronize_session=False)
+    )
+    return dict(Counter(result.scalars().all()))
+
+async def close_month(
+    session: AsyncSession,
+    month: str,
+    tz_name: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    force: bool = False,
+) -> MonthClose:
+    """
+    Closes `month` for all accounts, `batch_size` accounts per transaction, and records it.
+    Rerunning a month is safe. Closing a month older than one already closed only records
+    it, since last_month_royalty must hold the latest month, unless `force` is set.
+    """
+    tz_name = tz_name or settings.MONTH_CLOSE_TIMEZONE
+    batch_size = batch_size or settings.MONTH_CLOSE_BATCH_ACCOUNTS
+    cutoff = month_cutoff(month, tz_name)
+    started_at = datetime.utcnow()
+    result = await session.exec(
+        select(MonthClose.month).where(MonthClose.month > month, MonthClose.applied, MonthClose.finished_at.is_not(None)).limit(1)
+    )
+    applied = force or result.first() is None
+
+    account_count = 0
+    updated_titles = 0
+    last_account = ""
+    while applied:
+        result = await session.exec(
+            select(Royalty.account_identifier)
+            .where(Royalty.account_identifier > last_account, deletion_crud.visible(Royalty))
+            .distinct()
+            .order_by(Royalty.account_identifier)
+            .limit(batch_size)
+        )
+        accounts = list(result.all())
+        if not accounts:
+            break
+        last_account = accounts[-1]
+        changed = await close_accounts(session, accounts, cutoff)
+        for account_identifier in changed:
+            await invalidation_bus.publish(session, "account", account_identifier)
+        await session.commit()
+        for account_identifier, count in changed.items():
+            change_broker.publish(account_identifier, "royalties.month_closed", {"month": month, "updated": count})
+        account_count += len(accounts)
+        updated_titles += sum(changed.values())
+
+    await acquire_writer(session)
+    record = await get_month_close(session, month) or MonthClose(month=month, timezone=tz_name, cutoff=cutoff)
+    record.timezone = tz_name
+    record.cutoff = cutoff
+    record.accounts = account_count
+    record.updated_titles = updated_titles
+    record.applied = applied
+    record.started_at = started_at
+    record.finished_at = datetime.utcnow()
+    session.add(record)
+    await session.commit()
+    await session.refresh(record)
+    return record
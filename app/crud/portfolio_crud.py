@@ -1,8 +1,13 @@
-from typing import List
-from sqlmodel import select, delete
+from typing import Dict, List
+from sqlalchemy import update
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import selectinload
-from app.models.portfolio import Portfolio, PortfolioCreate
+from app.core.events import change_broker
+from app.core.invalidation import invalidation_bus
+from app.crud import alert_crud, change_crud, deletion_crud, rollup_crud
+from app.db.locks import lock_account
+from app.models.portfolio import Portfolio
 from app.models.royalty import Royalty
 
 async def upsert_portfolio_data(session: AsyncSession, account_identifier: str, portfolio_data: List[dict]) -> List[Portfolio]:
@@ -10,6 +15,11 @@ async def upsert_portfolio_data(session: AsyncSession, account_identifier: str,
     Upserts portfolio data for a given account identifier.
     It updates existing portfolios, creates new ones, and deletes any that are no longer present.
     """
+    # Step 0: Serialize concurrent writers for this account (advisory lock on Postgres)
+    await lock_account(session, account_identifier)
+    await deletion_crud.ensure_not_deleting(session, account_identifier)
+    change_seq = await change_crud.next_change_seq(session, account_identifier)
+
     # Step 1: Fetch existing portfolios for the account
     existing_portfolios_statement = select(Portfolio).where(Portfolio.account_identifier == account_identifier)
     result = await session.exec(existing_portfolios_statement)
@@ -18,6 +28,9 @@ async def upsert_portfolio_data(session: AsyncSession, account_identifier: str,
     # Step 2: Process incoming data
     incoming_portfolio_names = {item['portfolio_name'] for item in portfolio_data}
     processed_portfolios = []
+    changed_portfolios = []
+    inserted_count = 0
+    updated_count = 0
 
     for item in portfolio_data:
         portfolio_name = item['portfolio_name']
@@ -26,6 +39,10 @@ async def upsert_portfolio_data(session: AsyncSession, account_identifier: str,
         if portfolio_name in existing_portfolios_map:
             # Update existing portfolio
             portfolio = existing_portfolios_map[portfolio_name]
+            if portfolio.spend != spend:
+                updated_count += 1
+                portfolio.change_seq = change_seq
+                changed_portfolios.append(portfolio)
             portfolio.spend = spend
             session.add(portfolio)
             processed_portfolios.append(portfolio)
@@ -34,15 +51,38 @@ async def upsert_portfolio_data(session: AsyncSession, account_identifier: str,
             new_portfolio = Portfolio(
                 account_identifier=account_identifier,
                 portfolio_name=portfolio_name,
-                spend=spend
+                spend=spend,
+                change_seq=change_seq,
             )
             session.add(new_portfolio)
             processed_portfolios.append(new_portfolio)
+            changed_portfolios.append(new_portfolio)
+            inserted_count += 1
 
     # Step 3: Delete portfolios that are no longer present
     portfolios_to_delete = [p for name, p in existing_portfolios_map.items() if name not in incoming_portfolio_names]
+    if portfolios_to_delete:
+        # Unlink their royalties ourselves so the change feed reports them as changed.
+        await session.exec(
+            update(Royalty)
+            .where(Royalty.portfolio_id.in_([p.id for p in portfolios_to_delete]))
+            .values(portfolio_id=None, change_seq=change_seq)
+        )
     for portfolio in portfolios_to_delete:
         await session.delete(portfolio)
+    await change_crud.record_tombstones(session, account_identifier, "portfolio", [p.id for p in portfolios_to_delete], change_seq)
+
+    # Step 3b: Keep account and portfolio rollups in step with the change (flush assigns new IDs)
+    await session.flush()
+    await rollup_crud.set_portfolio_spend(session, processed_portfolios)
+    await rollup_crud.delete_portfolio_rollups(session, [p.id for p in portfolios_to_delete])
+    await rollup_crud.set_account_spend(session, account_identifier, portfolio_data)
+
+    # Step 3c: Evaluate alert rules against only the portfolios this write changed
+    await alert_crud.evaluate_portfolios(
+        session, [account_identifier], [p.id for p in changed_portfolios], [p.id for p in portfolios_to_delete],
+    )
+    await invalidation_bus.publish(session, "account", account_identifier)
 
     # Step 4: Commit the transaction
     await session.commit()
@@ -51,6 +91,11 @@ async def upsert_portfolio_data(session: AsyncSession, account_identifier: str,
     for portfolio in processed_portfolios:
         await session.refresh(portfolio)
 
+    # Step 6: Notify change stream listeners
+    change_broker.publish(account_identifier, "portfolios.upserted", {
+        "inserted": inserted_count, "updated": updated_count, "deleted": [p.id for p in portfolios_to_delete],
+    })
+
     return processed_portfolios
 
 async def get_all_portfolios(session: AsyncSession) -> List[Portfolio]:
@@ -58,7 +103,7 @@ async def get_all_portfolios(session: AsyncSession) -> List[Portfolio]:
     Fetches all portfolio data from the database asynchronously,
     eagerly loading the related royalties.
     """
-    statement = select(Portfolio).options(selectinload(Portfolio.royalties))
+    statement = select(Portfolio).where(deletion_crud.visible(Portfolio)).options(selectinload(Portfolio.royalties))
     result = await session.exec(statement)
     portfolios = result.all()
     return list(portfolios)
@@ -71,11 +116,24 @@ async def get_portfolio_by_id(session: AsyncSession, portfolio_id: int) -> Portf
     result = await session.exec(statement)
     return result.first()
 
-async def delete_portfolio_by_account_id(session: AsyncSession, account_identifier: str):
+async def get_portfolio_names(session: AsyncSession, account_identifier: str) -> List[tuple]:
     """
-    Deletes all portfolio data for a given account identifier.
+    Returns (id, portfolio_name) for every portfolio of an account, without loading ORM objects.
     """
-    statement = delete(Portfolio).where(Portfolio.account_identifier == account_identifier)
-    await session.exec(statement)
-    await session.commit()
-    return {"message": f"All portfolio data for account {account_identifier} has been deleted."}
+    statement = (
+        select(Portfolio.id, Portfolio.portfolio_name)
+        .where(Portfolio.account_identifier == account_identifier)
+        .order_by(Portfolio.id)
+    )
+    result = await session.exec(statement)
+    return [tuple(row) for row in result.all()]
+
+async def get_portfolio_accounts(session: AsyncSession, portfolio_ids: List[int]) -> Dict[int, str]:
+    """
+    Returns {portfolio_id: account_identifier} for the given IDs in one query.
+    """
+    if not portfolio_ids:
+        return {}
+    statement = select(Portfolio.id, Portfolio.account_identifier).where(Portfolio.id.in_(portfolio_ids))
+    result = await session.exec(statement)
+    return {row.id: row.account_identifier for row in result.all()}
@@ -0,0 +1,313 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Numeric, bindparam, case, cast, func, insert, union, update
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.amounts import parse_amount
+from app.db.dialect import upsert_insert
+from app.db.locks import lock_account
+from app.models.portfolio import Portfolio
+from app.models.rollup import AccountRollup, PortfolioRollup
+from app.models.royalty import Royalty
+
+ROYALTY_FIELDS = ("ebook_royalties", "print_royalties", "kenp_royalties", "total_royalties", "total_royalties_usd")
+ITEM_KEYS = ("eBookRoyalties", "printRoyalties", "kenpRoyalties", "totalRoyalties", "totalRoyaltiesUSD")
+
+def royalty_amounts(royalty) -> List[float]:
+    """
+    The five royalty values of a stored row (or any object with the same attributes) as floats.
+    """
+    return [parse_amount(getattr(royalty, field)) for field in ROYALTY_FIELDS]
+
+def item_amounts(item: dict) -> List[float]:
+    """
+    The five royalty values of an incoming aggregated item as floats.
+    """
+    return [parse_amount(item[key]) for key in ITEM_KEYS]
+
+class PortfolioDeltas:
+    """
+    Accumulates per-portfolio changes (five royalty amounts and a title count) for one transaction.
+    """
+
+    def __init__(self):
+        self.deltas: Dict[int, List[float]] = {}
+
+    def add(self, portfolio_id: Optional[int], amounts: List[float], sign: int, title_count: int = 0) -> None:
+        if portfolio_id is None:
+            return
+        delta = self.deltas.setdefault(portfolio_id, [0.0] * (len(ROYALTY_FIELDS) + 1))
+        for i, amount in enumerate(amounts):
+            delta[i] += sign * amount
+        delta[-1] += title_count
+
+    def move(self, old_portfolio_id: Optional[int], new_portfolio_id: Optional[int], amounts: List[float]) -> None:
+        if old_portfolio_id == new_portfolio_id:
+            return
+        self.add(old_portfolio_id, amounts, -1, -1)
+        self.add(new_portfolio_id, amounts, 1, 1)
+
+# Strings parse_amount accepts as plain decimals (at most 12 integer digits, within NUMERIC(14, 2)).
+AMOUNT_PATTERN = r'^[+-]?([0-9]{1,12}(\.[0-9]*)?|\.[0-9]+)$'
+
+def sql_amount(column):
+    """
+    SQL expression parsing a scraped money string ("$1,234.56") as NUMERIC. Blank or malformed
+    values count as 0, like parse_amount, instead of failing the cast (Postgres) for the whole query.
+    """
+    cleaned = func.trim(func.replace(func.replace(column, '$', ''), ',', ''))
+    return case((cleaned.regexp_match(AMOUNT_PATTERN), cast(cleaned, Numeric(14, 2))), else_=0)
+
+async def _upsert_account(session: AsyncSession, account_identifier: str, values: dict) -> None:
+    values = {**values, "updated_at": datetime.utcnow()}
+    statement = upsert_insert(session, AccountRollup).values(account_identifier=account_identifier, **values)
+    statement = statement.on_conflict_do_update(index_elements=["account_identifier"], set_=values)
+    await session.exec(statement)
+
+async def set_account_royalty_totals(session: AsyncSession, account_identifier: str, royalty_data: List[dict]) -> None:
+    """
+    Sets the account's royalty totals from the full incoming royalty set. Does not commit.
+    """
+    totals = [0.0] * len(ROYALTY_FIELDS)
+    for item in royalty_data:
+        for i, amount in enumerate(item_amounts(item)):
+            totals[i] += amount
+    values = {field: round(total, 2) for field, total in zip(ROYALTY_FIELDS, totals)}
+    await _upsert_account(session, account_identifier, {**values, "title_count": len(royalty_data)})
+
+async def set_account_spend(session: AsyncSession, account_identifier: str, portfolio_data: List[dict]) -> None:
+    """
+    Sets the account's spend total from the full incoming portfolio set. Does not commit.
+    """
+    spend = round(sum(parse_amount(item['spend']) for item in portfolio_data), 2)
+    await _upsert_account(session, account_identifier, {"spend": spend, "portfolio_count": len(portfolio_data)})
+
+async def apply_portfolio_deltas(session: AsyncSession, deltas: PortfolioDeltas) -> None:
+    """
+    Adds accumulated deltas to portfolio rollups with one executemany UPDATE. Does not commit.
+    """
+    if not deltas.deltas:
+        return
+    table = PortfolioRollup.__table__
+    values = {field: table.c[field] + bindparam(f"d_{field}") for field in ROYALTY_FIELDS}
+    values["title_count"] = table.c.title_count + bindparam("d_title_count")
+    values["updated_at"] = bindparam("d_updated_at")
+    statement = update(table).where(table.c.portfolio_id == bindparam("d_portfolio_id")).values(**values)
+    now = datetime.utcnow()
+    params = []
+    for portfolio_id, delta in deltas.deltas.items():
+        row = {f"d_{field}": round(delta[i], 2) for i, field in enumerate(ROYALTY_FIELDS)}
+        row.update(d_title_count=int(delta[-1]), d_updated_at=now, d_portfolio_id=portfolio_id)
+        params.append(row)
+    await session.exec(statement, params=params)
+
+async def set_portfolio_spend(session: AsyncSession, portfolios: List[Portfolio]) -> None:
+    """
+    Creates or updates the spend of portfolio rollups for flushed portfolios. Does not commit.
+    """
+    if not portfolios:
+        return
+    now = datetime.utcnow()
+    statement = upsert_insert(session, PortfolioRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=["portfolio_id"],
+        set_={"spend": statement.excluded.spend, "updated_at": statement.excluded.updated_at},
+    )
+    params = [
+        {
+            "portfolio_id": p.id,
+            "account_identifier": p.account_identifier,
+            "spend": parse_amount(p.spend),
+            "updated_at": now,
+            **{field: 0.0 for field in ROYALTY_FIELDS},
+            "title_count": 0,
+        }
+        for p in portfolios
+    ]
+    await session.exec(statement, params=params)
+
+async def delete_portfolio_rollups(session: AsyncSession, portfolio_ids: List[int]) -> None:
+    if portfolio_ids:
+        await session.exec(delete(PortfolioRollup).where(PortfolioRollup.portfolio_id.in_(portfolio_ids)))
+
+async def reset_account_royalties(session: AsyncSession, account_identifier: str) -> None:
+    """
+    Zeroes royalty totals for an account whose royalties were all deleted. Does not commit.
+    """
+    zeros = {field: 0 for field in ROYALTY_FIELDS}
+    await session.exec(
+        update(AccountRollup)
+        .where(AccountRollup.account_identifier == account_identifier)
+        .values(**zeros, title_count=0, updated_at=datetime.utcnow())
+    )
+    await session.exec(
+        update(PortfolioRollup)
+        .where(PortfolioRollup.account_identifier == account_identifier)
+        .values(**zeros, title_count=0, updated_at=datetime.utcnow())
+    )
+
+async def delete_account_portfolio_rollups(session: AsyncSession, account_identifier: str) -> None:
+    """
+    Removes portfolio rollups and zeroes spend for an account whose portfolios were all deleted. Does not commit.
+    """
+    await session.exec(delete(PortfolioRollup).where(PortfolioRollup.account_identifier == account_identifier))
+    await session.exec(
+        update(AccountRollup)
+        .where(AccountRollup.account_identifier == account_identifier)
+        .values(spend=0, portfolio_count=0, updated_at=datetime.utcnow())
+    )
+
+async def get_account_rollup(session: AsyncSession, account_identifier: str) -> AccountRollup | None:
+    result = await session.exec(select(AccountRollup).where(AccountRollup.account_identifier == account_identifier))
+    return result.first()
+
+async def get_portfolio_rollups(session: AsyncSession, account_identifier: str) -> List[PortfolioRollup]:
+    result = await session.exec(
+        select(PortfolioRollup)
+        .where(PortfolioRollup.account_identifier == account_identifier)
+        .order_by(PortfolioRollup.portfolio_id)
+    )
+    return list(result.all())
+
+async def compute_rollups(session: AsyncSession, account_identifier: Optional[str] = None) -> tuple:
+    """
+    Recomputes rollups from the base tables with grouped SQL.
+    Returns ({account_identifier: values}, {portfolio_id: values}).
+    """
+    royalty_sums = [func.sum(sql_amount(getattr(Royalty, field))).label(field) for field in ROYALTY_FIELDS]
+
+    royalty_statement = select(Royalty.account_identifier, *royalty_sums, func.count(Royalty.id).label("title_count"))
+    spend_statement = select(
+        Portfolio.account_identifier,
+        func.sum(sql_amount(Portfolio.spend)).label("spend"),
+        func.count(Portfolio.id).label("portfolio_count"),
+    )
+    portfolio_statement = (
+        select(
+            Portfolio.id,
+            Portfolio.account_identifier,
+            sql_amount(Portfolio.spend).label("spend"),
+            *[func.coalesce(s, 0).label(s.name) for s in royalty_sums],
+            func.count(Royalty.id).label("title_count"),
+        )
+        .select_from(Portfolio)
+        .outerjoin(Royalty, Royalty.portfolio_id == Portfolio.id)
+    )
+    if account_identifier is not None:
+        royalty_statement = royalty_statement.where(Royalty.account_identifier == account_identifier)
+        spend_statement = spend_statement.where(Portfolio.account_identifier == account_identifier)
+        portfolio_statement = portfolio_statement.where(Portfolio.account_identifier == account_identifier)
+
+    accounts: Dict[str, dict] = {}
+    empty = {**{field: 0.0 for field in ROYALTY_FIELDS}, "spend": 0.0, "title_count": 0, "portfolio_count": 0}
+    result = await session.exec(royalty_statement.group_by(Royalty.account_identifier))
+    for row in result.all():
+        values = accounts.setdefault(row.account_identifier, dict(empty))
+        values.update({field: float(getattr(row, field) or 0) for field in ROYALTY_FIELDS}, title_count=row.title_count)
+    result = await session.exec(spend_statement.group_by(Portfolio.account_identifier))
+    for row in result.all():
+        values = accounts.setdefault(row.account_identifier, dict(empty))
+        values.update(spend=float(row.spend or 0), portfolio_count=row.portfolio_count)
+
+    portfolios: Dict[int, dict] = {}
+    result = await session.exec(portfolio_statement.group_by(Portfolio.id, Portfolio.account_identifier, Portfolio.spend))
+    for row in result.all():
+        portfolios[row.id] = {
+            "account_identifier": row.account_identifier,
+            "spend": float(row.spend or 0),
+            **{field: float(getattr(row, field) or 0) for field in ROYALTY_FIELDS},
+            "title_count": row.title_count,
+        }
+    return accounts, portfolios
+
+async def _rollup_account_identifiers(session: AsyncSession) -> List[str]:
+    """
+    Every account with base rows or rollups, so stale rollups of emptied accounts are rebuilt too.
+    """
+    statement = union(
+        select(Royalty.account_identifier),
+        select(Portfolio.account_identifier),
+        select(AccountRollup.account_identifier),
+        select(PortfolioRollup.account_identifier),
+    )
+    result = await session.exec(statement)
+    return sorted(row[0] for row in result.all())
+
+async def rebuild_rollups(session: AsyncSession, account_identifier: Optional[str] = None) -> tuple:
+    """
+    Replaces rollups (for one account, or all) with freshly computed values and commits.
+    Each account is recomputed under its write lock, in its own transaction, so no write
+    can commit between the computation and the replacement.
+    Returns the number of account and portfolio rollups written.
+    """
+    if account_identifier is None:
+        account_count = portfolio_count = 0
+        for identifier in await _rollup_account_identifiers(session):
+            accounts, portfolios = await rebuild_rollups(session, identifier)
+            account_count += accounts
+            portfolio_count += portfolios
+        return account_count, portfolio_count
+
+    await lock_account(session, account_identifier)  # The single writer on SQLite
+    accounts, portfolios = await compute_rollups(session, account_identifier)
+    await session.exec(delete(AccountRollup).where(AccountRollup.account_identifier == account_identifier))
+    await session.exec(delete(PortfolioRollup).where(PortfolioRollup.account_identifier == account_identifier))
+
+    now = datetime.utcnow()
+    if accounts:
+        await session.exec(
+            insert(AccountRollup.__table__),
+            params=[{"account_identifier": a, **v, "updated_at": now} for a, v in accounts.items()],
+        )
+    if portfolios:
+        await session.exec(
+            insert(PortfolioRollup.__table__),
+            params=[{"portfolio_id": p, **v, "updated_at": now} for p, v in portfolios.items()],
+        )
+    await session.commit()
+    return len(accounts), len(portfolios)
+
+async def check_rollups(session: AsyncSession, account_identifier: Optional[str] = None) -> List[str]:
+    """
+    Compares stored rollups with freshly computed ones and describes every mismatch.
+    """
+    accounts, portfolios = await compute_rollups(session, account_identifier)
+
+    account_statement = select(AccountRollup)
+    portfolio_statement = select(PortfolioRollup)
+    if account_identifier is not None:
+        account_statement = account_statement.where(AccountRollup.account_identifier == account_identifier)
+        portfolio_statement = portfolio_statement.where(PortfolioRollup.account_identifier == account_identifier)
+    stored_accounts = {r.account_identifier: r for r in (await session.exec(account_statement)).all()}
+    stored_portfolios = {r.portfolio_id: r for r in (await session.exec(portfolio_statement)).all()}
+
+    def differences(label: str, stored, expected: dict) -> List[str]:
+        issues = []
+        for field, value in expected.items():
+            if field == "account_identifier":
+                continue
+            actual = getattr(stored, field)
+            if abs(float(actual) - float(value)) > 0.005:
+                issues.append(f"{label}: {field} is {actual}, expected {value}")
+        return issues
+
+    problems: List[str] = []
+    for account, expected in accounts.items():
+        stored = stored_accounts.pop(account, None)
+        if stored is None:
+            problems.append(f"account {account}: missing rollup")
+        else:
+            problems.extend(differences(f"account {account}", stored, expected))
+    for account, stored in stored_accounts.items():
+        if stored.title_count or stored.portfolio_count:
+            problems.append(f"account {account}: rollup has no underlying rows")
+
+    for portfolio_id, expected in portfolios.items():
+        stored = stored_portfolios.pop(portfolio_id, None)
+        if stored is None:
+            problems.append(f"portfolio {portfolio_id}: missing rollup")
+        else:
+            problems.extend(differences(f"portfolio {portfolio_id}", stored, expected))
+    for portfolio_id in stored_portfolios:
+        problems.append(f"portfolio {portfolio_id}: rollup for a deleted portfolio")
+    return problems
@@ -1,15 +1,38 @@
-from typing import List
-from sqlmodel import select, delete
+from typing import Dict, List
+from sqlalchemy import case, update
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import selectinload
+from app.core.events import change_broker
+from app.core.invalidation import invalidation_bus
+from app.core.amounts import parse_amount
+from app.crud import alert_crud, change_crud, deletion_crud, rollup_crud, snapshot_crud
+from app.db.locks import lock_account
 from app.models.royalty import Royalty, RoyaltyCreate
-from datetime import date, timedelta
+from datetime import datetime
+
+def _royalty_values_changed(royalty: Royalty, item: dict) -> bool:
+    """
+    Compares a stored royalty with an incoming aggregated item.
+    """
+    return (
+        royalty.ebook_royalties, royalty.print_royalties, royalty.kenp_royalties,
+        royalty.total_royalties, royalty.total_royalties_usd,
+    ) != (
+        item['eBookRoyalties'], item['printRoyalties'], item['kenpRoyalties'],
+        item['totalRoyalties'], item['totalRoyaltiesUSD'],
+    )
 
 async def upsert_royalty_data(session: AsyncSession, account_identifier: str, royalty_data: List[dict]) -> List[Royalty]:
     """
     Upserts royalty data for a given account identifier.
     It updates existing royalties, creates new ones, and deletes any that are no longer present.
     """
+    # Step 0: Serialize concurrent writers for this account (advisory lock on Postgres)
+    await lock_account(session, account_identifier)
+    await deletion_crud.ensure_not_deleting(session, account_identifier)
+    change_seq = await change_crud.next_change_seq(session, account_identifier)
+
     # Step 1: Fetch existing royalties for the account
     existing_royalties_statement = select(Royalty).where(Royalty.account_identifier == account_identifier)
     result = await session.exec(existing_royalties_statement)
@@ -18,21 +41,33 @@ async def upsert_royalty_data(session: AsyncSession, account_identifier: str, ro
     # Step 2: Process incoming data
     incoming_book_titles = {item['bookTitle'] for item in royalty_data}
     processed_royalties = []
-    today = date.today()
-    is_last_day_of_month = (today + timedelta(days=1)).day == 1
+    captured_at = datetime.utcnow()
+    snapshot_rows = []
+    portfolio_deltas = rollup_crud.PortfolioDeltas()
+    title_changes: List[alert_crud.TitleChange] = []
+    inserted_count = 0
+    updated_count = 0
 
     for item in royalty_data:
         book_title = item['bookTitle']
         if book_title in existing_royalties_map:
             # Update existing royalty
             royalty = existing_royalties_map[book_title]
+            if _royalty_values_changed(royalty, item):
+                updated_count += 1
+                snapshot_rows.append(snapshot_crud.snapshot_row(account_identifier, item, captured_at))
+                portfolio_deltas.add(royalty.portfolio_id, rollup_crud.royalty_amounts(royalty), -1)
+                portfolio_deltas.add(royalty.portfolio_id, rollup_crud.item_amounts(item), 1)
+                title_changes.append((
+                    royalty.id, book_title, parse_amount(royalty.total_royalties_usd), parse_amount(item['totalRoyaltiesUSD']),
+                ))
             royalty.ebook_royalties = item['eBookRoyalties']
             royalty.print_royalties = item['printRoyalties']
             royalty.kenp_royalties = item['kenpRoyalties']
             royalty.total_royalties = item['totalRoyalties']
             royalty.total_royalties_usd = item['totalRoyaltiesUSD']
-            if is_last_day_of_month:
-                royalty.last_month_royalty = item['totalRoyaltiesUSD']
+            if session.is_modified(royalty):
+                royalty.change_seq = change_seq
             session.add(royalty)
             processed_royalties.append(royalty)
         else:
@@ -45,15 +80,33 @@ async def upsert_royalty_data(session: AsyncSession, account_identifier: str, ro
                 kenp_royalties=item['kenpRoyalties'],
                 total_royalties=item['totalRoyalties'],
                 total_royalties_usd=item['totalRoyaltiesUSD'],
-                last_month_royalty=item['totalRoyaltiesUSD'] if is_last_day_of_month else None,
+                change_seq=change_seq,
             )
             session.add(new_royalty)
             processed_royalties.append(new_royalty)
+            inserted_count += 1
+            snapshot_rows.append(snapshot_crud.snapshot_row(account_identifier, item, captured_at))
 
     # Step 3: Delete royalties that are no longer present
     royalties_to_delete = [r for title, r in existing_royalties_map.items() if title not in incoming_book_titles]
+    deleted_ids = [r.id for r in royalties_to_delete]
     for royalty in royalties_to_delete:
         await session.delete(royalty)
+        snapshot_rows.append(snapshot_crud.removed_snapshot_row(account_identifier, royalty.book_title, captured_at))
+        portfolio_deltas.add(royalty.portfolio_id, rollup_crud.royalty_amounts(royalty), -1, -1)
+    await change_crud.record_tombstones(session, account_identifier, "royalty", deleted_ids, change_seq)
+
+    # Step 3b: Append history for titles whose values changed, in the same transaction
+    await snapshot_crud.record_snapshots(session, snapshot_rows)
+
+    # Step 3c: Keep account and portfolio rollups in step with the change
+    await rollup_crud.set_account_royalty_totals(session, account_identifier, royalty_data)
+    await rollup_crud.apply_portfolio_deltas(session, portfolio_deltas)
+
+    # Step 3d: Evaluate alert rules against only the rows this write changed
+    await alert_crud.evaluate_royalty_changes(session, account_identifier, title_changes, deleted_ids)
+    await alert_crud.evaluate_portfolios(session, [account_identifier], portfolio_deltas.deltas)
+    await invalidation_bus.publish(session, "account", account_identifier)
 
     # Step 4: Commit the transaction
     await session.commit()
@@ -62,13 +115,37 @@ async def upsert_royalty_data(session: AsyncSession, account_identifier: str, ro
     for royalty in processed_royalties:
         await session.refresh(royalty)
 
+    # Step 6: Notify change stream listeners
+    change_broker.publish(account_identifier, "royalties.upserted", {
+        "inserted": inserted_count, "updated": updated_count, "deleted": deleted_ids,
+    })
+
     return processed_royalties
 
+async def _lock_accounts(session: AsyncSession, account_identifiers: List[str]) -> None:
+    """
+    Takes the write lock of every account (in a fixed order, so two writers cannot deadlock)
+    and rejects the write if any of them is being deleted.
+    """
+    for account_identifier in sorted(set(account_identifiers)):
+        await lock_account(session, account_identifier)
+        await deletion_crud.ensure_not_deleting(session, account_identifier)
+
+async def _reread_locked(session: AsyncSession, royalty: Royalty) -> Royalty:
+    """
+    Reloads a royalty read before its account was locked, so rollup deltas are computed
+    from the row as it is now (FOR UPDATE on Postgres; SQLite already holds the writer).
+    """
+    result = await session.exec(
+        select(Royalty).where(Royalty.id == royalty.id).with_for_update().execution_options(populate_existing=True)
+    )
+    return result.one()
+
 async def get_all_royalties(session: AsyncSession) -> List[Royalty]:
     """
     Fetches all royalty data from the database asynchronously.
     """
-    statement = select(Royalty).options(selectinload(Royalty.portfolio))
+    statement = select(Royalty).where(deletion_crud.visible(Royalty)).options(selectinload(Royalty.portfolio))
     result = await session.exec(statement)
     royalties = result.all()
     return list(royalties)
@@ -85,27 +162,120 @@ async def link_portfolio(session: AsyncSession, royalty: Royalty, portfolio_id:
     """
     Links a royalty to a portfolio.
     """
+    await _lock_accounts(session, [royalty.account_identifier])
+    royalty = await _reread_locked(session, royalty)
+    deltas = rollup_crud.PortfolioDeltas()
+    deltas.move(royalty.portfolio_id, portfolio_id, rollup_crud.royalty_amounts(royalty))
+    previous_portfolio_id = royalty.portfolio_id
     royalty.portfolio_id = portfolio_id
+    royalty.change_seq = await change_crud.next_change_seq(session, royalty.account_identifier)
     session.add(royalty)
+    await rollup_crud.apply_portfolio_deltas(session, deltas)
+    await alert_crud.evaluate_portfolios(session, [royalty.account_identifier], deltas.deltas)
+    await invalidation_bus.publish(session, "account", royalty.account_identifier)
     await session.commit()
     await session.refresh(royalty)
+    change_broker.publish(royalty.account_identifier, "royalty.linked", {
+        "royalty_id": royalty.id, "portfolio_id": portfolio_id, "previous_portfolio_id": previous_portfolio_id,
+    })
     return royalty
 
 async def unlink_portfolio(session: AsyncSession, royalty: Royalty) -> Royalty:
     """
     Unlinks a royalty from a portfolio.
     """
+    await _lock_accounts(session, [royalty.account_identifier])
+    royalty = await _reread_locked(session, royalty)
+    deltas = rollup_crud.PortfolioDeltas()
+    deltas.move(royalty.portfolio_id, None, rollup_crud.royalty_amounts(royalty))
+    previous_portfolio_id = royalty.portfolio_id
     royalty.portfolio_id = None
+    royalty.change_seq = await change_crud.next_change_seq(session, royalty.account_identifier)
     session.add(royalty)
+    await rollup_crud.apply_portfolio_deltas(session, deltas)
+    await alert_crud.evaluate_portfolios(session, [royalty.account_identifier], deltas.deltas)
+    await invalidation_bus.publish(session, "account", royalty.account_identifier)
     await session.commit()
     await session.refresh(royalty)
+    change_broker.publish(royalty.account_identifier, "royalty.unlinked", {
+        "royalty_id": royalty.id, "previous_portfolio_id": previous_portfolio_id,
+    })
     return royalty
 
-async def delete_royalty_by_account_id(session: AsyncSession, account_identifier: str):
+async def get_royalty_link_states(session: AsyncSession, royalty_ids: List[int]) -> Dict[int, tuple]:
+    """
+    Returns {royalty_id: (account_identifier, portfolio_id)} for the given IDs in one query.
+    """
+    if not royalty_ids:
+        return {}
+    statement = select(Royalty.id, Royalty.account_identifier, Royalty.portfolio_id).where(Royalty.id.in_(royalty_ids))
+    result = await session.exec(statement)
+    return {row.id: (row.account_identifier, row.portfolio_id) for row in result.all()}
+
+async def get_royalty_titles(session: AsyncSession, account_identifier: str) -> List[tuple]:
+    """
+    Returns (id, book_title, portfolio_id) for every royalty of an account, without loading ORM objects.
+    """
+    statement = (
+        select(Royalty.id, Royalty.book_title, Royalty.portfolio_id)
+        .where(Royalty.account_identifier == account_identifier)
+        .order_by(Royalty.id)
+    )
+    result = await session.exec(statement)
+    return [tuple(row) for row in result.all()]
+
+async def set_portfolio_links(session: AsyncSession, links: Dict[int, int | None]) -> List[Royalty]:
     """
-    Deletes all royalty data for a given account identifier.
+    Sets portfolio_id for many royalties with a single UPDATE and returns the updated rows.
+    `links` maps royalty_id to the new portfolio_id (None to unlink).
     """
-    statement = delete(Royalty).where(Royalty.account_identifier == account_identifier)
+    if not links:
+        return []
+    royalty_ids = list(links)
+    accounts = await session.exec(select(Royalty.account_identifier).where(Royalty.id.in_(royalty_ids)).distinct())
+    await _lock_accounts(session, list(accounts.all()))
+    new_values = {royalty_id: portfolio_id for royalty_id, portfolio_id in links.items() if portfolio_id is not None}
+    if new_values:
+        # Royalty IDs missing from the CASE map fall through to NULL, i.e. are unlinked.
+        portfolio_value = case(new_values, value=Royalty.id, else_=None)
+    else:
+        portfolio_value = None
+    previous = await session.exec(
+        select(
+            Royalty.id, Royalty.account_identifier, Royalty.portfolio_id,
+            *[getattr(Royalty, f) for f in rollup_crud.ROYALTY_FIELDS],
+        )
+        .where(Royalty.id.in_(royalty_ids))
+        .with_for_update()
+    )
+    deltas = rollup_crud.PortfolioDeltas()
+    changed_links: Dict[str, List[dict]] = {}
+    change_seqs: Dict[str, int] = {}
+    for row in previous.all():
+        if row.account_identifier not in change_seqs:
+            change_seqs[row.account_identifier] = await change_crud.next_change_seq(session, row.account_identifier)
+        deltas.move(row.portfolio_id, links[row.id], rollup_crud.royalty_amounts(row))
+        if row.portfolio_id != links[row.id]:
+            changed_links.setdefault(row.account_identifier, []).append(
+                {"royalty_id": row.id, "portfolio_id": links[row.id], "previous_portfolio_id": row.portfolio_id}
+            )
+
+    statement = (
+        update(Royalty)
+        .where(Royalty.id.in_(royalty_ids))
+        .values(portfolio_id=portfolio_value, change_seq=case(change_seqs, value=Royalty.account_identifier))
+        .execution_options(synchronize_session=False)
+    )
     await session.exec(statement)
+    await rollup_crud.apply_portfolio_deltas(session, deltas)
+    await alert_crud.evaluate_portfolios(session, list(change_seqs), deltas.deltas)
+    for account_identifier in change_seqs:
+        await invalidation_bus.publish(session, "account", account_identifier)
     await session.commit()
-    return {"message": f"All royalty data for account {account_identifier} has been deleted."}
+    for account_identifier, changes in changed_links.items():
+        change_broker.publish(account_identifier, "royalties.relinked", {"links": changes})
+
+    result = await session.exec(
+        select(Royalty).where(Royalty.id.in_(royalty_ids)).order_by(Royalty.id).execution_options(populate_existing=True)
+    )
+    return list(result.all())
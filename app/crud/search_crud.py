@@ -0,0 +1,137 @@
+import re
+from typing import List, Sequence, Set
+from sqlalchemy import func, literal, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.settings import settings
+from app.models import search  # noqa: F401  (registers the search index DDL)
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+from app.schemas.search import SearchHit
+
+SEARCH_COLUMNS = {
+    "royalty": (Royalty, Royalty.book_title),
+    "portfolio": (Portfolio, Portfolio.portfolio_name),
+}
+_WORD_RE = re.compile(r"\w+")
+
+def query_trigrams(value: str) -> Set[str]:
+    """
+    Word trigrams padded like pg_trgm's ("  ke", " ket", "eto", "to "), so both backends rank alike.
+    """
+    grams = set()
+    for word in _WORD_RE.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def score(query: str, name: str) -> float:
+    """
+    1.0 when `query` is a substring of `name`, otherwise the share of the query's trigrams found in it.
+    """
+    if query.lower() in name.lower():
+        return 1.0
+    wanted = query_trigrams(query)
+    if not wanted:
+        return 0.0
+    return round(len(wanted & query_trigrams(name)) / len(wanted), 4)
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _ranked(hits: List[SearchHit], limit: int) -> List[SearchHit]:
+    hits.sort(key=lambda hit: (-hit.score, len(hit.name), hit.name.lower(), hit.id))
+    return hits[:limit]
+
+async def _search_postgres(
+    session: AsyncSession, account_identifier: str, query: str, kinds: Sequence[str], fuzzy: bool, limit: int,
+) -> List[SearchHit]:
+    """
+    ILIKE and the word-similarity operator (<%) are both served by the pg_trgm GIN indexes.
+    """
+    if fuzzy:
+        await session.exec(
+            select(func.set_config("pg_trgm.word_similarity_threshold", str(settings.SEARCH_FUZZY_THRESHOLD), True))
+        )
+    hits: List[SearchHit] = []
+    for kind in kinds:
+        model, column = SEARCH_COLUMNS[kind]
+        substring = column.ilike(_like_pattern(query), escape="\\")
+        matches = (substring | literal(query).op("<%")(column)) if fuzzy else substring
+        similarity = func.word_similarity(query, column)
+        result = await session.exec(
+            select(model.id, column, substring.label("substring"), similarity.label("similarity"))
+            .where(model.account_identifier == account_identifier, matches)
+            .order_by(substring.desc(), similarity.desc())
+            .limit(limit)
+        )
+        hits.extend(
+            SearchHit(kind=kind, id=row.id, name=row[1], score=1.0 if row.substring else round(row.similarity, 4))
+            for row in result.all()
+        )
+    return _ranked(hits, limit)
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+async def _search_sqlite(
+    session: AsyncSession, account_identifier: str, query: str, kinds: Sequence[str], fuzzy: bool, limit: int,
+) -> List[SearchHit]:
+    """
+    Candidates come from the FTS5 trigram table: the query as one phrase for substring
+    matching, or any of its trigrams for fuzzy matching, best bm25 rank first. They are
+    then scored in Python. Queries under three characters have no trigram and fall back
+    to LIKE over the account's rows.
+    """
+    lowered = query.lower()
+    if len(lowered) < 3:
+        hits = []
+        for kind in kinds:
+            model, column = SEARCH_COLUMNS[kind]
+            result = await session.exec(
+                select(model.id, column)
+                .where(model.account_identifier == account_identifier, column.ilike(_like_pattern(query), escape="\\"))
+                .limit(settings.SEARCH_CANDIDATES)
+            )
+            hits.extend(SearchHit(kind=kind, id=row[0], name=row[1], score=1.0) for row in result.all())
+        return _ranked(hits, limit)
+
+    if fuzzy:
+        grams = sorted({lowered[i:i + 3] for i in range(len(lowered) - 2)})
+        match = " OR ".join(_fts_phrase(gram) for gram in grams)
+    else:
+        match = _fts_phrase(lowered)
+    kind_filter = " AND entity IN (" + ", ".join(f"'{kind}'" for kind in kinds) + ")" if len(kinds) < len(SEARCH_COLUMNS) else ""
+    result = await session.exec(
+        text(
+            f"SELECT entity, entity_id, name FROM {search.SEARCH_TABLE} "
+            f"WHERE {search.SEARCH_TABLE} MATCH :match AND account_identifier = :account{kind_filter} "
+            "ORDER BY rank LIMIT :candidates"
+        ).bindparams(match=match, account=account_identifier, candidates=settings.SEARCH_CANDIDATES)
+    )
+    hits = []
+    for entity, entity_id, name in result.all():
+        hit_score = score(query, name)
+        if hit_score == 1.0 or (fuzzy and hit_score >= settings.SEARCH_FUZZY_THRESHOLD):
+            hits.append(SearchHit(kind=entity, id=entity_id, name=name, score=hit_score))
+    return _ranked(hits, limit)
+
+async def search_titles(
+    session: AsyncSession,
+    account_identifier: str,
+    query: str,
+    kinds: Sequence[str] = ("royalty", "portfolio"),
+    fuzzy: bool = True,
+    limit: int = 20,
+) -> List[SearchHit]:
+    """
+    Book titles and portfolio names of an account that contain `query`, plus
+    (with `fuzzy`) near matches that tolerate typos, best match first.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if session.bind.dialect.name == "postgresql":
+        return await _search_postgres(session, account_identifier, query, kinds, fuzzy, limit)
+    return await _search_sqlite(session, account_identifier, query, kinds, fuzzy, limit)
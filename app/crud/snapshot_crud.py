@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.amounts import parse_amount
+from app.models.snapshot import RoyaltySnapshot
+
+def snapshot_row(account_identifier: str, item: dict, captured_at: datetime) -> dict:
+    """
+    Converts an aggregated royalty item (as produced by the parser) into a snapshot row.
+    """
+    return {
+        "account_identifier": account_identifier,
+        "book_title": item['bookTitle'],
+        "captured_at": captured_at,
+        "ebook_royalties": parse_amount(item['eBookRoyalties']),
+        "print_royalties": parse_amount(item['printRoyalties']),
+        "kenp_royalties": parse_amount(item['kenpRoyalties']),
+        "total_royalties": parse_amount(item['totalRoyalties']),
+        "total_royalties_usd": parse_amount(item['totalRoyaltiesUSD']),
+    }
+
+def removed_snapshot_row(account_identifier: str, book_title: str, captured_at: datetime) -> dict:
+    """
+    A zero-valued row recording that a title disappeared from the account.
+    """
+    return {
+        "account_identifier": account_identifier,
+        "book_title": book_title,
+        "captured_at": captured_at,
+        "ebook_royalties": 0.0,
+        "print_royalties": 0.0,
+        "kenp_royalties": 0.0,
+        "total_royalties": 0.0,
+        "total_royalties_usd": 0.0,
+    }
+
+async def record_snapshots(session: AsyncSession, rows: List[dict]) -> None:
+    """
+    Appends snapshot rows with one executemany INSERT. Does not commit.
+    """
+    if rows:
+        await session.exec(insert(RoyaltySnapshot), params=rows)
+
+async def get_snapshots(
+    session: AsyncSession,
+    account_identifier: str,
+    start: datetime,
+    end: datetime,
+    book_title: Optional[str] = None,
+) -> List[RoyaltySnapshot]:
+    """
+    Fetches snapshots captured in [start, end) ordered by time.
+    """
+    statement = select(RoyaltySnapshot).where(
+        RoyaltySnapshot.account_identifier == account_identifier,
+        RoyaltySnapshot.captured_at >= start,
+        RoyaltySnapshot.captured_at < end,
+    )
+    if book_title is not None:
+        statement = statement.where(RoyaltySnapshot.book_title == book_title)
+    result = await session.exec(statement.order_by(RoyaltySnapshot.captured_at, RoyaltySnapshot.id))
+    return list(result.all())
+
+async def get_latest_snapshots_before(
+    session: AsyncSession,
+    account_identifier: str,
+    before: datetime,
+    book_title: Optional[str] = None,
+) -> List[RoyaltySnapshot]:
+    """
+    Fetches the last snapshot of each title captured before `before`,
+    i.e. the values in effect at the start of a requested range.
+    """
+    ranked = select(
+        RoyaltySnapshot.id,
+        func.row_number().over(
+            partition_by=RoyaltySnapshot.book_title,
+            order_by=(RoyaltySnapshot.captured_at.desc(), RoyaltySnapshot.id.desc()),
+        ).label("rank"),
+    ).where(
+        RoyaltySnapshot.account_identifier == account_identifier,
+        RoyaltySnapshot.captured_at < before,
+    )
+    if book_title is not None:
+        ranked = ranked.where(RoyaltySnapshot.book_title == book_title)
+    ranked = ranked.subquery()
+    statement = (
+        select(RoyaltySnapshot)
+        .join(ranked, ranked.c.id == RoyaltySnapshot.id)
+        .where(ranked.c.rank == 1)
+        .order_by(RoyaltySnapshot.book_title)
+    )
+    result = await session.exec(statement)
+    return list(result.all())
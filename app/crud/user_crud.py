@@ -2,6 +2,8 @@ from typing import Optional
 from sqlmodel import Session, select
 from app.models.user import User, UserCreate
 from app.core.security import get_password_hash
+from app.core.invalidation import invalidation_bus
+from app.db.session import acquire_writer
 
 async def get_user_by_email(session: Session, email: str) -> Optional[User]:
     """
@@ -16,8 +18,10 @@ async def create_user(session: Session, user_create: UserCreate) -> User:
     Creates a new user in the database.
     """
     hashed_password = get_password_hash(user_create.password)
+    await acquire_writer(session)
     user = User(email=user_create.email, hashed_password=hashed_password)
     session.add(user)
+    await invalidation_bus.publish(session, "user", user_create.email)
     await session.commit()
     await session.refresh(user)
     return user
@@ -0,0 +1,20 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+def upsert_insert(session: AsyncSession, model):
+    """
+    Returns a dialect-specific INSERT for `model` that supports on_conflict_do_update/nothing.
+    Both Postgres and SQLite implement INSERT ... ON CONFLICT.
+    """
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def format_amount(session: AsyncSession, expression):
+    """
+    SQL expression rendering a number as a two-decimal string ("12.30"), like the scraped amounts.
+    """
+    if session.bind.dialect.name == "postgresql":
+        return func.to_char(expression, 'FM999999999990.00')
+    return func.printf('%.2f', expression)
@@ -0,0 +1,51 @@
+import hashlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.session import acquire_writer
+
+def account_lock_key(account_identifier: str) -> int:
+    """
+    Maps an account identifier to a stable signed 64-bit advisory lock key.
+    """
+    digest = hashlib.blake2b(account_identifier.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+async def lock_account(session: AsyncSession, account_identifier: str) -> None:
+    """
+    Serializes writers for one account across processes and replicas.
+    On Postgres this takes a transaction-scoped advisory lock, released automatically
+    at commit or rollback. On SQLite the transaction becomes the single writer
+    (see app.db.session.acquire_writer), which serializes all accounts in-process.
+    """
+    if session.bind.dialect.name != "postgresql":
+        await acquire_writer(session)
+        return
+    await session.exec(
+        text("SELECT pg_advisory_xact_lock(:key)").bindparams(key=account_lock_key(account_identifier))
+    )
+
+@asynccontextmanager
+async def leader_lock(engine: AsyncEngine, name: str) -> AsyncIterator[bool]:
+    """
+    Yields True in exactly one process at a time for `name`, False elsewhere, so
+    scheduled work runs on a single replica. On Postgres this is a session-level
+    advisory lock held on a dedicated connection for the duration of the block
+    (and dropped if that connection dies); other databases assume one process.
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    key = account_lock_key(f"leader:{name}")
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)").bindparams(key=key))
+        acquired = bool(result.scalar())
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)").bindparams(key=key))
+                await conn.commit()
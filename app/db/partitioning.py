@@ -0,0 +1,135 @@
+"""
+Optional hash partitioning of the royalty and portfolio tables by account_identifier.
+
+Set PARTITION_COUNT > 0 on Postgres to declare both tables PARTITION BY HASH with
+that many partitions (royalty_p0 ... royalty_pN-1). Every account's rows then live
+in one partition, so per-account queries are pruned to it and index size and
+vacuum work stay bounded per partition. Postgres requires the partition key in
+every unique constraint, so in this mode the primary keys become
+(id, account_identifier) and royalty references portfolio by both columns.
+SQLite (and PARTITION_COUNT = 0) keeps the plain tables.
+
+Existing databases are converted by the alembic migration, which calls
+convert_to_partitioned() / convert_to_unpartitioned().
+"""
+from typing import List
+from sqlalchemy import DDL, ForeignKeyConstraint, event
+
+from app.core.settings import settings
+
+PARTITIONED_TABLES = ("portfolio", "royalty")
+
+def partitioning_enabled() -> bool:
+    return settings.PARTITION_COUNT > 0 and settings.DATABASE_URL.startswith("postgresql")
+
+PARTITIONED = partitioning_enabled()
+
+# Integer ids in a composite primary key only get a sequence when asked explicitly.
+ID_COLUMN_KWARGS = {"autoincrement": True} if PARTITIONED else {}
+
+# The composite foreign key also covers account_identifier, which must never be
+# nulled when a portfolio is deleted, so the ORM link is kept on portfolio_id (ids
+# stay unique across partitions: they come from one sequence).
+PORTFOLIO_LINK_KWARGS = (
+    {"primaryjoin": "Royalty.portfolio_id == Portfolio.id", "foreign_keys": "[Royalty.portfolio_id]"}
+    if PARTITIONED else {}
+)
+
+def partition_table_args(table_name: str) -> tuple:
+    """
+    Extra __table_args__ entries for a partitioned table; empty when partitioning is off.
+    """
+    if not PARTITIONED:
+        return ()
+    args = []
+    if table_name == "royalty":
+        args.append(ForeignKeyConstraint(
+            ["portfolio_id", "account_identifier"], ["portfolio.id", "portfolio.account_identifier"],
+            name="royalty_portfolio_fkey",
+        ))
+    args.append({"postgresql_partition_by": "HASH (account_identifier)"})
+    return tuple(args)
+
+def partition_statements(table_name: str, count: int, parent: str = None) -> List[str]:
+    parent = parent or table_name
+    return [
+        f"CREATE TABLE {table_name}_p{remainder} PARTITION OF {parent} FOR VALUES WITH (MODULUS {count}, REMAINDER {remainder})"
+        for remainder in range(count)
+    ]
+
+def register_partitions(table) -> None:
+    """
+    Creates the hash partitions right after the (partitioned) parent table.
+    """
+    if not PARTITIONED:
+        return
+    for statement in partition_statements(table.name, settings.PARTITION_COUNT):
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+INDEXES = {
+    "portfolio": [
+        "CREATE INDEX ix_portfolio_account_identifier ON portfolio (account_identifier)",
+        "CREATE INDEX ix_portfolio_account_change_seq ON portfolio (account_identifier, change_seq)",
+        "CREATE INDEX ix_portfolio_name_trgm ON portfolio USING gin (portfolio_name gin_trgm_ops)",
+    ],
+    "royalty": [
+        "CREATE INDEX ix_royalty_account_identifier ON royalty (account_identifier)",
+        "CREATE INDEX ix_royalty_portfolio_id ON royalty (portfolio_id)",
+        "CREATE INDEX ix_royalty_account_change_seq ON royalty (account_identifier, change_seq)",
+        "CREATE INDEX ix_royalty_book_title_trgm ON royalty USING gin (book_title gin_trgm_ops)",
+    ],
+}
+
+def _swap_statements(new_suffix: str, create_new: dict, primary_keys: dict, foreign_key: str) -> List[str]:
+    """
+    Copies both tables into freshly created replacements and swaps them in, keeping the id sequences.
+    """
+    statements = []
+    for table in PARTITIONED_TABLES:
+        statements.extend(create_new[table])
+        statements.append(f"INSERT INTO {table}{new_suffix} SELECT * FROM {table}")
+    for table in PARTITIONED_TABLES:
+        statements.append(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    statements.append("DROP TABLE royalty")
+    statements.append("DROP TABLE portfolio")
+    for table in PARTITIONED_TABLES:
+        statements.append(f"ALTER TABLE {table}{new_suffix} RENAME TO {table}")
+        statements.append(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        statements.append(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({primary_keys[table]})")
+        statements.extend(INDEXES[table])
+    statements.append(foreign_key)
+    return statements
+
+def convert_to_partitioned(count: int) -> List[str]:
+    """
+    Statements that rebuild royalty and portfolio as hash-partitioned tables with `count` partitions.
+    """
+    create_new = {
+        table: [
+            f"CREATE TABLE {table}_partitioned (LIKE {table} INCLUDING DEFAULTS) PARTITION BY HASH (account_identifier)",
+            *partition_statements(table, count, parent=f"{table}_partitioned"),
+        ]
+        for table in PARTITIONED_TABLES
+    }
+    return _swap_statements(
+        "_partitioned",
+        create_new,
+        {table: "id, account_identifier" for table in PARTITIONED_TABLES},
+        "ALTER TABLE royalty ADD CONSTRAINT royalty_portfolio_fkey FOREIGN KEY (portfolio_id, account_identifier) "
+        "REFERENCES portfolio (id, account_identifier)",
+    )
+
+def convert_to_unpartitioned() -> List[str]:
+    """
+    Statements that turn partitioned royalty and portfolio tables back into plain tables.
+    """
+    create_new = {
+        table: [f"CREATE TABLE {table}_plain (LIKE {table} INCLUDING DEFAULTS)"]
+        for table in PARTITIONED_TABLES
+    }
+    return _swap_statements(
+        "_plain",
+        create_new,
+        {table: "id" for table in PARTITIONED_TABLES},
+        "ALTER TABLE royalty ADD CONSTRAINT royalty_portfolio_id_fkey FOREIGN KEY (portfolio_id) REFERENCES portfolio (id)",
+    )
@@ -1,14 +1,85 @@
+import asyncio
 from typing import AsyncGenerator
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from app.core.settings import settings
 
-# Create the async engine
+def engine_pool_options(database_url: str) -> dict:
+    """
+    Connection pool sizing for one process; SQLite keeps SQLAlchemy's defaults.
+    """
+    if database_url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+# Create the async engine (one per process: every server worker imports this module itself)
 engine: AsyncEngine = create_async_engine(
-    settings.DATABASE_URL, echo=True, pool_pre_ping=True
+    settings.DATABASE_URL, echo=True, pool_pre_ping=True, **engine_pool_options(settings.DATABASE_URL)
 )
 
+def sqlite_pragmas() -> list:
+    return [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+    ]
+
+def configure_sqlite(async_engine: AsyncEngine) -> None:
+    """
+    Applies the embedded SQLite profile (WAL, synchronous=NORMAL, mmap, page cache,
+    busy timeout) to every new connection of `async_engine`. No-op for other databases.
+    """
+    if async_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
+configure_sqlite(engine)
+
+# SQLite allows one writer at a time. Rather than letting write transactions race and
+# poll on busy_timeout, they queue on this lock in arrival order; reads never take it.
+_sqlite_writer = asyncio.Lock()
+_WRITER_KEY = "sqlite_writer"
+
+async def acquire_writer(session: AsyncSession) -> None:
+    """
+    Makes `session` the single SQLite writer until its current transaction commits or
+    rolls back. Safe to call again within the same transaction. No-op on other databases.
+    """
+    if session.bind.dialect.name != "sqlite" or not settings.SQLITE_SINGLE_WRITER:
+        return
+    if session.info.get(_WRITER_KEY):
+        return
+    await _sqlite_writer.acquire()
+    session.info[_WRITER_KEY] = True
+    try:
+        # Make sure there is a transaction whose end releases the writer.
+        await session.connection()
+    except BaseException:
+        session.info.pop(_WRITER_KEY)
+        _sqlite_writer.release()
+        raise
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_writer(session, transaction):
+    if transaction.parent is None and session.info.pop(_WRITER_KEY, False):
+        _sqlite_writer.release()
+
 async def init_db():
     """
     Initializes the database by creating all tables defined in SQLModel metadata.
@@ -1,21 +1,37 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-from app.db.session import init_db
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.db.session import init_db
-from app.api import royalties, portfolios, auth, dashboard
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.invalidation import invalidation_bus, listener_dsn
+from app.core.settings import settings
+from app.crud.deletion_crud import AccountDeleting
+from app.db.session import engine, init_db
+from app.api import royalties, portfolios, auth, dashboard, jobs, analytics, changes, ingest, search, alerts
+from app.services.ingest_scheduler import IngestQueueFull
+from app.services.job_worker import start_workers
+from app.services.month_close import run_month_close_scheduler
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    FastAPI lifespan event handler to initialize the database on startup.
+    FastAPI lifespan event handler to initialize the database on startup
+    and run the background ingest workers, the month-end close scheduler
+    (and, on Postgres, the cache invalidation listener) for the lifetime of the app.
     """
     await init_db()
+    stop_workers = asyncio.Event()
+    worker_tasks = start_workers(settings.INGEST_WORKERS, stop_workers)
+    if engine.dialect.name == "postgresql":
+        worker_tasks.append(asyncio.create_task(invalidation_bus.listen(listener_dsn(settings.DATABASE_URL), stop_workers)))
+    if settings.MONTH_CLOSE_ENABLED:
+        worker_tasks.append(asyncio.create_task(run_month_close_scheduler(stop_workers)))
     yield
+    stop_workers.set()
+    await asyncio.gather(*worker_tasks, return_exceptions=True)
+    await engine.dispose()
 
 app = FastAPI(
     title="KDP Backend API",
@@ -24,6 +40,21 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+@app.exception_handler(AccountDeleting)
+async def account_deleting_handler(request: Request, exc: AccountDeleting):
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": str(exc)})
+
+@app.exception_handler(IngestQueueFull)
+async def ingest_queue_full_handler(request: Request, exc: IngestQueueFull):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Added before CORS so it runs inside it: replayed and rejected responses still get CORS headers.
+app.add_middleware(IdempotencyMiddleware)
+
 origins = [
     "http://localhost:3000",  # Your Next.js frontend URL
     "*" # Allow all origins for now, refine in production
@@ -39,4 +70,10 @@ app.add_middleware(
 app.include_router(royalties.router, prefix="/api/royalties", tags=["royalties"])
 app.include_router(portfolios.router, prefix="/api/portfolios", tags=["portfolios"])
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(changes.router, prefix="/api/changes", tags=["changes"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -0,0 +1,22 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from datetime import datetime
+
+class AccountDeletionBase(SQLModel):
+    account_identifier: str = Field(primary_key=True)
+    status: str = Field(default="deleting")  # "deleting" while the purge runs, then "deleted"
+    job_id: Optional[int] = Field(default=None)
+    royalties_deleted: int = Field(default=0)
+    portfolios_deleted: int = Field(default=0)
+    requested_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+
+class AccountDeletion(AccountDeletionBase, table=True):
+    """
+    Tracks an account deletion. While status is "deleting" the account is hidden from
+    reads and rejects writes, and a background job purges its rows in small batches.
+    """
+    __tablename__ = "account_deletion"
+
+class AccountDeletionRead(AccountDeletionBase):
+    pass
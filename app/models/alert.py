@@ -0,0 +1,59 @@
+from typing import Literal, Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Index
+from datetime import datetime
+
+ALERT_KINDS = ("spend_over_royalties", "royalty_drop")
+
+class AlertRuleBase(SQLModel):
+    account_identifier: str = Field(index=True)
+    # "spend_over_royalties": a portfolio's spend exceeds the royalties of its linked titles by more than `threshold` (USD).
+    # "royalty_drop": a title's total_royalties_usd falls by at least `threshold` (a fraction, 0.2 = 20%) in one update.
+    kind: str
+    threshold: float = Field(default=0.0)
+
+class AlertRule(AlertRuleBase, table=True):
+    """
+    A user-defined threshold rule, evaluated at ingest time against the rows each write changed.
+    """
+    __tablename__ = "alert_rule"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AlertRuleCreate(SQLModel):
+    account_identifier: str
+    kind: Literal["spend_over_royalties", "royalty_drop"]
+    threshold: float = Field(default=0.0, ge=0)
+
+class AlertRuleRead(AlertRuleBase):
+    id: int
+    created_at: datetime
+
+class AlertBase(SQLModel):
+    rule_id: int
+    account_identifier: str
+    subject_type: str  # "portfolio" or "royalty"
+    subject_id: int
+    subject_name: str
+    value: float  # Spend minus linked royalties, or the title's new royalties
+    reference: float  # Linked royalties, or the title's royalties before the drop
+    status: str = Field(default="active")  # "active" until the condition clears, then "resolved"
+    triggered_at: datetime = Field(default_factory=datetime.utcnow)
+    resolved_at: Optional[datetime] = Field(default=None)
+
+class Alert(AlertBase, table=True):
+    """
+    One firing of a rule for one portfolio or title. At most one alert per rule and
+    subject is active at a time; it resolves when a later write clears the condition.
+    """
+    __tablename__ = "alert"
+    __table_args__ = (
+        Index("ix_alert_account_status", "account_identifier", "status"),
+        Index("ix_alert_rule_subject", "rule_id", "subject_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+class AlertRead(AlertBase):
+    id: int
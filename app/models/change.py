@@ -0,0 +1,30 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import BigInteger, Column, Index, Integer
+from datetime import datetime
+
+class AccountChangeSeq(SQLModel, table=True):
+    """
+    Last change sequence number handed out for an account.
+    Each write transaction takes the next number and stamps every row it touches with it.
+    """
+    __tablename__ = "account_change_seq"
+
+    account_identifier: str = Field(primary_key=True)
+    last_seq: int = Field(default=0, sa_type=BigInteger)
+
+class ChangeTombstone(SQLModel, table=True):
+    """
+    Marker for a royalty or portfolio row that was deleted, so change feed clients can drop it.
+    """
+    __tablename__ = "change_tombstone"
+    __table_args__ = (
+        Index("ix_change_tombstone_account_seq", "account_identifier", "change_seq"),
+    )
+
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True))
+    account_identifier: str
+    entity: str  # "royalty" or "portfolio"
+    entity_id: int
+    change_seq: int = Field(sa_type=BigInteger)
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,20 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import LargeBinary
+from datetime import datetime
+
+class IdempotencyRecord(SQLModel, table=True):
+    """
+    A write request made with an Idempotency-Key header: "pending" while the original
+    runs, then "done" with its response, which retries replay until `expires_at`.
+    """
+    __tablename__ = "idempotency_record"
+
+    key: str = Field(primary_key=True)  # "<method> <path> <caller hash> <Idempotency-Key>"
+    fingerprint: str  # Hash of the method, path, query, content headers and body
+    status: str = Field(default="pending")
+    status_code: Optional[int] = Field(default=None)
+    headers: Optional[str] = Field(default=None)  # JSON list of [name, value] pairs
+    body: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
@@ -0,0 +1,28 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Column, Index, Text
+from datetime import datetime
+
+class IngestJobBase(SQLModel):
+    kind: str
+    account_identifier: str = Field(index=True)
+    status: str = Field(default="pending")
+    attempts: int = Field(default=0)
+    result_count: Optional[int] = Field(default=None)
+    error: Optional[str] = Field(default=None)
+
+class IngestJob(IngestJobBase, table=True):
+    __tablename__ = "ingest_job"
+    __table_args__ = (Index("ix_ingest_job_status_id", "status", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    payload: str = Field(default="", sa_column=Column(Text, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+
+class IngestJobRead(IngestJobBase):
+    id: int
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
@@ -0,0 +1,19 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from datetime import datetime
+
+class MonthClose(SQLModel, table=True):
+    """
+    One completed month-end close: every title's last_month_royalty was set from
+    its value at `cutoff` (the end of `month` in `timezone`, stored as UTC).
+    """
+    __tablename__ = "month_close"
+
+    month: str = Field(primary_key=True)  # "YYYY-MM"
+    timezone: str
+    cutoff: datetime
+    accounts: int = Field(default=0)
+    updated_titles: int = Field(default=0)
+    applied: bool = Field(default=True)  # False when a later month was already closed
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
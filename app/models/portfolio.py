@@ -1,6 +1,8 @@
 from typing import Optional, List, TYPE_CHECKING
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import BigInteger, Index
 from datetime import datetime
+from app.db.partitioning import ID_COLUMN_KWARGS, PARTITIONED, PORTFOLIO_LINK_KWARGS, partition_table_args, register_partitions
 
 if TYPE_CHECKING:
     from .royalty import Royalty
@@ -11,10 +13,25 @@ class PortfolioBase(SQLModel):
     spend: str
 
 class Portfolio(PortfolioBase, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        Index("ix_portfolio_account_change_seq", "account_identifier", "change_seq"),
+        Index(
+            "ix_portfolio_name_trgm", "portfolio_name",
+            postgresql_using="gin", postgresql_ops={"portfolio_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        *partition_table_args("portfolio"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs=ID_COLUMN_KWARGS)
+    if PARTITIONED:
+        account_identifier: str = Field(index=True, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
-    royalties: List["Royalty"] = Relationship(back_populates="portfolio")
+    # Account change sequence of the last write that touched this row (see AccountChangeSeq)
+    change_seq: int = Field(default=0, sa_type=BigInteger, sa_column_kwargs={"server_default": "0"})
+    royalties: List["Royalty"] = Relationship(back_populates="portfolio", sa_relationship_kwargs=PORTFOLIO_LINK_KWARGS)
+
+register_partitions(Portfolio.__table__)
 
 class PortfolioCreate(PortfolioBase):
     pass
@@ -0,0 +1,44 @@
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Numeric
+from datetime import datetime
+
+AMOUNT_TYPE = Numeric(14, 2, asdecimal=False)
+
+class RollupTotals(SQLModel):
+    ebook_royalties: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    print_royalties: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    kenp_royalties: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    total_royalties: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    total_royalties_usd: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    spend: float = Field(default=0.0, sa_type=AMOUNT_TYPE)
+    title_count: int = Field(default=0)
+
+class AccountRollup(RollupTotals, table=True):
+    """
+    Per-account totals, maintained in the same transaction as every write.
+    """
+    __tablename__ = "account_rollup"
+
+    account_identifier: str = Field(primary_key=True)
+    portfolio_count: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
+
+class PortfolioRollup(RollupTotals, table=True):
+    """
+    Per-portfolio spend and totals of the royalties linked to it.
+    """
+    __tablename__ = "portfolio_rollup"
+
+    portfolio_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    account_identifier: str = Field(index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
+
+class AccountRollupRead(RollupTotals):
+    account_identifier: str
+    portfolio_count: int
+    updated_at: datetime
+
+class PortfolioRollupRead(RollupTotals):
+    portfolio_id: int
+    account_identifier: str
+    updated_at: datetime
@@ -1,6 +1,8 @@
 from typing import Optional, TYPE_CHECKING
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import BigInteger, Index
 from datetime import datetime
+from app.db.partitioning import ID_COLUMN_KWARGS, PARTITIONED, PORTFOLIO_LINK_KWARGS, partition_table_args, register_partitions
 
 if TYPE_CHECKING:
     from .portfolio import Portfolio
@@ -17,9 +19,28 @@ class RoyaltyBase(SQLModel):
     portfolio_id: Optional[int] = Field(default=None, foreign_key="portfolio.id", index=True)
 
 class Royalty(RoyaltyBase, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        Index("ix_royalty_account_change_seq", "account_identifier", "change_seq"),
+        # Substring and fuzzy title search (see app.models.search); SQLite uses an FTS5 table instead.
+        Index(
+            "ix_royalty_book_title_trgm", "book_title",
+            postgresql_using="gin", postgresql_ops={"book_title": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        *partition_table_args("royalty"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs=ID_COLUMN_KWARGS)
+    if PARTITIONED:
+        # The partition key joins the primary key, and the portfolio reference becomes
+        # (portfolio_id, account_identifier); see app.db.partitioning.
+        account_identifier: str = Field(index=True, primary_key=True)
+        portfolio_id: Optional[int] = Field(default=None, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
-    portfolio: Optional["Portfolio"] = Relationship(back_populates="royalties")
+    # Account change sequence of the last write that touched this row (see AccountChangeSeq)
+    change_seq: int = Field(default=0, sa_type=BigInteger, sa_column_kwargs={"server_default": "0"})
+    portfolio: Optional["Portfolio"] = Relationship(back_populates="royalties", sa_relationship_kwargs=PORTFOLIO_LINK_KWARGS)
+
+register_partitions(Royalty.__table__)
 
 class RoyaltyCreate(RoyaltyBase):
     pass
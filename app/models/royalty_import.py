@@ -0,0 +1,24 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import BigInteger, Column, Float, Index, Integer
+from datetime import datetime
+
+class RoyaltyImportRow(SQLModel, table=True):
+    """
+    Staging rows for bulk KDP CSV imports: one line of a royalty report, bucketed
+    into its month. Rows live from the import's first staged batch until its merge.
+    """
+    __tablename__ = "royalty_import_row"
+    __table_args__ = (
+        Index("ix_royalty_import_row_import", "import_id", "account_identifier"),
+    )
+
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True))
+    import_id: str
+    account_identifier: str
+    book_title: str
+    period_end: datetime  # Last second of the month the royalty was earned in
+    kind: str  # "ebook", "print" or "kenp"
+    currency: str
+    amount: float = Field(sa_type=Float)
+    staged_at: datetime  # When the import started; lets abandoned rows be cleared
@@ -0,0 +1,56 @@
+"""
+Search index DDL for book titles and portfolio names.
+
+Postgres searches the base tables through pg_trgm GIN indexes (declared on the
+models). SQLite has no trigram operator class, so titles and names are mirrored
+into an FTS5 table with the trigram tokenizer, kept in sync by triggers on every
+insert, rename and delete, whichever code path writes the rows.
+"""
+from sqlalchemy import DDL, event
+from sqlmodel import SQLModel
+
+SEARCH_TABLE = "title_search"
+
+# FTS rowids interleave both entities: royalty id * 2 and portfolio id * 2 + 1.
+SQLITE_SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, account_identifier UNINDEXED, entity UNINDEXED, entity_id UNINDEXED, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS royalty_search_insert AFTER INSERT ON royalty BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, account_identifier, entity, entity_id)
+        VALUES (new.id * 2, new.book_title, new.account_identifier, 'royalty', new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS royalty_search_update AFTER UPDATE OF book_title, account_identifier ON royalty BEGIN
+        UPDATE {SEARCH_TABLE} SET name = new.book_title, account_identifier = new.account_identifier WHERE rowid = new.id * 2;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS royalty_search_delete AFTER DELETE ON royalty BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS portfolio_search_insert AFTER INSERT ON portfolio BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, account_identifier, entity, entity_id)
+        VALUES (new.id * 2 + 1, new.portfolio_name, new.account_identifier, 'portfolio', new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS portfolio_search_update AFTER UPDATE OF portfolio_name, account_identifier ON portfolio BEGIN
+        UPDATE {SEARCH_TABLE} SET name = new.portfolio_name, account_identifier = new.account_identifier WHERE rowid = new.id * 2 + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS portfolio_search_delete AFTER DELETE ON portfolio BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+# Fills the index for rows written before it existed. A no-op once the index has rows.
+SQLITE_SEARCH_BACKFILL = [
+    f"""INSERT INTO {SEARCH_TABLE}(rowid, name, account_identifier, entity, entity_id)
+        SELECT id * 2, book_title, account_identifier, 'royalty', id FROM royalty
+        WHERE NOT EXISTS (SELECT 1 FROM {SEARCH_TABLE})""",
+    f"""INSERT INTO {SEARCH_TABLE}(rowid, name, account_identifier, entity, entity_id)
+        SELECT id * 2 + 1, portfolio_name, account_identifier, 'portfolio', id FROM portfolio
+        WHERE NOT EXISTS (SELECT 1 FROM {SEARCH_TABLE} WHERE entity = 'portfolio')""",
+]
+
+SQLITE_SEARCH_DROP = [f"DROP TABLE IF EXISTS {SEARCH_TABLE}"]
+
+event.listen(SQLModel.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL + SQLITE_SEARCH_BACKFILL:
+    event.listen(SQLModel.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_SEARCH_DROP:
+    event.listen(SQLModel.metadata, "after_drop", DDL(statement).execute_if(dialect="sqlite"))
@@ -0,0 +1,30 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from sqlalchemy import BigInteger, Column, Index, Integer, Numeric
+from datetime import datetime
+
+def _amount_column() -> Column:
+    return Column(Numeric(14, 2, asdecimal=False), nullable=False)
+
+class RoyaltySnapshot(SQLModel, table=True):
+    """
+    Append-only history of a title's royalty values, one row per ingest that changed it.
+    """
+    __tablename__ = "royalty_snapshot"
+    __table_args__ = (
+        Index("ix_royalty_snapshot_account_captured", "account_identifier", "captured_at"),
+        Index("ix_royalty_snapshot_account_title_captured", "account_identifier", "book_title", "captured_at"),
+        # Rows arrive in time order, so a BRIN index keeps month-range scans cheap at a tiny size.
+        Index("ix_royalty_snapshot_captured_brin", "captured_at", postgresql_using="brin"),
+    )
+
+    # BIGINT on Postgres; SQLite only autoincrements a plain INTEGER primary key.
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True))
+    account_identifier: str
+    book_title: str
+    captured_at: datetime
+    ebook_royalties: float = Field(sa_column=_amount_column())
+    print_royalties: float = Field(sa_column=_amount_column())
+    kenp_royalties: float = Field(sa_column=_amount_column())
+    total_royalties: float = Field(sa_column=_amount_column())
+    total_royalties_usd: float = Field(sa_column=_amount_column())
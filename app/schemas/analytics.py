@@ -0,0 +1,15 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+class PortfolioProfitability(BaseModel):
+    portfolio_id: int
+    portfolio_name: str
+    spend: float
+    royalties: float  # Sum of total_royalties_usd over linked titles
+    title_count: int
+    roas: Optional[float] = None  # royalties / spend; None without spend
+    acos: Optional[float] = None  # spend / royalties as a percentage; None without royalties
+
+class PortfolioAnalytics(BaseModel):
+    account_identifier: str
+    portfolios: List[PortfolioProfitability]
@@ -0,0 +1,12 @@
+from typing import List
+from sqlmodel import SQLModel
+from app.models.royalty import RoyaltyRead
+from app.models.portfolio import PortfolioRead
+
+class ChangeFeed(SQLModel):
+    account_identifier: str
+    cursor: int  # Pass back as `since` to receive only later changes
+    royalties: List[RoyaltyRead]
+    portfolios: List[PortfolioRead]
+    deleted_royalty_ids: List[int]
+    deleted_portfolio_ids: List[int]
@@ -2,6 +2,7 @@ from typing import List
 from sqlmodel import SQLModel
 from app.models.royalty import RoyaltyRead
 from app.models.portfolio import PortfolioRead
+from app.models.rollup import AccountRollupRead, PortfolioRollupRead
 
 class LinkedPortfolio(PortfolioRead):
     royalties: List[RoyaltyRead] = []
@@ -10,3 +11,7 @@ class DashboardData(SQLModel):
     linked_portfolios: List[LinkedPortfolio]
     unlinked_royalties: List[RoyaltyRead]
     unlinked_portfolios: List[PortfolioRead]
+
+class AccountSummary(SQLModel):
+    account: AccountRollupRead
+    portfolios: List[PortfolioRollupRead]
@@ -0,0 +1,9 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class ChangeEvent(BaseModel):
+    id: str  # "<broker epoch>-<sequence>", used as the SSE event id
+    account_identifier: str
+    type: str  # e.g. "royalties.upserted", "royalty.linked", "portfolios.deleted"
+    data: dict
+    created_at: datetime
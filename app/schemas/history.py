@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+class SnapshotPoint(BaseModel):
+    captured_at: datetime
+    ebook_royalties: float
+    print_royalties: float
+    kenp_royalties: float
+    total_royalties: float
+    total_royalties_usd: float
+
+class TitleSeries(BaseModel):
+    book_title: str
+    opening: Optional[SnapshotPoint] = None  # Values in effect at the start of the range
+    points: List[SnapshotPoint]
+
+class RoyaltyHistory(BaseModel):
+    account_identifier: str
+    start: datetime
+    end: datetime
+    titles: List[TitleSeries]
+    totals: List[SnapshotPoint]  # Account totals after each capture, carrying unchanged titles forward
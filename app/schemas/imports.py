@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+class ImportReport(BaseModel):
+    account_identifier: str
+    rows: int  # Report lines loaded into staging
+    skipped_rows: int  # Lines without a parseable date, title or royalty
+    snapshots: int  # Monthly per-title history rows written
+    updated_titles: int  # Existing royalties whose last_month_royalty was set
+    inserted_titles: int  # Titles added to the account
+    seconds: float
+    rows_per_second: float
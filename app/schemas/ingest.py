@@ -0,0 +1,64 @@
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+# Structured ingest, version 1. Unknown fields, strings for numbers and
+# non-finite values are rejected so client bugs surface as 422s, not bad rows.
+_STRICT = ConfigDict(extra="forbid", strict=True, str_strip_whitespace=True)
+
+class RoyaltyRowV1(BaseModel):
+    model_config = _STRICT
+
+    bookTitle: str = Field(min_length=1)
+    eBookRoyalties: float = Field(default=0.0, allow_inf_nan=False)
+    printRoyalties: float = Field(default=0.0, allow_inf_nan=False)
+    kenpRoyalties: float = Field(default=0.0, allow_inf_nan=False)
+    totalRoyalties: float = Field(allow_inf_nan=False)
+    totalRoyaltiesUSD: float = Field(allow_inf_nan=False)
+
+class PortfolioRowV1(BaseModel):
+    model_config = _STRICT
+
+    portfolio_name: str = Field(min_length=1)
+    spend: float = Field(allow_inf_nan=False)
+
+    def as_extracted(self) -> dict:
+        """
+        The row as extract_portfolio_rows would have produced it.
+        """
+        return {"portfolio_name": self.portfolio_name, "spend": f"{self.spend:.2f}"}
+
+class AccountIngestV1(BaseModel):
+    """
+    One account's rows. Omitting `royalties` or `portfolios` leaves that data untouched;
+    an empty list replaces it with nothing, exactly like an empty HTML page would.
+    """
+    model_config = _STRICT
+
+    accountIdentifier: str = Field(min_length=1)
+    royalties: Optional[List[RoyaltyRowV1]] = None
+    portfolios: Optional[List[PortfolioRowV1]] = None
+
+class IngestBatchV1(BaseModel):
+    model_config = _STRICT
+
+    accounts: List[AccountIngestV1] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def unique_accounts(self):
+        seen = set()
+        for account in self.accounts:
+            if account.accountIdentifier in seen:
+                raise ValueError(f"Account {account.accountIdentifier} appears more than once")
+            seen.add(account.accountIdentifier)
+        return self
+
+class AccountIngestResultV1(BaseModel):
+    accountIdentifier: str
+    royalties: Optional[int] = None  # Titles stored after aggregation; None when not sent
+    portfolios: Optional[int] = None
+    error: Optional[str] = None  # Set when a write failed; counts above it were applied, the rest was not
+
+class IngestReportV1(BaseModel):
+    accounts: List[AccountIngestResultV1]
+    rows: int  # Royalty and portfolio rows received
+    seconds: float
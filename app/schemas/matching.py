@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+class MatchProposal(BaseModel):
+    royalty_id: int
+    book_title: str
+    portfolio_id: int
+    portfolio_name: str
+    score: float
+    ambiguous: bool = False
+    applied: bool = False
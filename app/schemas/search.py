@@ -0,0 +1,13 @@
+from typing import List
+from pydantic import BaseModel
+
+class SearchHit(BaseModel):
+    kind: str  # "royalty" or "portfolio"
+    id: int
+    name: str  # Book title or portfolio name
+    score: float  # 1.0 for substring matches, otherwise the share of the query's trigrams found
+
+class SearchResults(BaseModel):
+    account_identifier: str
+    query: str
+    results: List[SearchHit]
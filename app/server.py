@@ -0,0 +1,64 @@
+"""
+Production entry point:
+
+    python -m app.server
+
+Runs app.main:app under uvicorn with WEB_CONCURRENCY worker processes (one per CPU
+by default), uvloop and httptools when they are installed (`pip install uvicorn[standard]`),
+and the keep-alive, backlog and graceful shutdown limits from Settings. Each worker
+imports the app itself, so it gets its own engine and connection pool
+(DB_POOL_SIZE + DB_MAX_OVERFLOW connections per worker), and its own INGEST_WORKERS
+job workers; the month-end close still runs on one process only (leader lock).
+In-process limits such as the ingest scheduler's caps apply per worker.
+"""
+import importlib.util
+import os
+
+import uvicorn
+
+from app.core.settings import settings
+
+def worker_count() -> int:
+    """
+    WEB_CONCURRENCY, or one worker per CPU. SQLite always gets one worker: its
+    single-writer queue only serializes writes within a process.
+    """
+    if settings.DATABASE_URL.startswith("sqlite"):
+        if settings.WEB_CONCURRENCY > 1:
+            print("SQLite supports a single writer process; ignoring WEB_CONCURRENCY and running 1 worker.")
+        return 1
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))  # CPUs this process may actually run on
+    return os.cpu_count() or 1
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def server_options() -> dict:
+    return {
+        "host": settings.HOST,
+        "port": settings.PORT,
+        "workers": worker_count(),
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "timeout_keep_alive": settings.SERVER_KEEPALIVE_SECONDS,
+        "backlog": settings.SERVER_BACKLOG,
+        "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY or None,
+        "limit_max_requests": settings.SERVER_MAX_REQUESTS or None,
+        "timeout_graceful_shutdown": settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        "proxy_headers": True,
+        "forwarded_allow_ips": settings.FORWARDED_ALLOW_IPS,
+    }
+
+def main() -> None:
+    options = server_options()
+    print(
+        f"Starting {options['workers']} worker(s) on {options['host']}:{options['port']} "
+        f"(loop={options['loop']}, http={options['http']})"
+    )
+    uvicorn.run("app.main:app", **options)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Opt-in capture of incoming KDP payloads, so slow or broken ingests can be replayed
+later with scripts/replay_captures.py.
+
+When INGEST_CAPTURE_DIR is set, a sample of the HTML payloads posted to the parse
+endpoints is written there, one zlib-compressed JSON file per payload. The account
+identifier is replaced by a keyed hash, so captures can be shared without revealing
+whose account they came from, while payloads of one account still replay together.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from lxml import etree
+
+from app.core.settings import settings
+
+CAPTURE_SUFFIX = ".kdp.z"
+CAPTURE_VERSION = 1
+
+def hash_account(account_identifier: str) -> str:
+    key = hashlib.sha256(settings.SECRET_KEY.encode("utf-8")).digest()
+    return hashlib.blake2b(account_identifier.encode("utf-8"), key=key, digest_size=12).hexdigest()
+
+def encode_capture(kind: str, account_identifier: str, html_content: str, captured_at: datetime) -> bytes:
+    record = {
+        "version": CAPTURE_VERSION,
+        "kind": kind,
+        "account": hash_account(account_identifier),
+        "captured_at": captured_at.isoformat(),
+        "html": html_content,
+    }
+    return zlib.compress(json.dumps(record).encode("utf-8"), 6)
+
+def decode_capture(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+def list_captures(directory: str) -> List[Path]:
+    """
+    Capture files under `directory`, oldest first (file names start with the capture time).
+    """
+    return sorted(Path(directory).glob(f"*{CAPTURE_SUFFIX}"), key=lambda path: path.name)
+
+def _write_capture(directory: str, name: str, data: bytes) -> Path:
+    os.makedirs(directory, exist_ok=True)
+    path = Path(directory) / name
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+    return path
+
+async def capture_payload(kind: str, account_identifier: str, html_content: Optional[str] = None, root=None) -> Optional[Path]:
+    """
+    Archives one payload if capture is enabled and it is sampled. Pass the HTML text, or
+    the parsed `root` of a streamed upload (serialized only when it is captured).
+    Never raises: a capture problem must not fail the ingest.
+    """
+    if not settings.INGEST_CAPTURE_DIR or random.random() >= settings.INGEST_CAPTURE_SAMPLE_RATE:
+        return None
+    try:
+        if html_content is None:
+            html_content = etree.tostring(root, method="html", encoding="unicode")
+        if len(html_content) > settings.INGEST_CAPTURE_MAX_BYTES:
+            print(f"Not capturing {kind} payload of {len(html_content)} characters (over INGEST_CAPTURE_MAX_BYTES)")
+            return None
+        captured_at = datetime.utcnow()
+        data = await asyncio.to_thread(encode_capture, kind, account_identifier, html_content, captured_at)
+        name = f"{captured_at:%Y%m%dT%H%M%S%f}-{kind}-{hash_account(account_identifier)[:12]}{CAPTURE_SUFFIX}"
+        return await asyncio.to_thread(_write_capture, settings.INGEST_CAPTURE_DIR, name, data)
+    except Exception as e:
+        print(f"Error capturing {kind} payload: {e}")
+        return None
@@ -0,0 +1,75 @@
+"""
+Server-sent event stream of an account's change events.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from app.core.events import ChangeBroker, change_broker
+from app.core.settings import settings
+from app.schemas.events import ChangeEvent
+
+RETRY_MILLISECONDS = 3000
+# Tells the client its resume point is gone and it should refetch the dashboard.
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+HEARTBEAT = ": heartbeat\n\n"
+
+def format_event(event: ChangeEvent) -> str:
+    payload = json.dumps({"account_identifier": event.account_identifier, **event.data}, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {payload}\n\n"
+
+async def stream_changes(
+    account_identifier: str,
+    last_event_id: Optional[str] = None,
+    heartbeat_seconds: Optional[float] = None,
+    broker: ChangeBroker = change_broker,
+) -> AsyncIterator[str]:
+    """
+    Yields SSE frames for an account until the consumer stops iterating.
+
+    Missed events are replayed from the broker's history when `last_event_id`
+    is given; a `reset` event is sent instead when they are no longer available.
+    The same replay recovers a connection whose queue overflowed.
+    """
+    heartbeat_seconds = heartbeat_seconds or settings.SSE_HEARTBEAT_SECONDS
+    # Subscribe before replaying so events published in between are not lost.
+    subscription = broker.subscribe(account_identifier)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        last_sequence = 0
+        if last_event_id:
+            missed = broker.events_since(account_identifier, last_event_id)
+            if missed is None:
+                last_sequence = broker.sequence
+                yield RESET_EVENT
+            else:
+                last_sequence = broker.sequence_of(last_event_id)
+                for event in missed:
+                    last_sequence = broker.sequence_of(event.id)
+                    yield format_event(event)
+
+        while True:
+            if subscription.overflowed:
+                subscription.drain()
+                missed = broker.events_since(account_identifier, f"{broker.epoch}-{last_sequence}")
+                if missed is None:
+                    last_sequence = broker.sequence
+                    yield RESET_EVENT
+                    continue
+                for event in missed:
+                    last_sequence = broker.sequence_of(event.id)
+                    yield format_event(event)
+                continue
+
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            sequence = broker.sequence_of(event.id)
+            if sequence <= last_sequence:
+                continue  # Already sent during replay
+            last_sequence = sequence
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
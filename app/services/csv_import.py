@@ -0,0 +1,207 @@
+"""
+Bulk import of KDP royalty report CSV exports.
+
+The report is parsed incrementally as it arrives and staged in batches (COPY on
+Postgres, executemany elsewhere), each committed on its own so a slow upload
+holds no account lock. The account is locked only for the merge, a handful of
+set-based statements in one transaction:
+
+    python -m scripts.import_kdp_csv --account acct-1 report-2023.csv report-2024.csv
+"""
+import calendar
+import codecs
+import csv
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.amounts import parse_amount
+from app.core.events import change_broker
+from app.core.invalidation import invalidation_bus
+from app.core.settings import settings
+from app.crud import change_crud, deletion_crud, import_crud, rollup_crud
+from app.db.locks import lock_account
+from app.db.session import acquire_writer
+from app.schemas.imports import ImportReport
+
+# Header names used by the different KDP report layouts, lowercased.
+COLUMN_ALIASES = {
+    "date": ("royalty date", "date", "order date", "month", "period"),
+    "title": ("title", "book title"),
+    "royalty": ("royalty", "royalties", "net royalty", "estimated royalty"),
+    "currency": ("currency",),
+    "type": ("royalty type", "format", "transaction type", "type", "marketplace format"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%Y-%m", "%b %Y", "%B %Y")
+
+def royalty_kind(description: str) -> str:
+    """
+    Buckets a report's royalty type/format into the ebook/print/kenp columns.
+    """
+    text = description.lower()
+    if "kenp" in text or "normalized" in text or "kindle unlimited" in text:
+        return "kenp"
+    if "paperback" in text or "hardcover" in text or "print" in text:
+        return "print"
+    return "ebook"
+
+def parse_report_date(value: str) -> Optional[datetime]:
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+def month_end(moment: datetime) -> datetime:
+    """
+    The last second of the month containing `moment`; used as the month's snapshot time.
+    """
+    last_day = calendar.monthrange(moment.year, moment.month)[1]
+    return datetime(moment.year, moment.month, last_day, 23, 59, 59)
+
+def map_columns(header: List[str]) -> Dict[str, int]:
+    """
+    Finds the position of each known column in a report header. Raises ValueError
+    when the date, title or royalty column is missing.
+    """
+    normalized = [name.strip().lower() for name in header]
+    positions = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[column] = normalized.index(alias)
+                break
+    missing = [column for column in ("date", "title", "royalty") if column not in positions]
+    if missing:
+        raise ValueError(f"CSV header is missing required column(s): {', '.join(missing)}")
+    return positions
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """
+    Yields parsed CSV records from a byte stream without buffering the whole body.
+    Quoted fields spanning several lines are reassembled before parsing.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    partial = ""
+    record_lines: List[str] = []
+    quotes = 0
+
+    def complete_records(lines: List[str]) -> List[str]:
+        nonlocal record_lines, quotes
+        records = []
+        for line in lines:
+            record_lines.append(line.rstrip("\r"))
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                records.append("\n".join(record_lines))
+                record_lines = []
+                quotes = 0
+        return records
+
+    async for chunk in chunks:
+        lines = (partial + decoder.decode(chunk)).split("\n")
+        partial = lines.pop()
+        for record in csv.reader(complete_records(lines)):
+            yield record
+    tail = partial + decoder.decode(b"", final=True)
+    remaining = complete_records([tail] if tail else [])
+    if record_lines:
+        remaining.append("\n".join(record_lines))
+    for record in csv.reader(remaining):
+        yield record
+
+async def _stage_batch(session: AsyncSession, rows: List[tuple]) -> None:
+    if not rows:
+        return
+    await acquire_writer(session)  # SQLite: hold the single writer for this batch only
+    await import_crud.stage_rows(session, rows)
+    await session.commit()
+
+async def import_royalty_csv(
+    session: AsyncSession,
+    account_identifier: str,
+    chunks: AsyncIterator[bytes],
+    batch_size: Optional[int] = None,
+) -> ImportReport:
+    """
+    Imports one KDP royalty report for an account and commits. Raises ValueError
+    for an unrecognized header, in which case nothing is merged.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    started = time.perf_counter()
+    import_id = uuid.uuid4().hex
+    staged_at = datetime.utcnow()
+    # Fail fast before reading the body; checked again under the lock before merging.
+    await deletion_crud.ensure_not_deleting(session, account_identifier)
+
+    positions = None
+    batch = []
+    row_count = 0
+    skipped = 0
+    try:
+        async for record in iter_csv_records(chunks):
+            if not any(field.strip() for field in record):
+                continue
+            if positions is None:
+                positions = map_columns(record)
+                continue
+            try:
+                moment = parse_report_date(record[positions["date"]])
+                title = record[positions["title"]].strip()
+                amount = parse_amount(record[positions["royalty"]])
+                currency = record[positions["currency"]].strip().upper() if "currency" in positions else "USD"
+                kind = royalty_kind(record[positions["type"]]) if "type" in positions else "ebook"
+            except IndexError:
+                moment = None
+            if moment is None or not title:
+                skipped += 1
+                continue
+            batch.append((import_id, account_identifier, title, month_end(moment), kind, currency, amount, staged_at))
+            if len(batch) >= batch_size:
+                await _stage_batch(session, batch)
+                row_count += len(batch)
+                batch = []
+        if positions is None:
+            raise ValueError("CSV file is empty")
+        await _stage_batch(session, batch)
+        row_count += len(batch)
+
+        await lock_account(session, account_identifier)
+        await deletion_crud.ensure_not_deleting(session, account_identifier)
+        await import_crud.clear_abandoned_staging(
+            session, staged_at - timedelta(seconds=settings.IMPORT_STAGING_MAX_AGE_SECONDS)
+        )
+        change_seq = await change_crud.next_change_seq(session, account_identifier)
+        last_month_end = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(seconds=1)
+        counts = await import_crud.merge_import(session, import_id, account_identifier, last_month_end, change_seq)
+        await invalidation_bus.publish(session, "account", account_identifier)
+    except BaseException:
+        await session.rollback()
+        try:
+            await acquire_writer(session)
+            await import_crud.clear_staging(session, import_id)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            print(f"Could not clear staged rows of import {import_id}: {e}")
+        raise
+
+    # Inserted titles change the account's title count; recompute its rollups and commit everything.
+    await rollup_crud.rebuild_rollups(session, account_identifier)
+    change_broker.publish(account_identifier, "royalties.imported", counts)
+
+    seconds = time.perf_counter() - started
+    print(f"Imported {row_count} report rows for {account_identifier} in {seconds:.2f}s ({row_count / seconds:,.0f} rows/s).")
+    return ImportReport(
+        account_identifier=account_identifier,
+        rows=row_count,
+        skipped_rows=skipped,
+        seconds=round(seconds, 3),
+        rows_per_second=round(row_count / seconds, 1) if seconds else 0.0,
+        **counts,
+    )
@@ -0,0 +1,76 @@
+"""
+Streaming CSV/NDJSON exports.
+
+Rows are read through a server-side cursor (`yield_per`) as plain column tuples,
+never as ORM objects, and written out in small chunks, so memory stays flat no
+matter how many rows an export covers and the header is sent immediately.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.crud.deletion_crud import visible
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+ROYALTY_EXPORT_COLUMNS = (
+    "id", "account_identifier", "book_title", "ebook_royalties", "print_royalties", "kenp_royalties",
+    "total_royalties", "total_royalties_usd", "last_month_royalty", "portfolio_id", "updated_at",
+)
+PORTFOLIO_EXPORT_COLUMNS = ("id", "account_identifier", "portfolio_name", "spend", "created_at", "updated_at")
+YIELD_PER = 2000
+
+def export_statement(
+    model,
+    columns: tuple,
+    account_identifier: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+):
+    statement = select(*[getattr(model, column) for column in columns]).where(visible(model))
+    if account_identifier is not None:
+        statement = statement.where(model.account_identifier == account_identifier)
+    if updated_since is not None:
+        statement = statement.where(model.updated_at >= updated_since)
+    if updated_before is not None:
+        statement = statement.where(model.updated_at < updated_before)
+    return statement.order_by(model.id).execution_options(yield_per=YIELD_PER)
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def stream_export(session: AsyncSession, statement, columns: tuple, export_format: str) -> AsyncIterator[str]:
+    """
+    Yields the rows of `statement` as CSV (with a header row) or NDJSON, one chunk per fetched batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer is not None:
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    result = await session.stream(statement)
+    async for partition in result.partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        if writer is not None:
+            writer.writerows([[_json_value(v) for v in row] for row in partition])
+        else:
+            for row in partition:
+                buffer.write(json.dumps(dict(zip(columns, map(_json_value, row))), separators=(",", ":")))
+                buffer.write("\n")
+        yield buffer.getvalue()
+
+def export_royalties(session: AsyncSession, export_format: str, **filters) -> AsyncIterator[str]:
+    statement = export_statement(Royalty, ROYALTY_EXPORT_COLUMNS, **filters)
+    return stream_export(session, statement, ROYALTY_EXPORT_COLUMNS, export_format)
+
+def export_portfolios(session: AsyncSession, export_format: str, **filters) -> AsyncIterator[str]:
+    statement = export_statement(Portfolio, PORTFOLIO_EXPORT_COLUMNS, **filters)
+    return stream_export(session, statement, PORTFOLIO_EXPORT_COLUMNS, export_format)
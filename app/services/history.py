@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.crud import snapshot_crud
+from app.models.snapshot import RoyaltySnapshot
+from app.schemas.history import RoyaltyHistory, SnapshotPoint, TitleSeries
+
+VALUE_FIELDS = ("ebook_royalties", "print_royalties", "kenp_royalties", "total_royalties", "total_royalties_usd")
+
+def _point(snapshot: RoyaltySnapshot) -> SnapshotPoint:
+    return SnapshotPoint(captured_at=snapshot.captured_at, **{field: getattr(snapshot, field) for field in VALUE_FIELDS})
+
+def _sum_point(captured_at: datetime, current: Dict[str, SnapshotPoint]) -> SnapshotPoint:
+    return SnapshotPoint(
+        captured_at=captured_at,
+        **{field: round(sum(getattr(p, field) for p in current.values()), 2) for field in VALUE_FIELDS},
+    )
+
+async def build_history(
+    session: AsyncSession,
+    account_identifier: str,
+    start: datetime,
+    end: datetime,
+    book_title: Optional[str] = None,
+    include_titles: bool = True,
+) -> RoyaltyHistory:
+    """
+    Builds per-title and account-total series for [start, end) from two range queries:
+    the opening value of each title before `start`, and the snapshots inside the range.
+    """
+    opening = await snapshot_crud.get_latest_snapshots_before(session, account_identifier, start, book_title)
+    snapshots = await snapshot_crud.get_snapshots(session, account_identifier, start, end, book_title)
+
+    current: Dict[str, SnapshotPoint] = {s.book_title: _point(s) for s in opening}
+    series: Dict[str, TitleSeries] = {
+        title: TitleSeries(book_title=title, opening=point, points=[]) for title, point in current.items()
+    }
+
+    totals: List[SnapshotPoint] = []
+    if current:
+        totals.append(_sum_point(start, current))
+
+    for snapshot in snapshots:
+        point = _point(snapshot)
+        current[snapshot.book_title] = point
+        series.setdefault(snapshot.book_title, TitleSeries(book_title=snapshot.book_title, points=[])).points.append(point)
+        # Snapshots from one ingest share a timestamp; emit a single total for them.
+        if totals and totals[-1].captured_at == snapshot.captured_at:
+            totals[-1] = _sum_point(snapshot.captured_at, current)
+        else:
+            totals.append(_sum_point(snapshot.captured_at, current))
+
+    return RoyaltyHistory(
+        account_identifier=account_identifier,
+        start=start,
+        end=end,
+        titles=sorted(series.values(), key=lambda s: s.book_title) if include_titles else [],
+        totals=totals,
+    )
@@ -0,0 +1,110 @@
+"""
+Streaming intake of raw (optionally compressed) HTML uploads.
+
+Request body chunks are decompressed incrementally, with the output of every
+step bounded, and fed straight into lxml's incremental HTML parser, so the
+page is never held as one JSON string, one bytes object and one Python str
+at the same time.
+"""
+import zlib
+from typing import AsyncIterator, Optional
+
+from lxml import etree
+
+# Upper bound on decompressed bytes produced per step, so a small compressed chunk
+# cannot expand into a huge buffer before the size limit is checked.
+DECOMPRESS_STEP = 64 * 1024
+
+class PayloadTooLarge(ValueError):
+    pass
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+def _decompressor(content_encoding: Optional[str]):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        # Per RFC 9110 deflate is zlib-wrapped; 32 + MAX_WBITS also auto-detects a gzip header.
+        return zlib.decompressobj(32 + zlib.MAX_WBITS)
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {content_encoding}")
+
+async def iter_decompressed(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str],
+    max_bytes: int,
+) -> AsyncIterator[bytes]:
+    """
+    Yields the decoded body in pieces. Raises PayloadTooLarge as soon as the
+    decompressed size exceeds `max_bytes`, and ValueError for corrupt data.
+    """
+    decompressor = _decompressor(content_encoding)
+    total = 0
+
+    def check(size: int) -> None:
+        nonlocal total
+        total += size
+        if total > max_bytes:
+            raise PayloadTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+
+    async for chunk in chunks:
+        if decompressor is None:
+            check(len(chunk))
+            yield chunk
+            continue
+        data = chunk
+        try:
+            while data:
+                piece = decompressor.decompress(data, DECOMPRESS_STEP)
+                check(len(piece))
+                if piece:
+                    yield piece
+                data = decompressor.unconsumed_tail
+        except zlib.error as e:
+            raise ValueError(f"Corrupt {content_encoding} body: {e}")
+
+    if decompressor is not None:
+        piece = decompressor.flush()
+        check(len(piece))
+        if piece:
+            yield piece
+
+async def parse_html_stream(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str],
+    max_bytes: int,
+    charset: Optional[str] = None,
+):
+    """
+    Feeds the decoded body into lxml's incremental HTML parser and returns the document root.
+    Bodies without a declared charset are read as UTF-8, like read_html_stream.
+    """
+    parser = etree.HTMLParser(encoding=charset or "utf-8")
+    received = False
+    async for piece in iter_decompressed(chunks, content_encoding, max_bytes):
+        received = True
+        parser.feed(piece)
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        root = None
+    if not received or root is None:
+        raise ValueError("Empty HTML body")
+    return root
+
+async def read_html_stream(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str],
+    max_bytes: int,
+    charset: Optional[str] = None,
+) -> str:
+    """
+    Returns the decoded body as text, for payloads that are stored rather than parsed now.
+    """
+    pieces = [piece async for piece in iter_decompressed(chunks, content_encoding, max_bytes)]
+    if not pieces:
+        raise ValueError("Empty HTML body")
+    return b"".join(pieces).decode(charset or "utf-8", errors="replace")
@@ -0,0 +1,321 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from app.core.settings import settings
+from app.crud import portfolio_crud, royalty_crud
+from app.models.portfolio import PortfolioRead
+from app.models.royalty import RoyaltyRead
+from app.schemas.ingest import AccountIngestResultV1, AccountIngestV1
+from app.services.matcher import match_account
+from app.services.single_flight import ingest_coalescer
+
+def extract_royalty_rows(html_content: str) -> List[dict]:
+    """
+    Extracts one row per book from KDP Royalties Estimator HTML.
+    Summary rows (no cover image) are skipped.
+    """
+    soup = BeautifulSoup(html_content, 'lxml')
+    extracted_data = []
+
+    table_rows = soup.select("div.ui.items.no-margin.unstackable > div.item")
+
+    for row in table_rows:
+        if not row.select_one("img"):
+            print("Skipping summary row...")
+            continue
+
+        title_element = row.select_one(".truncate-overflow")
+        title = title_element.get_text(strip=True) if title_element else "Title Not Found"
+
+        # More specific selectors to target each royalty value individually
+        royalty_values = row.select(".sixteen.wide.computer.column .row .right.aligned.column")
+        extracted_data.append(_royalty_item(title, [value.get_text(strip=True) for value in royalty_values]))
+
+    return extracted_data
+
+def _royalty_item(title: str, value_texts: List[str]) -> dict:
+    """
+    Builds an extracted royalty row from a title and the texts of its value cells.
+    """
+    def clean_royalty_value(value):
+        return value.replace('$', '').replace(',', '').strip()
+
+    if len(value_texts) >= 5:
+        ebook_royalties, print_royalties, kenp_royalties, total_royalties, total_royalties_usd = [
+            clean_royalty_value(text) for text in value_texts[:5]
+        ]
+    else:
+        ebook_royalties, print_royalties, kenp_royalties, total_royalties, total_royalties_usd = ["0.00"] * 5
+
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": ebook_royalties,
+        "printRoyalties": print_royalties,
+        "kenpRoyalties": kenp_royalties,
+        "totalRoyalties": total_royalties,
+        "totalRoyaltiesUSD": total_royalties_usd,
+    }
+
+def _has_classes(*classes: str) -> str:
+    """
+    XPath predicate equivalent to the CSS selector `.a.b.c`.
+    """
+    return " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {c} ')" for c in classes)
+
+def _element_text(element) -> str:
+    """
+    Same result as BeautifulSoup's get_text(strip=True) for an lxml element.
+    """
+    return "".join(text.strip() for text in element.itertext(etree.Element))
+
+_ROYALTY_ROWS = etree.XPath(f"//div[{_has_classes('ui', 'items', 'no-margin', 'unstackable')}]/div[{_has_classes('item')}]")
+_ROYALTY_TITLE = etree.XPath(f".//*[{_has_classes('truncate-overflow')}]")
+_ROYALTY_VALUES = etree.XPath(
+    f".//*[{_has_classes('sixteen', 'wide', 'computer', 'column')}]"
+    f"//*[{_has_classes('row')}]//*[{_has_classes('right', 'aligned', 'column')}]"
+)
+_PORTFOLIO_NAMES = etree.XPath('//a[@data-e2e-id="entityNameRenderer"]')
+_PORTFOLIO_SPENDS = etree.XPath('//div[@data-e2e-id="tableCell_cell_spend"]//div[@data-e2e-id="currencyRenderer"]')
+
+def extract_royalty_rows_from_tree(root) -> List[dict]:
+    """
+    extract_royalty_rows for a document already parsed by lxml (see html_stream).
+    """
+    extracted_data = []
+    for row in _ROYALTY_ROWS(root):
+        if not row.xpath(".//img"):
+            continue
+        titles = _ROYALTY_TITLE(row)
+        title = _element_text(titles[0]) if titles else "Title Not Found"
+        extracted_data.append(_royalty_item(title, [_element_text(value) for value in _ROYALTY_VALUES(row)]))
+    return extracted_data
+
+def aggregate_royalty_rows(extracted_data: List[dict]) -> List[dict]:
+    """
+    Sums rows that share a book title and formats the totals as 2-decimal strings.
+    """
+    def to_float(value):
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return 0.0
+
+    aggregated_data = {}
+    for item in extracted_data:
+        title = item['bookTitle']
+
+        if title in aggregated_data:
+            aggregated_data[title]['eBookRoyalties'] += to_float(item['eBookRoyalties'])
+            aggregated_data[title]['printRoyalties'] += to_float(item['printRoyalties'])
+            aggregated_data[title]['kenpRoyalties'] += to_float(item['kenpRoyalties'])
+            aggregated_data[title]['totalRoyalties'] += to_float(item['totalRoyalties'])
+            aggregated_data[title]['totalRoyaltiesUSD'] += to_float(item['totalRoyaltiesUSD'])
+        else:
+            aggregated_data[title] = {
+                'bookTitle': title,
+                'eBookRoyalties': to_float(item['eBookRoyalties']),
+                'printRoyalties': to_float(item['printRoyalties']),
+                'kenpRoyalties': to_float(item['kenpRoyalties']),
+                'totalRoyalties': to_float(item['totalRoyalties']),
+                'totalRoyaltiesUSD': to_float(item['totalRoyaltiesUSD']),
+            }
+
+    final_data = list(aggregated_data.values())
+    for item in final_data:
+        item['eBookRoyalties'] = f"{item['eBookRoyalties']:.2f}"
+        item['printRoyalties'] = f"{item['printRoyalties']:.2f}"
+        item['kenpRoyalties'] = f"{item['kenpRoyalties']:.2f}"
+        item['totalRoyalties'] = f"{item['totalRoyalties']:.2f}"
+        item['totalRoyaltiesUSD'] = f"{item['totalRoyaltiesUSD']:.2f}"
+
+    return final_data
+
+def extract_portfolio_rows(html_content: str) -> List[dict]:
+    """
+    Extracts portfolio names and spend values from Advertising Portfolio HTML.
+    """
+    soup = BeautifulSoup(html_content, 'lxml')
+    extracted_data = []
+
+    name_elements = soup.select('a[data-e2e-id="entityNameRenderer"]')
+    spend_elements = soup.select('div[data-e2e-id="tableCell_cell_spend"] div[data-e2e-id="currencyRenderer"]')
+
+    if not name_elements:
+        print("Warning: No portfolio names found with selector 'a[data-e2e-id=\"entityNameRenderer\"]'")
+    if not spend_elements:
+         print("Warning: No spend values found with selector 'div[data-e2e-id=\"tableCell_cell_spend\"] div[data-e2e-id=\"currencyRenderer\"]'")
+
+    for name_tag, spend_tag in zip(name_elements, spend_elements):
+        name = name_tag.get_text(strip=True)
+        spend = spend_tag.get_text(strip=True)
+
+        extracted_data.append({
+            "portfolio_name": name,
+            "spend": spend
+        })
+
+    return extracted_data
+
+def extract_portfolio_rows_from_tree(root) -> List[dict]:
+    """
+    extract_portfolio_rows for a document already parsed by lxml (see html_stream).
+    """
+    return [
+        {"portfolio_name": _element_text(name_tag), "spend": _element_text(spend_tag)}
+        for name_tag, spend_tag in zip(_PORTFOLIO_NAMES(root), _PORTFOLIO_SPENDS(root))
+    ]
+
+def aggregate_portfolio_rows(extracted_data: List[dict]) -> List[dict]:
+    """
+    Sums spend for portfolios that share a name and formats it as a dollar string.
+    """
+    aggregated_data = {}
+    for item in extracted_data:
+        name = item['portfolio_name']
+        spend_str = item['spend'].replace('$', '').replace(',', '').strip()
+        try:
+            spend = float(spend_str)
+        except ValueError:
+            spend = 0.0
+
+        if name in aggregated_data:
+            aggregated_data[name]['spend'] += spend
+        else:
+            aggregated_data[name] = {'portfolio_name': name, 'spend': spend}
+
+    final_data = list(aggregated_data.values())
+    for item in final_data:
+        item['spend'] = f"${item['spend']:,.2f}"
+
+    return final_data
+
+async def auto_match(session: AsyncSession, account_identifier: str) -> Dict[int, int]:
+    """
+    Links unambiguous title/portfolio matches after an ingest when AUTO_MATCH_ON_INGEST is enabled.
+    Returns {royalty_id: portfolio_id} for the links it made.
+    """
+    if not settings.AUTO_MATCH_ON_INGEST:
+        return {}
+    proposals = await match_account(session, account_identifier, settings.AUTO_MATCH_MIN_SCORE, apply=True)
+    applied = {p.royalty_id: p.portfolio_id for p in proposals if p.applied}
+    if applied:
+        print(f"Auto-linked {len(applied)} royalties to portfolios for account {account_identifier}")
+    return applied
+
+async def ingest_royalties(
+    session: AsyncSession, account_identifier: str, html_content: str,
+    on_start: Optional[Callable[[], Awaitable[None]]] = None,
+) -> List[RoyaltyRead]:
+    """
+    Parses Royalties Estimator HTML and upserts the result for the account.
+    Concurrent ingests for the same account are coalesced: only the newest payload is processed.
+    `on_start` is awaited once the ingest has a scheduler slot and is about to run.
+    """
+    return await ingest_coalescer.run(
+        ("royalties", account_identifier),
+        lambda: _ingest_royalties(session, account_identifier, html_content),
+        len(html_content),
+        on_start,
+    )
+
+async def _ingest_royalties(session: AsyncSession, account_identifier: str, html_content: str) -> List[RoyaltyRead]:
+    print(f"Received HTML from account: {account_identifier}")
+    print("Starting HTML parsing...")
+    print(html_content[:500])  # Print the first 500 characters for debugging
+
+    extracted_data = extract_royalty_rows(html_content)
+    print("Successfully extracted data:")
+    print(extracted_data)
+    return await _upsert_royalty_rows(session, account_identifier, extracted_data)
+
+async def ingest_royalty_rows(
+    session: AsyncSession, account_identifier: str, extracted_data: List[dict], payload_size: int = 0,
+) -> List[RoyaltyRead]:
+    """
+    Upserts royalty rows that were already extracted (from a streamed upload or a client).
+    Coalesced with HTML ingests of the same account; `payload_size` weighs it for scheduling.
+    """
+    return await ingest_coalescer.run(
+        ("royalties", account_identifier),
+        lambda: _upsert_royalty_rows(session, account_identifier, extracted_data),
+        payload_size,
+    )
+
+async def _upsert_royalty_rows(session: AsyncSession, account_identifier: str, extracted_data: List[dict]) -> List[RoyaltyRead]:
+    final_data = aggregate_royalty_rows(extracted_data)
+    print(f"Aggregated {len(extracted_data)} royalty rows into {len(final_data)} titles for account {account_identifier}")
+
+    # Plain rows: coalesced callers share this result but not this session.
+    royalties = [RoyaltyRead.model_validate(r) for r in await royalty_crud.upsert_royalty_data(session, account_identifier, final_data)]
+    links = await auto_match(session, account_identifier)
+    for royalty in royalties:
+        royalty.portfolio_id = links.get(royalty.id, royalty.portfolio_id)
+    return royalties
+
+async def ingest_portfolios(
+    session: AsyncSession, account_identifier: str, html_content: str,
+    on_start: Optional[Callable[[], Awaitable[None]]] = None,
+) -> List[PortfolioRead]:
+    """
+    Parses Advertising Portfolio HTML and upserts the result for the account.
+    Concurrent ingests for the same account are coalesced: only the newest payload is processed.
+    `on_start` is awaited once the ingest has a scheduler slot and is about to run.
+    """
+    return await ingest_coalescer.run(
+        ("portfolios", account_identifier),
+        lambda: _ingest_portfolios(session, account_identifier, html_content),
+        len(html_content),
+        on_start,
+    )
+
+async def _ingest_portfolios(session: AsyncSession, account_identifier: str, html_content: str) -> List[PortfolioRead]:
+    print(f"Received Portfolio HTML from account: {account_identifier}")
+    print("Starting Portfolio HTML parsing...")
+
+    extracted_data = extract_portfolio_rows(html_content)
+    print("Successfully extracted portfolio data:")
+    print(extracted_data)
+    return await _upsert_portfolio_rows(session, account_identifier, extracted_data)
+
+async def ingest_portfolio_rows(
+    session: AsyncSession, account_identifier: str, extracted_data: List[dict], payload_size: int = 0,
+) -> List[PortfolioRead]:
+    """
+    Upserts portfolio rows that were already extracted (from a streamed upload or a client).
+    Coalesced with HTML ingests of the same account; `payload_size` weighs it for scheduling.
+    """
+    return await ingest_coalescer.run(
+        ("portfolios", account_identifier),
+        lambda: _upsert_portfolio_rows(session, account_identifier, extracted_data),
+        payload_size,
+    )
+
+async def _upsert_portfolio_rows(session: AsyncSession, account_identifier: str, extracted_data: List[dict]) -> List[PortfolioRead]:
+    final_data = aggregate_portfolio_rows(extracted_data)
+    print(f"Aggregated {len(extracted_data)} portfolio rows into {len(final_data)} portfolios for account {account_identifier}")
+
+    portfolios = [PortfolioRead.model_validate(p) for p in await portfolio_crud.upsert_portfolio_data(session, account_identifier, final_data)]
+    await auto_match(session, account_identifier)
+    return portfolios
+
+async def ingest_structured(session: AsyncSession, account: AccountIngestV1) -> AccountIngestResultV1:
+    """
+    Upserts one account's pre-extracted rows from the structured ingest endpoint.
+    A failed write is recorded in the result's `error` rather than raised, so the
+    caller can report which accounts of a batch were applied.
+    """
+    result = AccountIngestResultV1(accountIdentifier=account.accountIdentifier)
+    try:
+        if account.royalties is not None:
+            rows = [row.model_dump() for row in account.royalties]
+            result.royalties = len(await ingest_royalty_rows(session, account.accountIdentifier, rows))
+        if account.portfolios is not None:
+            rows = [row.as_extracted() for row in account.portfolios]
+            result.portfolios = len(await ingest_portfolio_rows(session, account.accountIdentifier, rows))
+    except Exception as e:
+        print(f"Error ingesting account {account.accountIdentifier}: {e}")
+        await session.rollback()
+        result.error = str(e)
+    return result
@@ -0,0 +1,168 @@
+"""
+Fair scheduling of parse/upsert work between accounts.
+
+The scheduler lives in process memory, like the ingest coalescer: its caps and its
+fairness hold within one worker process only. Under `python -m app.server` with
+WEB_CONCURRENCY workers (one per CPU by default), an account can run up to
+WEB_CONCURRENCY x INGEST_MAX_CONCURRENT_PER_ACCOUNT ingests at once, and up to
+WEB_CONCURRENCY x INGEST_MAX_CONCURRENT run in total. Size the settings per process,
+and route an account's uploads to one worker (sticky load balancing) when a strict
+per-account cap matters. Separate job worker processes have their own scheduler too.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List
+
+from app.core.settings import settings
+
+class IngestQueueFull(Exception):
+    """
+    Raised when an account already has INGEST_MAX_QUEUED_PER_ACCOUNT parse requests waiting.
+    """
+
+    def __init__(self, account_identifier: str, retry_after: int):
+        super().__init__(f"Too many ingests queued for account {account_identifier}")
+        self.account_identifier = account_identifier
+        self.retry_after = retry_after
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    account_identifier: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+class IngestScheduler:
+    """
+    Admits parse/upsert work with a global and a per-account concurrency cap, and
+    orders queued work by weighted fair queueing on payload size.
+
+    Every account has a virtual clock. A queued payload is tagged with
+    finish = max(now, account's last finish) + size, and the smallest finish tag
+    runs next. An account posting huge pages back to back pushes its own tags far
+    ahead, while a small account's payload is tagged close to "now" and jumps the
+    queue, so its latency stays low whatever the large accounts send.
+
+    Slots are taken inside the ingest coalescer (see single_flight), so a burst for
+    one account still collapses to its newest payload while it waits for a slot.
+    Requests are counted separately by `admit`, which is where a full queue is rejected.
+    """
+
+    def __init__(self):
+        self._heap: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._running = 0
+        self._running_by_account: Dict[str, int] = {}
+        self._queued_by_account: Dict[str, int] = {}
+        self._admitted_by_account: Dict[str, int] = {}
+        self._seconds_per_job = 1.0  # Moving average, used for Retry-After
+
+    @contextmanager
+    def admit(self, account_identifier: str) -> Iterator[None]:
+        """
+        Counts a parse request for the account while the block runs. Raises IngestQueueFull
+        when INGEST_MAX_QUEUED_PER_ACCOUNT of its requests are already waiting for a slot.
+        """
+        if self._waiting(account_identifier) >= settings.INGEST_MAX_QUEUED_PER_ACCOUNT:
+            raise IngestQueueFull(account_identifier, self.retry_after(account_identifier))
+        self._admitted_by_account[account_identifier] = self._admitted_by_account.get(account_identifier, 0) + 1
+        try:
+            yield
+        finally:
+            self._admitted_by_account[account_identifier] -= 1
+            if not self._admitted_by_account[account_identifier]:
+                del self._admitted_by_account[account_identifier]
+
+    @asynccontextmanager
+    async def slot(self, account_identifier: str, payload_size: int) -> AsyncIterator[None]:
+        """
+        Holds one ingest slot for the account while the block runs, waiting in fair order
+        when the caps are reached.
+        """
+        await self._acquire(account_identifier, payload_size)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(account_identifier, time.monotonic() - started)
+
+    def retry_after(self, account_identifier: str) -> int:
+        """
+        Seconds until the account's backlog should have drained, from the average ingest time.
+        """
+        running = self._running_by_account.get(account_identifier, 0)
+        backlog = self._waiting(account_identifier) + running
+        seconds = self._seconds_per_job * backlog / max(1, settings.INGEST_MAX_CONCURRENT_PER_ACCOUNT)
+        return min(60, max(1, math.ceil(seconds)))
+
+    def _waiting(self, account_identifier: str) -> int:
+        # Admitted requests that are not running: queued for a slot or coalesced into a queued payload.
+        admitted = self._admitted_by_account.get(account_identifier, 0)
+        return max(0, admitted - self._running_by_account.get(account_identifier, 0))
+
+    def _can_run(self, account_identifier: str) -> bool:
+        return self._running_by_account.get(account_identifier, 0) < settings.INGEST_MAX_CONCURRENT_PER_ACCOUNT
+
+    async def _acquire(self, account_identifier: str, payload_size: int) -> None:
+        cost = max(1.0, payload_size / 1024)  # Kilobytes, so tiny payloads still advance the clock
+        start = max(self._virtual_time, self._last_finish.get(account_identifier, 0.0))
+        waiter = _Waiter(start + cost, next(self._seq), start, account_identifier, asyncio.get_running_loop().create_future())
+        self._last_finish[account_identifier] = waiter.finish
+        self._queued_by_account[account_identifier] = self._queued_by_account.get(account_identifier, 0) + 1
+        heapq.heappush(self._heap, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just before the cancellation arrived: give the slot back.
+                self._release(account_identifier, 0.0)
+            else:
+                waiter.cancelled = True
+                self._unqueue(account_identifier)
+            raise
+
+    def _unqueue(self, account_identifier: str) -> None:
+        self._queued_by_account[account_identifier] -= 1
+        if not self._queued_by_account[account_identifier]:
+            del self._queued_by_account[account_identifier]
+
+    def _dispatch(self) -> None:
+        skipped = []
+        while self._heap and self._running < settings.INGEST_MAX_CONCURRENT:
+            waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            if not self._can_run(waiter.account_identifier):
+                skipped.append(waiter)
+                continue
+            self._unqueue(waiter.account_identifier)
+            self._running += 1
+            self._running_by_account[waiter.account_identifier] = self._running_by_account.get(waiter.account_identifier, 0) + 1
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            waiter.future.set_result(None)
+        for waiter in skipped:
+            heapq.heappush(self._heap, waiter)
+
+    def _release(self, account_identifier: str, elapsed: float) -> None:
+        self._running -= 1
+        self._running_by_account[account_identifier] -= 1
+        if not self._running_by_account[account_identifier]:
+            del self._running_by_account[account_identifier]
+            if account_identifier not in self._queued_by_account and self._last_finish.get(account_identifier, 0.0) <= self._virtual_time:
+                # Idle and caught up: forget the account so the table stays small.
+                self._last_finish.pop(account_identifier, None)
+        if elapsed:
+            self._seconds_per_job = 0.8 * self._seconds_per_job + 0.2 * elapsed
+        self._dispatch()
+
+ingest_scheduler = IngestScheduler()
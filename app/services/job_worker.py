@@ -0,0 +1,104 @@
+"""
+Workers that drain the ingest job queue.
+
+Workers run as coroutines inside the API process (see INGEST_WORKERS) or as
+dedicated processes:
+
+    python -m app.services.job_worker --workers 4
+"""
+import argparse
+import asyncio
+import functools
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.crud import deletion_crud, job_crud
+from app.db.session import engine
+from app.services.ingest import ingest_portfolios, ingest_royalties
+
+JOB_HANDLERS: Dict[str, Callable[[AsyncSession, str, str], Awaitable[Sequence | int]]] = {
+    "royalties": ingest_royalties,
+    "portfolios": ingest_portfolios,
+    deletion_crud.PURGE_JOB_KIND: deletion_crud.purge_account,
+}
+
+# Ingests may wait for a scheduler slot before they run (see ingest_scheduler).
+INGEST_JOB_KINDS = {"royalties", "portfolios"}
+
+async def process_next_job(session: AsyncSession) -> bool:
+    """
+    Claims and runs a single job. Returns False when the queue is empty.
+    """
+    job = await job_crud.claim_next_job(session)
+    if job is None:
+        return False
+
+    # Each ingest replaces the account's data, so only the newest payload matters.
+    if await job_crud.has_newer_pending_job(session, job):
+        await job_crud.supersede_job(session, job)
+        return True
+
+    job_id = job.id
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        if job.kind in INGEST_JOB_KINDS:
+            # The stale-job clock starts when the slot is granted, not when the job was claimed.
+            handler = functools.partial(handler, on_start=lambda: job_crud.mark_job_started(session, job_id))
+        results = await handler(session, job.account_identifier, job.payload)
+    except Exception as e:
+        print(f"Error processing job {job_id}: {e}")
+        await session.rollback()
+        job = await job_crud.get_job_by_id(session, job_id)
+        await job_crud.fail_job(session, job, str(e))
+        return True
+
+    job = await job_crud.get_job_by_id(session, job_id)
+    await job_crud.complete_job(session, job, results if isinstance(results, int) else len(results))
+    return True
+
+async def run_worker(worker_id: int, stop: asyncio.Event) -> None:
+    """
+    Processes jobs until `stop` is set, sleeping when the queue is empty.
+    """
+    print(f"Ingest worker {worker_id} started.")
+    while not stop.is_set():
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                processed = await process_next_job(session)
+        except Exception as e:
+            print(f"Ingest worker {worker_id} error: {e}")
+            processed = False
+        if not processed:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    print(f"Ingest worker {worker_id} stopped.")
+
+def start_workers(count: int, stop: asyncio.Event) -> List[asyncio.Task]:
+    """
+    Starts `count` worker coroutines on the running event loop.
+    """
+    return [asyncio.create_task(run_worker(i, stop)) for i in range(count)]
+
+async def main(count: int) -> None:
+    stop = asyncio.Event()
+    tasks = start_workers(count, stop)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stop.set()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ingest job workers.")
+    parser.add_argument("--workers", type=int, default=max(1, settings.INGEST_WORKERS))
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.workers))
+    except KeyboardInterrupt:
+        pass
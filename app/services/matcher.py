@@ -0,0 +1,167 @@
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.crud import portfolio_crud, royalty_crud
+from app.schemas.matching import MatchProposal
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "of", "for", "to", "in", "on", "with", "by", "at", "from", "your",
+    "book", "books", "edition", "vol", "volume", "portfolio", "campaign", "ads",
+})
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Portfolio names are often numbered for sorting ("01 - Keto Cookbook").
+_NUMBERING_RE = re.compile(r"^\s*\d{1,3}\s*[-.:)]\s*")
+
+def normalize_tokens(text: str) -> List[str]:
+    """
+    Lowercases, strips accents and punctuation, and drops stopwords.
+    """
+    text = _NUMBERING_RE.sub("", text)
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return [token for token in _TOKEN_RE.findall(ascii_text) if token not in STOPWORDS]
+
+def trigrams(tokens: List[str]) -> Set[str]:
+    padded = f" {' '.join(tokens)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PortfolioIndex:
+    """
+    Inverted index over normalized portfolio name tokens, weighted by IDF.
+
+    Candidates for a title are only the portfolios sharing at least one
+    reasonably rare token with it, so matching an account costs roughly
+    O(titles x postings) instead of O(titles x portfolios). Titles with no
+    token overlap fall back to a character trigram index, which tolerates typos.
+    """
+
+    def __init__(self, portfolios: List[Tuple[int, str]]):
+        self.portfolios = portfolios
+        self.tokens: List[Set[str]] = [set(normalize_tokens(name)) for _, name in portfolios]
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for position, tokens in enumerate(self.tokens):
+            for token in tokens:
+                self.postings[token].append(position)
+
+        count = len(portfolios)
+        self.idf = {token: math.log(1 + count / len(posting)) for token, posting in self.postings.items()}
+        # Tokens shared by a large share of portfolios ("guide", "journal") do not generate candidates.
+        self.common_limit = max(25, count // 20)
+        self._trigram_postings: Optional[Dict[str, List[int]]] = None
+        self._trigrams: List[Set[str]] = []
+
+    def _weight(self, tokens: Set[str]) -> float:
+        return sum(self.idf.get(token, math.log(1 + len(self.portfolios))) for token in tokens)
+
+    def _token_score(self, title_tokens: Set[str], position: int) -> float:
+        portfolio_tokens = self.tokens[position]
+        shared = self._weight(title_tokens & portfolio_tokens)
+        if not shared:
+            return 0.0
+        containment = shared / self._weight(portfolio_tokens)
+        dice = 2 * shared / (self._weight(title_tokens) + self._weight(portfolio_tokens))
+        return 0.5 * containment + 0.5 * dice
+
+    def _trigram_candidates(self, title_tokens: List[str]) -> List[Tuple[float, int]]:
+        if self._trigram_postings is None:
+            self._trigram_postings = defaultdict(list)
+            self._trigrams = [trigrams(normalize_tokens(name)) for _, name in self.portfolios]
+            for position, grams in enumerate(self._trigrams):
+                for gram in grams:
+                    self._trigram_postings[gram].append(position)
+
+        title_grams = trigrams(title_tokens)
+        shared_counts: Dict[int, int] = defaultdict(int)
+        for gram in title_grams:
+            for position in self._trigram_postings.get(gram, ()):
+                shared_counts[position] += 1
+        scored = []
+        for position, shared in shared_counts.items():
+            portfolio_size = len(self._trigrams[position])
+            containment = shared / portfolio_size
+            dice = 2 * shared / (len(title_grams) + portfolio_size)
+            scored.append((0.5 * containment + 0.5 * dice, position))
+        return scored
+
+    def best_matches(self, title: str) -> List[Tuple[float, int]]:
+        """
+        Returns (score, position) pairs for the top two candidate portfolios, best first.
+        """
+        title_token_list = normalize_tokens(title)
+        title_tokens = set(title_token_list)
+        candidates: Set[int] = set()
+        for token in title_tokens:
+            posting = self.postings.get(token)
+            if posting and len(posting) <= self.common_limit:
+                candidates.update(posting)
+
+        if candidates:
+            scored = [(self._token_score(title_tokens, position), position) for position in candidates]
+        elif title_token_list:
+            scored = self._trigram_candidates(title_token_list)
+        else:
+            scored = []
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:2]
+
+def propose_matches(
+    royalties: List[Tuple[int, str, Optional[int]]],
+    portfolios: List[Tuple[int, str]],
+    min_score: float,
+    include_linked: bool = False,
+) -> List[MatchProposal]:
+    """
+    Proposes the best portfolio for each royalty whose score reaches `min_score`.
+    `royalties` are (id, book_title, portfolio_id) and `portfolios` are (id, portfolio_name).
+    """
+    if not portfolios:
+        return []
+    index = PortfolioIndex(portfolios)
+    proposals = []
+    for royalty_id, book_title, current_portfolio_id in royalties:
+        if current_portfolio_id is not None and not include_linked:
+            continue
+        matches = index.best_matches(book_title)
+        if not matches or matches[0][0] < min_score:
+            continue
+        score, position = matches[0]
+        runner_up = matches[1][0] if len(matches) > 1 else 0.0
+        portfolio_id, portfolio_name = portfolios[position]
+        if portfolio_id == current_portfolio_id:
+            continue
+        proposals.append(MatchProposal(
+            royalty_id=royalty_id,
+            book_title=book_title,
+            portfolio_id=portfolio_id,
+            portfolio_name=portfolio_name,
+            score=round(score, 4),
+            ambiguous=runner_up >= score,
+        ))
+    return proposals
+
+async def match_account(
+    session: AsyncSession,
+    account_identifier: str,
+    min_score: float,
+    apply: bool = False,
+    include_linked: bool = False,
+) -> List[MatchProposal]:
+    """
+    Matches an account's royalties to its portfolios and optionally links
+    the unambiguous proposals in one bulk update.
+    """
+    royalties = await royalty_crud.get_royalty_titles(session, account_identifier)
+    portfolios = await portfolio_crud.get_portfolio_names(session, account_identifier)
+    proposals = propose_matches(royalties, portfolios, min_score, include_linked)
+
+    if apply:
+        links = {p.royalty_id: p.portfolio_id for p in proposals if not p.ambiguous}
+        if links:
+            await royalty_crud.set_portfolio_links(session, links)
+        for proposal in proposals:
+            proposal.applied = proposal.royalty_id in links
+    return proposals
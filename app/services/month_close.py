@@ -0,0 +1,75 @@
+"""
+Scheduled month-end close.
+
+Once a month has ended in MONTH_CLOSE_TIMEZONE, every title's last_month_royalty is
+set from its royalty history (see month_close_crud.close_month). The scheduler runs
+inside each API process; a leader lock makes sure only one replica does the work,
+and a month missed while the app was down is closed on the next start.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.crud import month_close_crud
+from app.db.locks import leader_lock
+from app.db.session import engine as default_engine
+from app.models.month_close import MonthClose
+
+LEADER_LOCK_NAME = "month-close"
+
+def seconds_until_next_close(now: datetime, tz_name: str) -> float:
+    """
+    Seconds from `now` (timezone-aware) until the current month ends in `tz_name`, plus the configured delay.
+    """
+    local = now.astimezone(ZoneInfo(tz_name))
+    year, number = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+    next_start = datetime(year, number, 1, tzinfo=ZoneInfo(tz_name))
+    due = next_start + timedelta(seconds=settings.MONTH_CLOSE_DELAY_SECONDS)
+    return max(0.0, (due - now).total_seconds())
+
+async def close_due_month(engine: Optional[AsyncEngine] = None, now: Optional[datetime] = None) -> MonthClose | None:
+    """
+    Closes the most recently ended month if it has not been closed yet and this process holds the leader lock.
+    """
+    engine = engine or default_engine
+    tz_name = settings.MONTH_CLOSE_TIMEZONE
+    month = month_close_crud.previous_month(now or datetime.now(timezone.utc), tz_name)
+    async with AsyncSession(engine) as session:
+        if await month_close_crud.is_closed(session, month):
+            return None
+
+    async with leader_lock(engine, LEADER_LOCK_NAME) as leader:
+        if not leader:
+            print(f"Month-end close for {month} is running on another replica.")
+            return None
+        async with AsyncSession(engine) as session:
+            # Another replica may have finished it before we got the lock.
+            if await month_close_crud.is_closed(session, month):
+                return None
+            print(f"Closing month {month} ({tz_name})...")
+            record = await month_close_crud.close_month(session, month, tz_name)
+            print(f"Closed month {month}: {record.updated_titles} titles updated across {record.accounts} accounts.")
+            return record
+
+async def run_month_close_scheduler(stop: asyncio.Event) -> None:
+    """
+    Closes due months until `stop` is set, sleeping until the next month boundary in between.
+    """
+    print("Month-end close scheduler started.")
+    while not stop.is_set():
+        try:
+            await close_due_month()
+            delay = seconds_until_next_close(datetime.now(timezone.utc), settings.MONTH_CLOSE_TIMEZONE)
+        except Exception as e:
+            print(f"Month-end close failed: {e}")
+            delay = settings.MONTH_CLOSE_RETRY_SECONDS
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+    print("Month-end close scheduler stopped.")
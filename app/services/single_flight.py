@@ -0,0 +1,112 @@
+import asyncio
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from app.services.ingest_scheduler import ingest_scheduler
+
+class Entry(NamedTuple):
+    work: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    weight: int
+    on_start: Optional[Callable[[], Awaitable[None]]]
+
+class IngestCoalescer:
+    """
+    Runs at most one ingest per key at a time and coalesces bursts.
+
+    While one ingest for a key is running, later submissions queue up. When the
+    running one finishes, only the newest queued submission is executed and every
+    queued caller receives its result, so superseded payloads are never parsed.
+
+    The work runs in a task owned by the coalescer, not in any caller's task: a caller
+    that is cancelled (a client disconnecting) only stops waiting, and the others
+    still get the result. Work usually closes over its caller's request-scoped session,
+    so only the newest caller still waiting is run, and a cancelled caller whose work is
+    running stays until it finishes, keeping that session open. Every caller receives
+    the same result object, so work should return plain data rather than ORM rows.
+
+    An optional `gate(key, weight)` context manager is entered before each run and
+    before the batch is picked, so submissions that arrive while the run waits at the
+    gate (for an ingest scheduler slot) are still coalesced into it.
+    """
+
+    def __init__(self, gate: Optional[Callable[[Hashable, int], AsyncContextManager]] = None):
+        self._pending: Dict[Hashable, List[Entry]] = {}
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._executing: Dict[Hashable, Tuple[Entry, asyncio.Event]] = {}
+        self._gate = gate
+
+    async def run(
+        self, key: Hashable, work: Callable[[], Awaitable[Any]], weight: int = 0,
+        on_start: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Any:
+        """
+        Submits `work` for `key` and returns the result of the run it is coalesced into.
+        `weight` (the payload size) is passed to the gate; `on_start` is awaited once that
+        run is through the gate and about to start.
+        """
+        entry = Entry(work, asyncio.get_running_loop().create_future(), weight, on_start)
+        self._pending.setdefault(key, []).append(entry)
+        if key not in self._running:
+            self._running[key] = asyncio.create_task(self._drain(key))
+        try:
+            return await entry.future
+        except asyncio.CancelledError:
+            executing = self._executing.get(key)
+            if executing is not None and executing[0] is entry:
+                await executing[1].wait()  # Our work is running on our session; let it finish first
+            raise
+
+    async def _drain(self, key: Hashable) -> None:
+        try:
+            while self._pending.get(key):
+                if all(entry.future.done() for entry in self._pending[key]):
+                    del self._pending[key]  # Every caller went away
+                    continue
+                weight = self._pending[key][-1].weight
+                async with self._gate(key, weight) if self._gate else nullcontext():
+                    batch = self._pending.pop(key)
+                    if any(not entry.future.done() for entry in batch):
+                        await self._start(batch)
+                        await self._run_newest(key, batch)
+        finally:
+            del self._running[key]
+
+    async def _start(self, batch: List[Entry]) -> None:
+        for entry in batch:
+            if entry.on_start is not None and not entry.future.done():
+                try:
+                    await entry.on_start()
+                except Exception as e:
+                    print(f"Error in ingest start callback: {e}")
+
+    async def _run_newest(self, key: Hashable, batch: List[Entry]) -> None:
+        waiting = [entry for entry in batch if not entry.future.done()]
+        if not waiting:
+            return
+        newest = waiting[-1]  # Its caller is still there, so the session it closes over is open
+        if len(batch) > 1:
+            print(f"Coalescing {len(batch)} pending ingests for {key}; running the newest only.")
+        finished = asyncio.Event()
+        self._executing[key] = (newest, finished)
+        try:
+            result = await newest.work()
+        except asyncio.CancelledError:
+            # The coalescer itself is being torn down (event loop shutdown).
+            for entry in batch:
+                entry.future.cancel()
+            raise
+        except Exception as e:
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+            return
+        finally:
+            del self._executing[key]
+            finished.set()
+        for entry in batch:
+            if not entry.future.done():
+                entry.future.set_result(result)
+
+# Keys are (kind, account_identifier); each run holds one of the account's ingest slots.
+ingest_coalescer = IngestCoalescer(gate=lambda key, weight: ingest_scheduler.slot(key[1], weight))
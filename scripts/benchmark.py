@@ -0,0 +1,159 @@
+"""
+Times the hot queries against a seeded database and prints their query plans.
+
+Usage:
+    python -m scripts.seed_data --database-url sqlite+aiosqlite:///./scale.db --accounts 2000
+    python -m scripts.benchmark --database-url sqlite+aiosqlite:///./scale.db --repeat 3 --analyze
+
+The benchmark rewrites the largest account's royalties (with perturbed values)
+and deletes one account, so point it at a disposable database. --database-url is
+required for that reason.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.api import dashboard, portfolios, royalties
+from app.crud import deletion_crud, royalty_crud
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+
+async def timed(label: str, repeat: int, fn: Callable[[], Awaitable[object]]) -> None:
+    """
+    Runs fn `repeat` times and prints min/median/max wall time.
+    """
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    print(
+        f"{label:<45} min {min(samples) * 1000:9.1f} ms   "
+        f"median {statistics.median(samples) * 1000:9.1f} ms   max {max(samples) * 1000:9.1f} ms"
+    )
+
+
+async def explain(engine: AsyncEngine, label: str, statement, analyze: bool) -> None:
+    """
+    Prints the database's plan for a statement, using the dialect's EXPLAIN syntax.
+    """
+    sql = str(statement.compile(engine.sync_engine, compile_kwargs={"literal_binds": True}))
+    if engine.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS)" if analyze else "EXPLAIN"
+    else:
+        prefix = "EXPLAIN QUERY PLAN"
+    async with engine.connect() as conn:
+        result = await conn.execute(text(f"{prefix} {sql}"))
+        rows = result.all()
+        await conn.rollback()
+    print(f"\n--- {label}\n{sql}")
+    for row in rows:
+        print("   ", " | ".join(str(value) for value in row))
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.database_url)
+
+    async with AsyncSession(engine) as session:
+        counts = await session.exec(
+            select(Royalty.account_identifier, func.count(Royalty.id))
+            .group_by(Royalty.account_identifier)
+            .order_by(func.count(Royalty.id).desc())
+        )
+        account_counts = counts.all()
+    if not account_counts:
+        print("No royalty data found; run scripts.seed_data first.")
+        return
+
+    total_rows = sum(count for _, count in account_counts)
+    large_account, large_count = account_counts[0]
+    victim_account, victim_count = account_counts[len(account_counts) // 2]
+    print(f"{len(account_counts)} accounts, {total_rows} royalties")
+    print(f"Largest account: {large_account} ({large_count} titles); deletion target: {victim_account} ({victim_count} titles)\n")
+
+    async def dashboard_call():
+        async with AsyncSession(engine) as session:
+            await dashboard.get_dashboard_data(session=session)
+
+    async def list_royalties_call():
+        async with AsyncSession(engine) as session:
+            await royalties.get_royalties(session=session)
+
+    async def list_portfolios_call():
+        async with AsyncSession(engine) as session:
+            await portfolios.get_portfolios(session=session)
+
+    rng = random.Random(args.seed)
+
+    async def upsert_call():
+        async with AsyncSession(engine) as session:
+            result = await session.exec(select(Royalty).where(Royalty.account_identifier == large_account))
+            payload = []
+            for royalty in result.all():
+                total = round(rng.uniform(0, 100), 2)
+                payload.append({
+                    "bookTitle": royalty.book_title,
+                    "eBookRoyalties": f"{total / 2:.2f}",
+                    "printRoyalties": f"{total / 2:.2f}",
+                    "kenpRoyalties": "0.00",
+                    "totalRoyalties": f"{total:.2f}",
+                    "totalRoyaltiesUSD": f"{total:.2f}",
+                })
+            session.expunge_all()
+            await royalty_crud.upsert_royalty_data(session, large_account, payload)
+
+    if not args.skip_reads:
+        await timed("GET /api/dashboard/", args.repeat, dashboard_call)
+        await timed("GET /api/royalties/", args.repeat, list_royalties_call)
+        await timed("GET /api/portfolios/portfolios", args.repeat, list_portfolios_call)
+    await timed(f"upsert_royalty_data ({large_count} titles)", args.repeat, upsert_call)
+
+    async def delete_call():
+        async with AsyncSession(engine) as session:
+            await portfolios.delete_all_data_by_account_identifier(victim_account, session=session)
+
+    async def purge_call():
+        async with AsyncSession(engine) as session:
+            await deletion_crud.purge_account(session, victim_account)
+
+    # The endpoint only flips the account to "deleting" and queues the purge; time both halves.
+    await timed("DELETE account (enqueue)", 1, delete_call)
+    await timed(f"purge_account ({victim_count} titles, batches of {settings.PURGE_BATCH_SIZE})", 1, purge_call)
+
+    if args.plans:
+        await explain(engine, "dashboard: all portfolios", select(Portfolio), args.analyze)
+        await explain(engine, "dashboard: royalties for portfolios (selectinload)",
+                      select(Royalty).where(Royalty.portfolio_id.in_([1, 2, 3])), args.analyze)
+        await explain(engine, "upsert: existing royalties for account",
+                      select(Royalty).where(Royalty.account_identifier == large_account), args.analyze)
+        await explain(engine, "upsert: refresh single royalty",
+                      select(Royalty).where(Royalty.id == 1), args.analyze)
+        await explain(engine, "delete: royalties for account",
+                      delete(Royalty).where(Royalty.account_identifier == large_account), False)
+
+    await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark hot queries on a seeded database.")
+    parser.add_argument("--database-url", required=True, help="Disposable database; never defaults to DATABASE_URL.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-reads", action="store_true", help="Skip the full-table list endpoints.")
+    parser.add_argument("--no-plans", dest="plans", action="store_false", help="Do not print query plans.")
+    parser.add_argument("--analyze", action="store_true", help="Use EXPLAIN ANALYZE on Postgres (executes the query).")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(run(build_parser().parse_args()))
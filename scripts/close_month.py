@@ -0,0 +1,72 @@
+"""
+Runs the month-end close for past months, e.g. after downtime or when first enabling it.
+
+Usage:
+    python -m scripts.close_month 2026-09                    # one month
+    python -m scripts.close_month 2026-01 --to 2026-09       # a range, oldest first
+    python -m scripts.close_month 2026-09 --timezone America/Los_Angeles
+
+Each title's last_month_royalty is taken from its royalty history (snapshots), so
+months can be closed long after they ended. Months older than the latest closed
+month are only recorded unless --force is given.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.main  # noqa: F401  (registers every table on SQLModel.metadata)
+from app.core.settings import settings
+from app.crud import month_close_crud
+
+
+def month_range(first: str, last: str) -> List[str]:
+    year, month = month_close_crud.parse_month(first)
+    end = month_close_crud.parse_month(last)
+    months = []
+    while (year, month) <= end:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine = create_async_engine(args.database_url)
+    try:
+        months = month_range(args.month, args.to or args.month)
+        if not months:
+            print("--to must not be before the first month")
+            return 1
+        async with AsyncSession(engine) as session:
+            for month in months:
+                started = time.perf_counter()
+                record = await month_close_crud.close_month(
+                    session, month, args.timezone, args.batch_size, force=args.force,
+                )
+                note = "" if record.applied else " (recorded only: a later month is already closed)"
+                print(
+                    f"{month}: cutoff {record.cutoff.isoformat()} UTC, {record.updated_titles} titles updated "
+                    f"across {record.accounts} accounts in {time.perf_counter() - started:.2f}s{note}"
+                )
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Close past months (sets royalty.last_month_royalty).")
+    parser.add_argument("month", help="First month to close, YYYY-MM.")
+    parser.add_argument("--to", default=None, help="Last month to close, YYYY-MM (defaults to the first).")
+    parser.add_argument("--timezone", default=settings.MONTH_CLOSE_TIMEZONE)
+    parser.add_argument("--batch-size", type=int, default=settings.MONTH_CLOSE_BATCH_ACCOUNTS, help="Accounts per statement.")
+    parser.add_argument("--force", action="store_true", help="Apply months older than the latest closed month.")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
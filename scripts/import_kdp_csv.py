@@ -0,0 +1,67 @@
+"""
+Imports KDP royalty report CSV exports for one account.
+
+Usage:
+    python -m scripts.import_kdp_csv --account ACCT report-2023.csv report-2024.csv
+
+Each file is streamed in chunks and imported in its own transaction; a summary
+with rows/s is printed per file.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.services.csv_import import import_royalty_csv
+
+
+async def read_chunks(path: str, chunk_size: int) -> AsyncIterator[bytes]:
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine = create_async_engine(args.database_url)
+    started = time.perf_counter()
+    total_rows = 0
+    try:
+        for path in args.files:
+            async with AsyncSession(engine) as session:
+                try:
+                    report = await import_royalty_csv(
+                        session, args.account, read_chunks(path, args.chunk_size), args.batch_size
+                    )
+                except ValueError as e:
+                    print(f"{path}: {e}")
+                    return 1
+            total_rows += report.rows
+            print(
+                f"{path}: {report.rows} rows ({report.skipped_rows} skipped), {report.snapshots} monthly snapshots, "
+                f"{report.updated_titles} titles updated, {report.inserted_titles} inserted, "
+                f"{report.rows_per_second:,.0f} rows/s"
+            )
+        elapsed = time.perf_counter() - started
+        print(f"Imported {total_rows} rows from {len(args.files)} file(s) in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s)")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bulk import KDP royalty report CSV files.")
+    parser.add_argument("files", nargs="+", help="CSV report files, imported in order.")
+    parser.add_argument("--account", required=True, help="Account identifier the reports belong to.")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE, help="Rows per staging batch.")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Bytes read from the file at a time.")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
@@ -0,0 +1,51 @@
+"""
+Recomputes the account and portfolio rollup tables from the royalty and portfolio tables.
+
+Usage:
+    python -m scripts.rebuild_rollups                 # rebuild everything
+    python -m scripts.rebuild_rollups --account ACCT  # rebuild one account
+    python -m scripts.rebuild_rollups --check         # report drift without writing
+
+--check exits with status 1 when any rollup disagrees with the base tables.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.settings import settings
+from app.crud import rollup_crud
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine = create_async_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        async with AsyncSession(engine) as session:
+            if args.check:
+                problems = await rollup_crud.check_rollups(session, args.account)
+                for problem in problems:
+                    print(problem)
+                print(f"{len(problems)} inconsistencies found in {time.perf_counter() - started:.2f}s")
+                return 1 if problems else 0
+
+            accounts, portfolios = await rollup_crud.rebuild_rollups(session, args.account)
+            print(f"Rebuilt {accounts} account and {portfolios} portfolio rollups in {time.perf_counter() - started:.2f}s")
+            return 0
+    finally:
+        await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Rebuild or verify rollup tables.")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--account", default=None, help="Limit to one account identifier.")
+    parser.add_argument("--check", action="store_true", help="Only compare stored rollups with recomputed values.")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
@@ -0,0 +1,197 @@
+"""
+Replays captured ingest payloads (see app.services.capture) through the parse and
+upsert pipeline against a local database, for benchmarking parser and upsert changes.
+
+Usage:
+    python -m scripts.replay_captures captures/ --report before.json
+    python -m scripts.replay_captures captures/ --baseline before.json --report after.json
+    python -m scripts.replay_captures captures/ --rate 5   # 5 payloads per second
+
+Captures run oldest first on freshly created tables (unless --keep), so every run of
+the same capture set starts from the same state. Each payload reports its parse and
+upsert time. With --baseline, the extracted output is diffed against an earlier report
+and the timings are compared.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.main  # noqa: F401  (registers every table on SQLModel.metadata for create_all)
+from app.crud import portfolio_crud, royalty_crud
+from app.db.session import configure_sqlite
+from app.services.capture import decode_capture, list_captures
+from app.services.ingest import (
+    aggregate_portfolio_rows, aggregate_royalty_rows, extract_portfolio_rows, extract_royalty_rows,
+)
+
+PIPELINES = {
+    "royalties": (extract_royalty_rows, aggregate_royalty_rows, royalty_crud.upsert_royalty_data, "bookTitle"),
+    "portfolios": (extract_portfolio_rows, aggregate_portfolio_rows, portfolio_crud.upsert_portfolio_data, "portfolio_name"),
+}
+
+
+def output_digest(output: Dict[str, dict]) -> str:
+    return hashlib.sha256(json.dumps(output, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def replay_one(session: AsyncSession, name: str, record: dict) -> dict:
+    """
+    Parses and upserts one capture, timing both stages separately.
+    """
+    extract, aggregate, upsert, key = PIPELINES[record["kind"]]
+    result = {"name": name, "kind": record["kind"], "account": record["account"], "bytes": len(record["html"])}
+    try:
+        started = time.perf_counter()
+        final_data = aggregate(extract(record["html"]))
+        parsed = time.perf_counter()
+        await upsert(session, record["account"], final_data)
+        finished = time.perf_counter()
+    except Exception as e:
+        await session.rollback()
+        result["error"] = str(e)
+        return result
+    output = {item[key]: item for item in final_data}
+    result.update({
+        "items": len(final_data),
+        "parse_ms": round((parsed - started) * 1000, 3),
+        "upsert_ms": round((finished - parsed) * 1000, 3),
+        "digest": output_digest(output),
+        "output": output,
+    })
+    return result
+
+
+def diff_outputs(before: Dict[str, dict], after: Dict[str, dict]) -> dict:
+    return {
+        "added": sorted(set(after) - set(before)),
+        "removed": sorted(set(before) - set(after)),
+        "changed": sorted(k for k in set(before) & set(after) if before[k] != after[k]),
+    }
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def summarize(results: List[dict]) -> dict:
+    ok = [r for r in results if "error" not in r]
+    summary = {"payloads": len(results), "errors": len(results) - len(ok)}
+    for stage in ("parse_ms", "upsert_ms"):
+        values = [r[stage] for r in ok]
+        summary[stage] = {
+            "total": round(sum(values), 3),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+        }
+    return summary
+
+
+def compare(results: List[dict], baseline: dict) -> List[dict]:
+    """
+    Per-payload output diffs and timing ratios against a baseline report.
+    """
+    previous = {r["name"]: r for r in baseline.get("captures", [])}
+    differences = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None or "error" in result or "error" in before:
+            continue
+        entry = {"name": result["name"]}
+        if before["digest"] != result["digest"]:
+            entry["diff"] = diff_outputs(before["output"], result["output"])
+        for stage in ("parse_ms", "upsert_ms"):
+            if before[stage]:
+                entry[f"{stage}_ratio"] = round(result[stage] / before[stage], 3)
+        differences.append(entry)
+    return differences
+
+
+async def replay(args: argparse.Namespace) -> dict:
+    paths = list_captures(args.capture_dir)
+    if args.limit:
+        paths = paths[:args.limit]
+    engine = create_async_engine(args.database_url)
+    configure_sqlite(engine)
+    try:
+        async with engine.begin() as conn:
+            if not args.keep:
+                await conn.run_sync(SQLModel.metadata.drop_all)
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+        results = []
+        started = time.perf_counter()
+        async with AsyncSession(engine) as session:
+            for index, path in enumerate(paths):
+                if args.rate > 0:
+                    # Scheduled start times keep the offered rate steady even when a payload runs long.
+                    delay = started + index / args.rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                result = await replay_one(session, path.name, decode_capture(path.read_bytes()))
+                results.append(result)
+                if "error" in result:
+                    print(f"{path.name}: ERROR {result['error']}")
+                else:
+                    print(
+                        f"{path.name}: {result['kind']} {result['items']} items, "
+                        f"parse {result['parse_ms']:.1f} ms, upsert {result['upsert_ms']:.1f} ms"
+                    )
+    finally:
+        await engine.dispose()
+
+    report = {"summary": summarize(results), "captures": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(results, json.load(f))
+    return report
+
+
+def print_report(report: dict) -> None:
+    summary = report["summary"]
+    print(f"Replayed {summary['payloads']} payloads ({summary['errors']} errors)")
+    for stage in ("parse_ms", "upsert_ms"):
+        values = summary[stage]
+        print(f"  {stage[:-3]}: total {values['total']:.1f} ms, p50 {values['p50']:.1f} ms, p95 {values['p95']:.1f} ms")
+    for entry in report.get("comparison", []):
+        if "diff" in entry:
+            diff = entry["diff"]
+            print(
+                f"  {entry['name']}: output differs "
+                f"(+{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])})"
+            )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay captured ingest payloads against a local database.")
+    parser.add_argument("capture_dir", help="Directory written by INGEST_CAPTURE_DIR.")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./replay.db")
+    parser.add_argument("--rate", type=float, default=0.0, help="Payloads per second (0 replays as fast as possible).")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N captures.")
+    parser.add_argument("--keep", action="store_true", help="Keep existing tables instead of starting empty.")
+    parser.add_argument("--baseline", default=None, help="Earlier report to diff outputs and timings against.")
+    parser.add_argument("--report", default=None, help="Write the JSON report here.")
+    return parser
+
+
+async def main(args: argparse.Namespace) -> int:
+    report = await replay(args)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["summary"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(build_parser().parse_args())))
@@ -0,0 +1,176 @@
+"""
+Seeds the database with synthetic KDP royalty and portfolio data for scale testing.
+
+Usage:
+    python -m scripts.seed_data --database-url sqlite+aiosqlite:///./scale.db --accounts 2000 --titles-mean 400
+
+--database-url is required, so the script never falls back to the configured
+(production) database.
+
+Rows are written with bulk executemany INSERTs in batches, so millions of rows
+can be generated without building ORM objects.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlmodel import SQLModel
+
+import app.main  # noqa: F401  (registers every table on SQLModel.metadata for create_all)
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+ADJECTIVES = [
+    "Complete", "Essential", "Ultimate", "Practical", "Illustrated", "Modern", "Beginner's",
+    "Advanced", "Pocket", "Official", "Little", "Big", "Hidden", "Silent", "Golden", "Wild",
+]
+NOUNS = [
+    "Study Guide", "Workbook", "Cookbook", "Coloring Book", "Journal", "Planner", "Handbook",
+    "Puzzle Book", "Activity Book", "Notebook", "Field Guide", "Companion", "Atlas", "Primer",
+]
+SUBJECTS = [
+    "Paramedic", "Nursing", "Keto", "Mandala", "Sudoku", "Gardening", "Python", "Bible",
+    "Astrology", "Watercolor", "Fishing", "Crochet", "Algebra", "Mindfulness", "Dinosaur", "Spanish",
+]
+
+
+def make_title(rng: random.Random, index: int) -> str:
+    """
+    Generates a plausible book title; the index keeps titles unique per account.
+    """
+    title = f"{rng.choice(ADJECTIVES)} {rng.choice(SUBJECTS)} {rng.choice(NOUNS)}"
+    if rng.random() < 0.3:
+        title += f": Volume {rng.randint(1, 12)}"
+    return f"{title} #{index}"
+
+
+def titles_for_account(rng: random.Random, distribution: str, mean: int, maximum: int) -> int:
+    """
+    Draws the number of titles for one account from the configured distribution.
+    'zipf' gives a long tail: most accounts are small, a few agencies are huge.
+    """
+    if distribution == "uniform":
+        count = rng.randint(1, max(1, mean * 2))
+    elif distribution == "fixed":
+        count = mean
+    else:
+        # Pareto with shape 1.5 has mean 3 * scale, so scale it back to the requested mean.
+        count = int(rng.paretovariate(1.5) * mean / 3)
+    return max(1, min(count, maximum))
+
+
+def money(rng: random.Random, high: float) -> float:
+    return round(rng.expovariate(1 / high), 2) if rng.random() > 0.2 else 0.0
+
+
+async def insert_batches(engine: AsyncEngine, table, rows: List[dict], batch_size: int) -> List[int]:
+    """
+    Inserts rows in executemany batches and returns the generated ids in input order.
+    """
+    ids: List[int] = []
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            result = await conn.execute(
+                insert(table).returning(table.id, sort_by_parameter_order=True), batch
+            )
+            ids.extend(result.scalars().all())
+    return ids
+
+
+async def seed(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.database_url)
+    rng = random.Random(args.seed)
+
+    async with engine.begin() as conn:
+        if args.drop:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    started = time.perf_counter()
+    total_royalties = 0
+    total_portfolios = 0
+    royalty_rows: List[dict] = []
+    pending_links: List[tuple] = []
+    portfolio_rows: List[dict] = []
+
+    async def flush() -> None:
+        nonlocal total_royalties, total_portfolios
+        portfolio_ids = await insert_batches(engine, Portfolio, portfolio_rows, args.batch_size)
+        for royalty_index, portfolio_index in pending_links:
+            royalty_rows[royalty_index]["portfolio_id"] = portfolio_ids[portfolio_index]
+        await insert_batches(engine, Royalty, royalty_rows, args.batch_size)
+        total_portfolios += len(portfolio_rows)
+        total_royalties += len(royalty_rows)
+        portfolio_rows.clear()
+        royalty_rows.clear()
+        pending_links.clear()
+        elapsed = time.perf_counter() - started
+        print(f"  {total_royalties} royalties, {total_portfolios} portfolios ({total_royalties / elapsed:,.0f} rows/s)")
+
+    for account_index in range(args.accounts):
+        account_identifier = f"{args.prefix}{account_index:06d}"
+        title_count = titles_for_account(rng, args.distribution, args.titles_mean, args.titles_max)
+        portfolio_count = max(1, int(title_count * args.portfolio_ratio))
+        first_portfolio = len(portfolio_rows)
+
+        for index in range(portfolio_count):
+            portfolio_rows.append({
+                "account_identifier": account_identifier,
+                "portfolio_name": f"{index + 1:02d} - {rng.choice(SUBJECTS)} {rng.choice(NOUNS)}",
+                "spend": f"${money(rng, 80):,.2f}",
+            })
+
+        for index in range(title_count):
+            ebook = money(rng, 20)
+            paperback = money(rng, 40)
+            kenp = money(rng, 10)
+            total = round(ebook + paperback + kenp, 2)
+            royalty_rows.append({
+                "account_identifier": account_identifier,
+                "book_title": make_title(rng, index),
+                "ebook_royalties": f"{ebook:.2f}",
+                "print_royalties": f"{paperback:.2f}",
+                "kenp_royalties": f"{kenp:.2f}",
+                "total_royalties": f"{total:.2f}",
+                "total_royalties_usd": f"{total:.2f}",
+                "last_month_royalty": f"{money(rng, 60):.2f}" if rng.random() < 0.5 else None,
+                "portfolio_id": None,
+            })
+            if rng.random() < args.link_ratio:
+                pending_links.append((len(royalty_rows) - 1, first_portfolio + rng.randrange(portfolio_count)))
+
+        if len(royalty_rows) >= args.flush_rows:
+            await flush()
+
+    if royalty_rows or portfolio_rows:
+        await flush()
+
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {args.accounts} accounts: {total_royalties} royalties and {total_portfolios} portfolios in {elapsed:.1f}s")
+    await engine.dispose()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Seed synthetic royalty and portfolio data.")
+    parser.add_argument("--database-url", required=True, help="Database to seed; never defaults to DATABASE_URL.")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--titles-mean", type=int, default=200, help="Mean titles per account.")
+    parser.add_argument("--titles-max", type=int, default=20000, help="Upper bound on titles per account.")
+    parser.add_argument("--distribution", choices=["zipf", "uniform", "fixed"], default="zipf")
+    parser.add_argument("--portfolio-ratio", type=float, default=0.3, help="Portfolios per title.")
+    parser.add_argument("--link-ratio", type=float, default=0.6, help="Fraction of titles linked to a portfolio.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT executemany batch.")
+    parser.add_argument("--flush-rows", type=int, default=100000, help="Royalty rows buffered before writing.")
+    parser.add_argument("--prefix", default="seed-", help="Account identifier prefix.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="Drop and recreate all tables first.")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(build_parser().parse_args()))
@@ -0,0 +1,125 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.settings import settings
+from app.crud import portfolio_crud, rollup_crud, royalty_crud
+from app.models.change import ChangeTombstone
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+from app.models.snapshot import RoyaltySnapshot
+from app.services.job_worker import process_next_job
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_account_deletion.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+async def seed(session: AsyncSession) -> None:
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": f"P{i}", "spend": "$1.00"} for i in range(3)
+    ])
+    portfolio_id = portfolios[0].id
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item(f"Book {i}", i) for i in range(5)])
+    await royalty_crud.set_portfolio_links(session, {royalties[0].id: portfolio_id})
+    await royalty_crud.upsert_royalty_data(session, "other", [item("Kept", 1)])
+
+@pytest.mark.asyncio
+async def test_deletion_hides_account_then_purges_in_batches(client: AsyncClient, session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(settings, "PURGE_BATCH_SIZE", 2)
+    await seed(session)
+    royalty_id, portfolio_id = (await session.exec(
+        select(Royalty.id, Royalty.portfolio_id).where(Royalty.portfolio_id.is_not(None))
+    )).one()
+
+    response = await client.delete("/api/portfolios/portfolios/acct")
+    assert response.status_code == 202
+    deletion = response.json()
+    assert deletion["status"] == "deleting"
+    response = await client.delete("/api/portfolios/portfolios/acct")
+    assert response.json()["job_id"] == deletion["job_id"]
+
+    # Hidden from reads and closed to writes until the purge has run.
+    response = await client.get("/api/royalties/")
+    assert [r["book_title"] for r in response.json()] == ["Kept"]
+    assert (await client.get("/api/portfolios/portfolios")).json() == []
+    response = await client.get("/api/dashboard/summary", params={"account_identifier": "acct"})
+    assert response.status_code == 404
+    response = await client.get("/api/changes", params={"account_identifier": "acct"})
+    assert response.status_code == 404
+    response = await client.get("/api/royalties/export", params={"format": "ndjson", "account_identifier": "acct"})
+    assert response.text == ""
+    response = await client.post("/api/royalties/parse", json={"accountIdentifier": "acct", "htmlContent": "<div></div>"})
+    assert response.status_code == 409
+    response = await client.post("/api/ingest/v1", json={"accounts": [{"accountIdentifier": "acct", "portfolios": []}]})
+    assert response.status_code == 409
+    response = await client.patch(f"/api/royalties/{royalty_id}/unlink")
+    assert response.status_code == 409
+    response = await client.post("/api/royalties/unlink_bulk", json={"links": [{"royalty_id": royalty_id, "portfolio_id": portfolio_id}]})
+    assert response.status_code == 409
+
+    assert await process_next_job(session)
+    response = await client.get("/api/portfolios/portfolios/acct/deletion")
+    assert response.status_code == 200
+    progress = response.json()
+    assert progress["status"] == "deleted"
+    assert (progress["royalties_deleted"], progress["portfolios_deleted"]) == (5, 3)
+    assert progress["finished_at"] is not None
+
+    remaining = (await session.exec(select(Royalty.account_identifier))).all()
+    assert remaining == ["other"]
+    assert (await session.exec(select(Portfolio))).all() == []
+    assert await rollup_crud.check_rollups(session) == []
+    # History and change feed tombstones are purged with the rows.
+    assert (await session.exec(select(RoyaltySnapshot).where(RoyaltySnapshot.account_identifier == "acct"))).all() == []
+    assert (await session.exec(select(ChangeTombstone).where(ChangeTombstone.account_identifier == "acct"))).all() == []
+    assert [s.account_identifier for s in (await session.exec(select(RoyaltySnapshot))).all()] == ["other"]
+    response = await client.get("/api/changes", params={"account_identifier": "acct", "since": 0})
+    feed = response.json()
+    assert (feed["royalties"], feed["deleted_royalty_ids"], feed["deleted_portfolio_ids"]) == ([], [], [])
+
+    # Once purged the account can be ingested again.
+    response = await client.post("/api/ingest/v1", json={"accounts": [{"accountIdentifier": "acct", "portfolios": []}]})
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_deletion_status_unknown_account(client: AsyncClient):
+    response = await client.get("/api/portfolios/portfolios/nobody/deletion")
+    assert response.status_code == 404
@@ -0,0 +1,117 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import portfolio_crud, royalty_crud
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_alerts.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+async def alerts(client: AsyncClient, **params) -> list:
+    response = await client.get("/api/alerts", params={"account_identifier": "acct", **params})
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.mark.asyncio
+async def test_spend_over_royalties_follows_writes(client: AsyncClient, session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$30.00"},
+        {"portfolio_name": "P2", "spend": "$1.00"},
+    ])
+    p1, p2 = [p.id for p in portfolios]
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10), item("B", 20)])
+    a, b = [r.id for r in royalties]
+
+    # A new spend rule checks the current portfolios once.
+    response = await client.post("/api/alerts/rules", json={
+        "account_identifier": "acct", "kind": "spend_over_royalties", "threshold": 5,
+    })
+    assert response.status_code == 201
+    rule_id = response.json()["id"]
+    active = await alerts(client, status="active")
+    assert [(x["subject_id"], x["value"]) for x in active] == [(p1, 30.0)]
+
+    # Linking royalties to P1 narrows the gap below the threshold and resolves the alert.
+    await client.post("/api/royalties/link_bulk", json={"links": [
+        {"royalty_id": a, "portfolio_id": p1}, {"royalty_id": b, "portfolio_id": p1},
+    ]})
+    assert await alerts(client, status="active") == []
+    assert (await alerts(client, status="resolved"))[0]["subject_id"] == p1
+
+    # A royalty drop on a linked title re-triggers it; a spend increase on P2 triggers P2.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 1), item("B", 20)])
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$30.00"},
+        {"portfolio_name": "P2", "spend": "$9.00"},
+    ])
+    active = await alerts(client, status="active")
+    assert sorted((x["subject_id"], x["value"]) for x in active) == sorted([(p1, 9.0), (p2, 9.0)])
+
+    # Removing a portfolio resolves its alert; deleting the rule removes all of its alerts.
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$30.00"}])
+    assert [x["subject_id"] for x in await alerts(client, status="active")] == [p1]
+    response = await client.delete(f"/api/alerts/rules/{rule_id}")
+    assert response.status_code == 204
+    assert await alerts(client) == []
+
+@pytest.mark.asyncio
+async def test_royalty_drop_only_sees_changed_titles(client: AsyncClient, session: AsyncSession):
+    response = await client.post("/api/alerts/rules", json={
+        "account_identifier": "acct", "kind": "royalty_drop", "threshold": 0.5,
+    })
+    assert response.status_code == 201
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10), item("B", 10), item("C", 10)])
+    assert await alerts(client) == []
+
+    # A falls by 70% (alert), B by 20% (below the threshold), C is unchanged.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 3), item("B", 8), item("C", 10)])
+    active = await alerts(client, status="active")
+    assert [(x["subject_name"], x["reference"], x["value"]) for x in active] == [("A", 10.0, 3.0)]
+
+    # Recovering above half of the pre-drop value resolves it.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 6), item("B", 8), item("C", 10)])
+    assert await alerts(client, status="active") == []
+
+    response = await client.get("/api/alerts/rules", params={"account_identifier": "acct"})
+    assert [r["kind"] for r in response.json()] == ["royalty_drop"]
+    response = await client.post("/api/alerts/rules", json={"account_identifier": "acct", "kind": "bogus"})
+    assert response.status_code == 422
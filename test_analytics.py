@@ -0,0 +1,96 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import portfolio_crud, royalty_crud
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_analytics.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": total,
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": total,
+        "totalRoyaltiesUSD": total,
+    }
+
+@pytest.mark.asyncio
+async def test_portfolio_analytics(client: AsyncClient, session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "Profitable", "spend": "$100.00"},
+        {"portfolio_name": "Losing", "spend": "$1,000.00"},
+        {"portfolio_name": "Free", "spend": "$0.00"},
+        {"portfolio_name": "Idle", "spend": "$50.00"},
+    ])
+    profitable, losing, free, idle = [p.id for p in portfolios]
+    await portfolio_crud.upsert_portfolio_data(session, "other", [{"portfolio_name": "Other", "spend": "$1.00"}])
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [
+        item("A", "250.00"), item("B", "50.00"), item("C", "200.00"), item("D", "10.00"),
+    ])
+    a, b, c, d = [r.id for r in royalties]
+    response = await client.post("/api/royalties/link_bulk", json={"links": [
+        {"royalty_id": a, "portfolio_id": profitable},
+        {"royalty_id": b, "portfolio_id": profitable},
+        {"royalty_id": c, "portfolio_id": losing},
+        {"royalty_id": d, "portfolio_id": free},
+    ]})
+    assert response.status_code == 200
+
+    response = await client.get("/api/analytics/portfolios", params={"account_identifier": "acct"})
+    assert response.status_code == 200
+    rows = response.json()["portfolios"]
+    # Sorted by ROAS descending; portfolios without spend have no ROAS and sort last.
+    assert [r["portfolio_id"] for r in rows] == [profitable, losing, idle, free]
+    by_id = {r["portfolio_id"]: r for r in rows}
+    assert by_id[profitable]["royalties"] == 300.0
+    assert by_id[profitable]["title_count"] == 2
+    assert by_id[profitable]["roas"] == 3.0
+    assert by_id[losing]["acos"] == 500.0
+    assert by_id[idle]["roas"] == 0.0
+    assert by_id[idle]["acos"] is None
+    assert by_id[free]["roas"] is None
+
+    response = await client.get("/api/analytics/portfolios", params={
+        "account_identifier": "acct", "max_acos": 100, "sort_by": "spend", "order": "asc",
+    })
+    assert [r["portfolio_id"] for r in response.json()["portfolios"]] == [free, profitable]
+
+    response = await client.get("/api/analytics/portfolios", params={
+        "account_identifier": "acct", "linked_only": True, "sort_by": "portfolio_name", "order": "asc", "limit": 2,
+    })
+    assert [r["portfolio_name"] for r in response.json()["portfolios"]] == ["Free", "Losing"]
+
+    response = await client.get("/api/analytics/portfolios", params={"account_identifier": "acct", "sort_by": "bogus"})
+    assert response.status_code == 422
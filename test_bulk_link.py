@@ -0,0 +1,112 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_bulk_link.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def make_royalty(account_identifier: str, title: str) -> Royalty:
+    return Royalty(
+        account_identifier=account_identifier,
+        book_title=title,
+        ebook_royalties="1.00",
+        print_royalties="2.00",
+        kenp_royalties="3.00",
+        total_royalties="6.00",
+        total_royalties_usd="6.00",
+    )
+
+@pytest_asyncio.fixture(name="catalog")
+async def catalog_fixture(session: AsyncSession):
+    portfolios = [
+        Portfolio(account_identifier="acct", portfolio_name="Alpha", spend="$10.00"),
+        Portfolio(account_identifier="acct", portfolio_name="Beta", spend="$20.00"),
+        Portfolio(account_identifier="other", portfolio_name="Gamma", spend="$30.00"),
+    ]
+    royalties = [make_royalty("acct", f"Book {i}") for i in range(3)]
+    session.add_all(portfolios + royalties)
+    await session.commit()
+    for obj in portfolios + royalties:
+        await session.refresh(obj)
+    return {
+        "portfolios": [p.id for p in portfolios],
+        "royalties": [r.id for r in royalties],
+    }
+
+@pytest.mark.asyncio
+async def test_link_and_unlink_bulk(client: AsyncClient, catalog: dict):
+    alpha, beta, _ = catalog["portfolios"]
+    r0, r1, r2 = catalog["royalties"]
+
+    response = await client.post("/api/royalties/link_bulk", json={"links": [
+        {"royalty_id": r0, "portfolio_id": alpha},
+        {"royalty_id": r1, "portfolio_id": beta},
+        {"royalty_id": r2, "portfolio_id": alpha},
+    ]})
+    assert response.status_code == 200
+    assert [(r["id"], r["portfolio_id"]) for r in response.json()] == [(r0, alpha), (r1, beta), (r2, alpha)]
+
+    response = await client.post("/api/royalties/unlink_bulk", json={"links": [
+        {"royalty_id": r0, "portfolio_id": alpha},
+        {"royalty_id": r1, "portfolio_id": beta},
+    ]})
+    assert response.status_code == 200
+    assert [r["portfolio_id"] for r in response.json()] == [None, None]
+
+    response = await client.get("/api/royalties/")
+    assert {r["id"]: r["portfolio_id"] for r in response.json()} == {r0: None, r1: None, r2: alpha}
+
+@pytest.mark.asyncio
+async def test_link_bulk_validation(client: AsyncClient, catalog: dict):
+    alpha, beta, gamma = catalog["portfolios"]
+    r0, r1, _ = catalog["royalties"]
+
+    response = await client.post("/api/royalties/link_bulk", json={"links": [{"royalty_id": 999, "portfolio_id": alpha}]})
+    assert response.status_code == 404
+
+    response = await client.post("/api/royalties/link_bulk", json={"links": [{"royalty_id": r0, "portfolio_id": 999}]})
+    assert response.status_code == 404
+
+    response = await client.post("/api/royalties/link_bulk", json={"links": [{"royalty_id": r0, "portfolio_id": gamma}]})
+    assert response.status_code == 400
+
+    response = await client.post("/api/royalties/unlink_bulk", json={"links": [{"royalty_id": r1, "portfolio_id": beta}]})
+    assert response.status_code == 400
+
+    response = await client.post("/api/royalties/link_bulk", json={"links": [
+        {"royalty_id": r0, "portfolio_id": alpha},
+        {"royalty_id": r0, "portfolio_id": beta},
+    ]})
+    assert response.status_code == 400
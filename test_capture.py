@@ -0,0 +1,129 @@
+import json
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.settings import settings
+from app.services.capture import decode_capture, hash_account, list_captures
+from scripts import replay_captures
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_capture.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+ROYALTY_HTML = """
+<div class="ui items no-margin unstackable">
+    <div class="item">
+        <img src="cover.jpg">
+        <div class="truncate-overflow">
+            Raw Book Deluxe
+        </div>
+        <div class="sixteen wide computer column">
+            <div class="row">
+                <div class="right aligned column">$1.00</div>
+                <div class="right aligned column">$2.00</div>
+                <div class="right aligned column">$3.00</div>
+                <div class="right aligned column">$6.00</div>
+                <div class="right aligned column">$6.00</div>
+            </div>
+        </div>
+    </div>
+    <div class="item">
+        <img src="cover.jpg">
+        <div class="truncate-overflow">Raw Book Deluxe</div>
+        <div class="sixteen wide computer column">
+            <div class="row">
+                <div class="right aligned column">$1.50</div>
+                <div class="right aligned column">$0.00</div>
+                <div class="right aligned column">$0.00</div>
+                <div class="right aligned column">$1.50</div>
+                <div class="right aligned column">$1.50</div>
+            </div>
+        </div>
+    </div>
+    <div class="item">
+        <div class="truncate-overflow">Total</div>
+    </div>
+</div>
+"""
+
+@pytest.mark.asyncio
+async def test_parse_payloads_are_captured_and_replayed(client: AsyncClient, tmp_path, monkeypatch):
+    capture_dir = tmp_path / "captures"
+    monkeypatch.setattr(settings, "INGEST_CAPTURE_DIR", str(capture_dir))
+    response = await client.post("/api/royalties/parse", json={"accountIdentifier": "acct", "htmlContent": ROYALTY_HTML})
+    assert response.status_code == 200
+    response = await client.post(
+        "/api/royalties/parse", params={"account_identifier": "acct"},
+        content=ROYALTY_HTML.encode(), headers={"Content-Type": "text/html"},
+    )
+    assert response.status_code == 200
+
+    captures = list_captures(str(capture_dir))
+    assert len(captures) == 2
+    record = decode_capture(captures[0].read_bytes())
+    assert record["kind"] == "royalties"
+    assert record["account"] == hash_account("acct") != "acct"
+    assert record["html"] == ROYALTY_HTML
+    assert "Raw Book Deluxe" in decode_capture(captures[1].read_bytes())["html"]
+
+    args = replay_captures.build_parser().parse_args([
+        str(capture_dir), "--database-url", "sqlite+aiosqlite:///./test_capture_replay.db",
+    ])
+    report = await replay_captures.replay(args)
+    assert report["summary"]["payloads"] == 2
+    assert report["summary"]["errors"] == 0
+    first, second = report["captures"]
+    assert first["output"]["Raw Book Deluxe"]["totalRoyaltiesUSD"] == "7.50"
+    assert first["digest"] == second["digest"]
+
+    baseline = tmp_path / "baseline.json"
+    first["output"]["Raw Book Deluxe"]["totalRoyaltiesUSD"] = "1.00"
+    first["digest"] = "changed"
+    baseline.write_text(json.dumps(report))
+    args.baseline = str(baseline)
+    report = await replay_captures.replay(args)
+    assert report["comparison"][0]["diff"] == {"added": [], "removed": [], "changed": ["Raw Book Deluxe"]}
+    assert "diff" not in report["comparison"][1]
+
+@pytest.mark.asyncio
+async def test_capture_sampling_and_size_cap(client: AsyncClient, tmp_path, monkeypatch):
+    capture_dir = tmp_path / "captures"
+    monkeypatch.setattr(settings, "INGEST_CAPTURE_DIR", str(capture_dir))
+    monkeypatch.setattr(settings, "INGEST_CAPTURE_SAMPLE_RATE", 0.0)
+    await client.post("/api/royalties/parse", json={"accountIdentifier": "acct", "htmlContent": ROYALTY_HTML})
+    assert list_captures(str(capture_dir)) == []
+
+    monkeypatch.setattr(settings, "INGEST_CAPTURE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "INGEST_CAPTURE_MAX_BYTES", 100)
+    response = await client.post("/api/royalties/parse", json={"accountIdentifier": "acct", "htmlContent": ROYALTY_HTML})
+    assert response.status_code == 200
+    assert list_captures(str(capture_dir)) == []
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+import json
+from app.core.events import ChangeBroker, change_broker
+from app.core.invalidation import InvalidationBus
+from app.crud import portfolio_crud, royalty_crud
+from app.services.change_stream import stream_changes
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_change_stream.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": total,
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": total,
+        "totalRoyaltiesUSD": total,
+    }
+
+def parse_frame(frame: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+@pytest.mark.asyncio
+async def test_crud_writes_publish_events(client: AsyncClient, session: AsyncSession):
+    stream = stream_changes("acct", heartbeat_seconds=5)
+    assert (await stream.__anext__()).startswith("retry:")
+    assert change_broker.subscriber_count("acct") == 1
+
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$1.00"}])
+    portfolio_id = portfolios[0].id
+    await royalty_crud.upsert_royalty_data(session, "other", [item("Elsewhere", "1.00")])
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "1.00"), item("B", "2.00")])
+    a, b = [r.id for r in royalties]
+    response = await client.patch(f"/api/royalties/{a}/link", json={"portfolio_id": portfolio_id})
+    assert response.status_code == 200
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "3.00")])
+
+    frames = [parse_frame(await stream.__anext__()) for _ in range(4)]
+    assert [f["event"] for f in frames] == [
+        "portfolios.upserted", "royalties.upserted", "royalty.linked", "royalties.upserted",
+    ]
+    assert frames[1]["data"] == {"account_identifier": "acct", "inserted": 2, "updated": 0, "deleted": []}
+    assert frames[2]["data"]["portfolio_id"] == portfolio_id
+    assert frames[3]["data"]["updated"] == 1
+    assert frames[3]["data"]["deleted"] == [b]
+
+    # Reconnecting with the id of the first event replays the three that followed it.
+    replay = stream_changes("acct", last_event_id=frames[0]["id"], heartbeat_seconds=5)
+    await replay.__anext__()
+    replayed = [parse_frame(await replay.__anext__()) for _ in range(3)]
+    assert [f["id"] for f in replayed] == [f["id"] for f in frames[1:]]
+
+    await stream.aclose()
+    await replay.aclose()
+    assert change_broker.subscriber_count("acct") == 0
+
+@pytest.mark.asyncio
+async def test_stream_heartbeats_and_resets():
+    broker = ChangeBroker(history_size=2, queue_size=1)
+    first = broker.publish("acct", "royalties.deleted", {})
+    for _ in range(3):
+        broker.publish("acct", "royalties.deleted", {})
+    assert broker.events_since("acct", first.id) is None  # Evicted from history
+    assert broker.events_since("acct", "unknown-1") is None
+
+    stream = stream_changes("acct", last_event_id=first.id, heartbeat_seconds=0.01, broker=broker)
+    await stream.__anext__()
+    assert await stream.__anext__() == "event: reset\ndata: {}\n\n"
+    assert await stream.__anext__() == ": heartbeat\n\n"
+
+    # A listener that falls behind its queue catches up from history instead of losing events.
+    published = [broker.publish("acct", "portfolios.deleted", {"n": n}) for n in range(2)]
+    frames = [parse_frame(await stream.__anext__()) for _ in range(2)]
+    assert [f["id"] for f in frames] == [e.id for e in published]
+    await stream.aclose()
+    assert broker.subscriber_count() == 0
+
+def test_events_are_relayed_between_processes():
+    sender, listener = InvalidationBus("test_channel"), InvalidationBus("test_channel")
+    sender._outbox = asyncio.Queue()  # As while its listener connection is up
+    publisher = ChangeBroker(10, 10, relay=lambda message: sender.relay("change", message))
+    receiver = ChangeBroker(10, 10)
+    listener.add_relay_handler("change", receiver.receive)
+    subscription = receiver.subscribe("acct")
+
+    published = publisher.publish("acct", "royalties", {"updated": 2})
+    payload = sender._outbox.get_nowait()
+    listener._on_notify(None, 0, "test_channel", payload)
+
+    event = subscription.queue.get_nowait()
+    assert (event.type, event.data, event.created_at) == ("royalties", {"updated": 2}, published.created_at)
+    assert receiver.sequence_of(event.id) == 1
+
+    # A process ignores its own relayed messages.
+    sender.add_relay_handler("change", publisher.receive)
+    sender._on_notify(None, 0, "test_channel", payload)
+    assert publisher.sequence == 1
+
+def test_oversized_events_are_relayed_as_truncated():
+    relayed = []
+    bus = InvalidationBus("test_channel")
+
+    def relay(message):
+        ok = bus.relay("change", message)
+        relayed.append(message["data"] if ok else None)
+        return ok
+
+    broker = ChangeBroker(10, 10, relay=relay)
+    event = broker.publish("acct", "portfolios", {"deleted": list(range(5000))})
+    assert len(event.data["deleted"]) == 5000
+    assert relayed == [None, {"truncated": True}]
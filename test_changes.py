@@ -0,0 +1,116 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import portfolio_crud, rollup_crud, royalty_crud
+from app.services.job_worker import process_next_job
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_changes.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": total,
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": total,
+        "totalRoyaltiesUSD": total,
+    }
+
+async def changes(client: AsyncClient, since: int, account: str = "acct") -> dict:
+    response = await client.get("/api/changes", params={"account_identifier": account, "since": since})
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.mark.asyncio
+async def test_change_feed(client: AsyncClient, session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$1.00"},
+        {"portfolio_name": "P2", "spend": "$2.00"},
+    ])
+    p1, p2 = [p.id for p in portfolios]
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "1.00"), item("B", "2.00"), item("C", "3.00")])
+    a, b, c = [r.id for r in royalties]
+    await royalty_crud.upsert_royalty_data(session, "other", [item("Elsewhere", "1.00")])
+
+    full = await changes(client, 0)
+    assert sorted(r["id"] for r in full["royalties"]) == [a, b, c]
+    assert sorted(p["id"] for p in full["portfolios"]) == [p1, p2]
+    cursor = full["cursor"]
+
+    # Nothing changed: an identical ingest moves no rows into the feed.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "1.00"), item("B", "2.00"), item("C", "3.00")])
+    feed = await changes(client, cursor)
+    assert feed["royalties"] == [] and feed["deleted_royalty_ids"] == []
+    cursor = feed["cursor"]
+
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "5.00"), item("C", "3.00"), item("D", "4.00")])
+    response = await client.post("/api/royalties/link_bulk", json={"links": [{"royalty_id": c, "portfolio_id": p2}]})
+    assert response.status_code == 200
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P2", "spend": "$2.00"}])
+
+    feed = await changes(client, cursor)
+    assert sorted(r["book_title"] for r in feed["royalties"]) == ["A", "C", "D"]
+    assert feed["deleted_royalty_ids"] == [b]
+    assert feed["portfolios"] == []
+    assert feed["deleted_portfolio_ids"] == [p1]
+    cursor = feed["cursor"]
+
+    response = await client.delete("/api/portfolios/portfolios/acct")
+    assert response.status_code == 202
+    assert await process_next_job(session)
+    # A purged account leaves nothing in the feed, tombstones included; clients drop it on account.deleted.
+    feed = await changes(client, 0)
+    assert (feed["royalties"], feed["portfolios"]) == ([], [])
+    assert (feed["deleted_royalty_ids"], feed["deleted_portfolio_ids"]) == ([], [])
+
+    other = await changes(client, 0, "other")
+    assert [r["book_title"] for r in other["royalties"]] == ["Elsewhere"]
+
+@pytest.mark.asyncio
+async def test_deleting_a_portfolio_reports_its_unlinked_royalties(client: AsyncClient, session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$1.00"},
+        {"portfolio_name": "P2", "spend": "$2.00"},
+    ])
+    p1 = portfolios[0].id
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", "1.00"), item("B", "2.00")])
+    a = royalties[0].id
+    await royalty_crud.set_portfolio_links(session, {a: p1})
+    cursor = (await changes(client, 0))["cursor"]
+
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P2", "spend": "$2.00"}])
+    feed = await changes(client, cursor)
+    assert [(r["id"], r["portfolio_id"]) for r in feed["royalties"]] == [(a, None)]
+    assert feed["deleted_portfolio_ids"] == [p1]
+    assert await rollup_crud.check_rollups(session) == []
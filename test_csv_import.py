@@ -0,0 +1,150 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+import asyncio
+from datetime import date, datetime, time, timedelta
+from sqlmodel import select
+from app.crud import import_crud, rollup_crud, royalty_crud
+from app.db import session as db_session
+from app.models.royalty import Royalty
+from app.models.royalty_import import RoyaltyImportRow
+from app.models.snapshot import RoyaltySnapshot
+from app.services.csv_import import import_royalty_csv, iter_csv_records
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_csv_import.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": total,
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": total,
+        "totalRoyaltiesUSD": total,
+    }
+
+def months_ago(months: int) -> date:
+    first = date.today().replace(day=1)
+    for _ in range(months):
+        first = (first - timedelta(days=1)).replace(day=1)
+    return first
+
+def report() -> str:
+    two, one, now = months_ago(2), months_ago(1), months_ago(0)
+    return "\n".join([
+        "Royalty Date,Title,Author Name,ASIN/ISBN,Marketplace,Royalty Type,Units Sold,Royalty,Currency",
+        f"{two.isoformat()},Keto Cookbook,Jane,B01,Amazon.com,70%,3,10.50,USD",
+        f"{one.isoformat()},Keto Cookbook,Jane,B01,Amazon.com,70%,2,7.00,USD",
+        f"{one.isoformat()},Keto Cookbook,Jane,B01,Amazon.com,Paperback,1,\"1,002.00\",USD",
+        f"{one.isoformat()},Keto Cookbook,Jane,B01,Amazon.de,KENP Read,0,4.00,EUR",
+        f'{one.isoformat()},"Puzzles, Vol. 2",Jane,B02,Amazon.com,70%,1,3.25,USD',
+        f"{now.isoformat()},Keto Cookbook,Jane,B01,Amazon.com,70%,1,1.00,USD",
+        "not a date,Broken Row,Jane,B03,Amazon.com,70%,1,1.00,USD",
+        "",
+    ])
+
+async def chunks(text: str, size: int = 7):
+    data = text.encode("utf-8-sig")
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+@pytest.mark.asyncio
+async def test_iter_csv_records_handles_split_chunks_and_quotes():
+    text = 'a,b\r\n"multi\nline, title",2\n"x ""quoted""",3'
+    records = [r async for r in iter_csv_records(chunks(text, 3))]
+    assert records == [["a", "b"], ["multi\nline, title", "2"], ['x "quoted"', "3"]]
+
+@pytest.mark.asyncio
+async def test_import_royalty_csv(client: AsyncClient, session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("Keto Cookbook", "5.00")])
+
+    result = await import_royalty_csv(session, "acct", chunks(report()), batch_size=2)
+    assert result.rows == 6
+    assert result.skipped_rows == 1
+    assert result.snapshots == 4  # Keto x 3 months + Puzzles x 1
+    assert result.updated_titles == 1
+    assert result.inserted_titles == 1
+
+    royalties = {r.book_title: r for r in (await session.exec(select(Royalty).where(Royalty.account_identifier == "acct"))).all()}
+    assert royalties["Keto Cookbook"].last_month_royalty == "1009.00"  # USD only; the EUR KENP row is excluded
+    assert royalties["Keto Cookbook"].total_royalties_usd == "5.00"  # Current-period values are untouched
+    assert royalties["Puzzles, Vol. 2"].last_month_royalty == "3.25"
+    assert royalties["Puzzles, Vol. 2"].total_royalties == "0.00"
+    assert await rollup_crud.check_rollups(session, "acct") == []
+
+    snapshots = (await session.exec(
+        select(RoyaltySnapshot).where(RoyaltySnapshot.book_title == "Keto Cookbook").order_by(RoyaltySnapshot.captured_at)
+    )).all()
+    imported = [s for s in snapshots if s.captured_at.time() == time(23, 59, 59)]
+    assert [(s.ebook_royalties, s.print_royalties, s.kenp_royalties, s.total_royalties) for s in imported[:2]] == [
+        (10.5, 0.0, 0.0, 10.5), (7.0, 1002.0, 4.0, 1013.0),
+    ]
+
+    # Importing the same report again replaces its months instead of duplicating them.
+    response = await client.post("/api/royalties/import_csv", params={"account_identifier": "acct"}, content=report())
+    assert response.status_code == 200
+    assert response.json()["inserted_titles"] == 0
+    count = len((await session.exec(select(RoyaltySnapshot).where(RoyaltySnapshot.account_identifier == "acct"))).all())
+    assert count == 1 + 4  # The ingest snapshot plus the imported months
+
+    response = await client.post("/api/royalties/import_csv", params={"account_identifier": "acct"}, content="Foo,Bar\n1,2\n")
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_streaming_import_does_not_block_account_writers(session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(db_session, "_sqlite_writer", asyncio.Lock())
+    stale = ("old-import", "acct", "Gone", datetime(2020, 1, 31), "ebook", "USD", 1.0, datetime(2020, 2, 1))
+    await import_crud.stage_rows(session, [stale])
+    await session.commit()
+
+    async def slow_upload():
+        lines = report().encode("utf-8").splitlines(keepends=True)
+        for number, line in enumerate(lines):
+            if number == 4:
+                # Rows are already staged; another request writes to the account mid-upload.
+                async with AsyncSession(engine) as other:
+                    await asyncio.wait_for(royalty_crud.upsert_royalty_data(other, "acct", [item("Keto Cookbook", "5.00")]), 5)
+            yield line
+
+    result = await import_royalty_csv(session, "acct", slow_upload(), batch_size=2)
+    assert result.snapshots == 4
+    assert (await session.exec(select(RoyaltyImportRow))).all() == []  # Merged, and the abandoned row cleared
+
+    async def broken_upload():
+        yield report().encode("utf-8")
+        raise ConnectionError("client went away")
+
+    with pytest.raises(ConnectionError):
+        await import_royalty_csv(session, "acct", broken_upload(), batch_size=2)
+    assert (await session.exec(select(RoyaltyImportRow))).all() == []
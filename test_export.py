@@ -0,0 +1,94 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from app.crud import portfolio_crud, royalty_crud
+from app.services import export
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_export.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": total,
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": total,
+        "totalRoyaltiesUSD": total,
+    }
+
+@pytest.mark.asyncio
+async def test_export_royalties(client: AsyncClient, session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(export, "YIELD_PER", 2)  # Several fetch batches even for a small export
+    await royalty_crud.upsert_royalty_data(session, "acct", [item(f"Title, {n}", f"{n}.00") for n in range(5)])
+    await royalty_crud.upsert_royalty_data(session, "other", [item("Elsewhere", "1.00")])
+
+    response = await client.get("/api/royalties/export", params={"account_identifier": "acct"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="royalties.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [r["book_title"] for r in rows] == [f"Title, {n}" for n in range(5)]
+    assert rows[3]["total_royalties_usd"] == "3.00"
+    assert rows[0]["portfolio_id"] == ""
+
+    response = await client.get("/api/royalties/export", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 6
+    assert lines[-1]["account_identifier"] == "other"
+    datetime.fromisoformat(lines[0]["updated_at"])
+
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    response = await client.get("/api/royalties/export", params={"format": "ndjson", "updated_since": future})
+    assert response.text == ""
+    response = await client.get("/api/royalties/export", params={"updated_since": future})
+    assert response.text.strip() == ",".join(export.ROYALTY_EXPORT_COLUMNS)
+
+@pytest.mark.asyncio
+async def test_export_portfolios(client: AsyncClient, session: AsyncSession):
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$1,000.00"},
+        {"portfolio_name": "P2", "spend": "$2.00"},
+    ])
+    response = await client.get("/api/portfolios/portfolios/export", params={"format": "ndjson", "account_identifier": "acct"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(l["portfolio_name"], l["spend"]) for l in lines] == [("P1", "$1,000.00"), ("P2", "$2.00")]
+
+    response = await client.get("/api/portfolios/portfolios/export", params={"format": "xml"})
+    assert response.status_code == 422
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import royalty_crud
+from app.models.snapshot import RoyaltySnapshot
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_history.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+@pytest.mark.asyncio
+async def test_snapshots_only_for_changed_titles(session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 1), item("B", 2)])
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 1), item("B", 3)])
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("B", 3)])
+
+    result = await session.exec(select(RoyaltySnapshot).order_by(RoyaltySnapshot.id))
+    rows = [(s.book_title, s.total_royalties_usd) for s in result.all()]
+    # A unchanged on the second ingest; removed (zeroed) on the third.
+    assert rows == [("A", 1.0), ("B", 2.0), ("B", 3.0), ("A", 0.0)]
+
+@pytest.mark.asyncio
+async def test_history_endpoint_carries_values_forward(client: AsyncClient, session: AsyncSession):
+    base = datetime(2026, 1, 1)
+    session.add_all([
+        RoyaltySnapshot(account_identifier="acct", book_title="A", captured_at=base, ebook_royalties=5, print_royalties=0,
+                        kenp_royalties=0, total_royalties=5, total_royalties_usd=5),
+        RoyaltySnapshot(account_identifier="acct", book_title="B", captured_at=base + timedelta(days=10), ebook_royalties=2,
+                        print_royalties=0, kenp_royalties=0, total_royalties=2, total_royalties_usd=2),
+        RoyaltySnapshot(account_identifier="acct", book_title="A", captured_at=base + timedelta(days=20), ebook_royalties=7,
+                        print_royalties=0, kenp_royalties=0, total_royalties=7, total_royalties_usd=7),
+        RoyaltySnapshot(account_identifier="other", book_title="A", captured_at=base + timedelta(days=15), ebook_royalties=99,
+                        print_royalties=0, kenp_royalties=0, total_royalties=99, total_royalties_usd=99),
+    ])
+    await session.commit()
+
+    response = await client.get("/api/royalties/history", params={
+        "account_identifier": "acct",
+        "start": (base + timedelta(days=5)).isoformat(),
+        "end": (base + timedelta(days=30)).isoformat(),
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["total_royalties_usd"] for p in data["totals"]] == [5.0, 7.0, 9.0]
+    titles = {s["book_title"]: s for s in data["titles"]}
+    assert titles["A"]["opening"]["total_royalties_usd"] == 5.0
+    assert [p["total_royalties_usd"] for p in titles["A"]["points"]] == [7.0]
+    assert titles["B"]["opening"] is None
+
+    response = await client.get("/api/royalties/history", params={
+        "account_identifier": "acct",
+        "book_title": "B",
+        "start": base.isoformat(),
+        "end": (base + timedelta(days=30)).isoformat(),
+    })
+    assert [s["book_title"] for s in response.json()["titles"]] == ["B"]
@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db import session as db_session
+from app.db.session import get_session
+from app.core import idempotency
+from app.crud import portfolio_crud, royalty_crud, user_crud
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_idempotency.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+@pytest.mark.asyncio
+async def test_retries_replay_the_stored_response(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.MemoryIdempotencyStore())
+    calls = []
+    create_user = user_crud.create_user
+
+    async def slow_create_user(session, user_create):
+        calls.append(user_create.email)
+        await asyncio.sleep(0.2)
+        return await create_user(session, user_create)
+
+    monkeypatch.setattr(user_crud, "create_user", slow_create_user)
+    user = {"email": "retry@example.com", "password": "securepassword"}
+    headers = {"Idempotency-Key": "register-1"}
+
+    # A duplicate sent while the original runs waits for it instead of running again.
+    first, second = await asyncio.gather(
+        client.post("/auth/register", json=user, headers=headers),
+        client.post("/auth/register", json=user, headers=headers),
+    )
+    assert calls == ["retry@example.com"]
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json()
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "session" in second.headers["set-cookie"]
+
+    third = await client.post("/auth/register", json=user, headers=headers)
+    assert third.json() == first.json()
+    assert calls == ["retry@example.com"]
+
+    # Same key, different request.
+    response = await client.post("/auth/register", json={**user, "password": "other"}, headers=headers)
+    assert response.status_code == 422
+    # Without a key every request runs.
+    response = await client.post("/auth/register", json=user)
+    assert response.status_code == 409
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_database_store_is_shared(client: AsyncClient, session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.DatabaseIdempotencyStore(engine))
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$1.00"}])
+    portfolio_id = portfolios[0].id
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [{
+        "bookTitle": "A", "eBookRoyalties": "1.00", "printRoyalties": "0.00", "kenpRoyalties": "0.00",
+        "totalRoyalties": "1.00", "totalRoyaltiesUSD": "1.00",
+    }])
+    royalty_id = royalties[0].id
+    headers = {"Idempotency-Key": "link-1"}
+
+    first = await client.patch(f"/api/royalties/{royalty_id}/link", json={"portfolio_id": portfolio_id}, headers=headers)
+    assert first.status_code == 200
+    # Unlink in between: a replayed link must not relink.
+    await client.patch(f"/api/royalties/{royalty_id}/unlink")
+    second = await client.patch(f"/api/royalties/{royalty_id}/link", json={"portfolio_id": portfolio_id}, headers=headers)
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
+    royalty = await royalty_crud.get_royalty_by_id(session, royalty_id)
+    await session.refresh(royalty)
+    assert royalty.portfolio_id is None
+
+    response = await client.patch(f"/api/royalties/{royalty_id}/link", json={"portfolio_id": portfolio_id}, headers={"Idempotency-Key": " "})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_original_that_outlives_the_wait_keeps_its_key(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.DatabaseIdempotencyStore(engine))
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_LEASE_SECONDS", 0.3)
+    # Lease renewals contend for the SQLite writer; a lock waited on binds to this test's event loop.
+    monkeypatch.setattr(db_session, "_sqlite_writer", asyncio.Lock())
+    calls = []
+    create_user = user_crud.create_user
+
+    async def slow_create_user(session, user_create):
+        calls.append(user_create.email)
+        await asyncio.sleep(1.0)  # Several leases long
+        return await create_user(session, user_create)
+
+    monkeypatch.setattr(user_crud, "create_user", slow_create_user)
+    user = {"email": "slow@example.com", "password": "securepassword"}
+    headers = {"Idempotency-Key": "register-slow"}
+
+    async def late_retry():
+        await asyncio.sleep(0.5)
+        return await client.post("/auth/register", json=user, headers=headers)
+
+    first, retry = await asyncio.gather(client.post("/auth/register", json=user, headers=headers), late_retry())
+    assert first.status_code == 201
+    assert retry.status_code == 409  # Still in progress: the renewed lease kept the key claimed
+    assert calls == ["slow@example.com"]
+
+    replay = await client.post("/auth/register", json=user, headers=headers)
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert calls == ["slow@example.com"]
+
+@pytest.mark.asyncio
+async def test_keyed_request_bodies_are_capped(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.MemoryIdempotencyStore())
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_MAX_REQUEST_BYTES", 64)
+    body = b"Title,Royalty\n" + b"Book,1.00\n" * 20
+
+    response = await client.post(
+        "/api/royalties/import_csv?account_identifier=acct", content=body,
+        headers={"Idempotency-Key": "csv-1", "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 413
+
+    async def chunked():  # No Content-Length: the cap applies while reading
+        for _ in range(20):
+            yield b"Book,1.00\n"
+
+    response = await client.post(
+        "/api/royalties/import_csv?account_identifier=acct", content=chunked(),
+        headers={"Idempotency-Key": "csv-2", "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 413
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_to_the_caller(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.MemoryIdempotencyStore())
+    headers = {"Idempotency-Key": "shared-key"}
+
+    # Two callers picking the same key each get their own request run, not a 422 or the other's response.
+    alice = await client.post("/auth/register", json={"email": "alice@example.com", "password": "securepassword"},
+                               headers={**headers, "Authorization": "Bearer alice"})
+    bob = await client.post("/auth/register", json={"email": "bob@example.com", "password": "securepassword"},
+                             headers={**headers, "Authorization": "Bearer bob"})
+    assert alice.status_code == bob.status_code == 201
+    assert "idempotent-replayed" not in bob.headers
+    assert bob.json() != alice.json()
+
+    retry = await client.post("/auth/register", json={"email": "bob@example.com", "password": "securepassword"},
+                              headers={**headers, "Authorization": "Bearer bob"})
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == bob.json()
+
+    assert idempotency.caller_identity({"headers": [], "query_string": b"account_identifier=a"}) != \
+        idempotency.caller_identity({"headers": [(b"x-account-identifier", b"b")], "query_string": b""})
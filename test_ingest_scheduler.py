@@ -0,0 +1,213 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.settings import settings
+from app.services import ingest
+from app.services.ingest_scheduler import IngestQueueFull, IngestScheduler, ingest_scheduler
+from app.services.single_flight import ingest_coalescer
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_ingest_scheduler.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+async def _job(scheduler: IngestScheduler, account: str, size: int, order: list, release: asyncio.Event, admit: bool = False):
+    if admit:
+        with scheduler.admit(account):
+            return await _job(scheduler, account, size, order, release)
+    async with scheduler.slot(account, size):
+        order.append(account)
+        await release.wait()
+
+@pytest.mark.asyncio
+async def test_per_account_and_global_caps(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_CONCURRENT", 2)
+    monkeypatch.setattr(settings, "INGEST_MAX_CONCURRENT_PER_ACCOUNT", 1)
+    scheduler = IngestScheduler()
+    order, release = [], asyncio.Event()
+
+    tasks = [asyncio.create_task(_job(scheduler, account, 100, order, release)) for account in ("a", "a", "b", "c")]
+    await asyncio.sleep(0.01)
+    # One slot per account and two overall: the second "a" and "c" wait.
+    assert order == ["a", "b"]
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert sorted(order) == ["a", "a", "b", "c"]
+    assert scheduler._running == 0 and not scheduler._queued_by_account
+
+@pytest.mark.asyncio
+async def test_small_account_overtakes_a_large_backlog(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED_PER_ACCOUNT", 10)
+    scheduler = IngestScheduler()
+    order, release = [], asyncio.Event()
+
+    tasks = [asyncio.create_task(_job(scheduler, "big", 500 * 1024, order, release)) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(_job(scheduler, "small", 2 * 1024, order, release)))
+    await asyncio.sleep(0.01)
+
+    release.set()
+    await asyncio.gather(*tasks)
+    # Arrived last, but its finish tag is far below those of the big account's queued pages.
+    assert order == ["big", "small", "big", "big", "big"]
+
+@pytest.mark.asyncio
+async def test_full_account_queue_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_CONCURRENT_PER_ACCOUNT", 1)
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED_PER_ACCOUNT", 1)
+    scheduler = IngestScheduler()
+    order, release = [], asyncio.Event()
+
+    tasks = [asyncio.create_task(_job(scheduler, "a", 100, order, release, admit=True)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    with pytest.raises(IngestQueueFull) as exc_info:
+        with scheduler.admit("a"):
+            pass
+    assert exc_info.value.retry_after == 2  # One running and one queued, at the initial one second each
+
+    # Other accounts are unaffected, and background work (not admitted) waits instead of being rejected.
+    tasks.append(asyncio.create_task(_job(scheduler, "b", 100, order, release, admit=True)))
+    tasks.append(asyncio.create_task(_job(scheduler, "a", 100, order, release)))
+    await asyncio.sleep(0.01)
+    assert order == ["a", "b"]
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order.count("a") == 3
+    assert not scheduler._admitted_by_account
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_CONCURRENT", 1)
+    scheduler = IngestScheduler()
+    order, release = [], asyncio.Event()
+
+    running = asyncio.create_task(_job(scheduler, "a", 100, order, release))
+    await asyncio.sleep(0.01)
+    waiting = asyncio.create_task(_job(scheduler, "b", 100, order, release))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    release.set()
+    await running
+    assert order == ["a"]
+    assert scheduler._running == 0 and not scheduler._queued_by_account and not scheduler._heap
+
+@pytest.mark.asyncio
+async def test_parse_endpoint_returns_429_with_retry_after(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED_PER_ACCOUNT", 0)
+    response = await client.post(
+        "/api/royalties/parse",
+        json={"accountIdentifier": "sched_account", "htmlContent": "<div></div>"},
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED_PER_ACCOUNT", 3)
+    response = await client.post(
+        "/api/royalties/parse",
+        json={"accountIdentifier": "sched_account", "htmlContent": "<div></div>"},
+    )
+    assert response.status_code == 200
+
+def _royalty_html(title: str) -> str:
+    return f"""
+    <div class="ui items no-margin unstackable">
+        <div class="item">
+            <img src="cover.jpg">
+            <div class="truncate-overflow">{title}</div>
+            <div class="sixteen wide computer column">
+                <div class="row">
+                    <div class="right aligned column">$1.00</div>
+                    <div class="right aligned column">$0.00</div>
+                    <div class="right aligned column">$0.00</div>
+                    <div class="right aligned column">$1.00</div>
+                    <div class="right aligned column">$1.00</div>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+
+@pytest.mark.asyncio
+async def test_burst_waiting_for_a_slot_parses_only_the_newest_payload(client: AsyncClient, monkeypatch):
+    parsed = []
+    extract = ingest.extract_royalty_rows
+
+    def recording_extract(html_content):
+        parsed.append(html_content)
+        return extract(html_content)
+
+    monkeypatch.setattr(ingest, "extract_royalty_rows", recording_extract)
+    key = ("royalties", "burst_account")
+
+    async with ingest_scheduler.slot("burst_account", 0):  # Occupies the account's only slot
+        requests = [
+            asyncio.create_task(client.post(
+                "/api/royalties/parse",
+                json={"accountIdentifier": "burst_account", "htmlContent": _royalty_html(f"Book {i}")},
+            ))
+            for i in range(3)
+        ]
+        for _ in range(200):
+            if len(ingest_coalescer._pending.get(key, [])) == 3:
+                break
+            await asyncio.sleep(0.01)
+        assert len(ingest_coalescer._pending[key]) == 3
+
+    responses = await asyncio.gather(*requests)
+    assert [response.status_code for response in responses] == [200] * 3
+    # All three waited for the same slot and were coalesced: one parse, one shared result.
+    assert len(parsed) == 1
+    assert all(response.json() == responses[0].json() for response in responses)
+
+@pytest.mark.asyncio
+async def test_structured_ingest_returns_429_before_writing(client: AsyncClient, monkeypatch):
+    batch = {"accounts": [
+        {"accountIdentifier": "free_account", "portfolios": [{"portfolio_name": "P", "spend": 1.0}]},
+        {"accountIdentifier": "busy_account", "portfolios": []},
+    ]}
+    monkeypatch.setattr(settings, "INGEST_MAX_QUEUED_PER_ACCOUNT", 1)
+    with ingest_scheduler.admit("busy_account"):  # One request already waiting fills its queue
+        response = await client.post("/api/ingest/v1", json=batch)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert not ingest_scheduler._admitted_by_account
+    assert (await client.get("/api/portfolios/portfolios")).json() == []
+
+    response = await client.post("/api/ingest/v1", json=batch)
+    assert response.status_code == 200
+    assert [a["portfolios"] for a in response.json()["accounts"]] == [1, 0]
@@ -0,0 +1,145 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+import json
+import os
+from app.api.dashboard import summary_cache
+from app.core.invalidation import InvalidationBus, LocalCache, invalidation_bus
+from app.crud import portfolio_crud
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_invalidation.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, scope, key):
+        self.calls.append((scope, key))
+
+@pytest_asyncio.fixture(name="recorder")
+async def recorder_fixture():
+    recorder = Recorder()
+    invalidation_bus.add_handler(recorder)
+    yield recorder
+    invalidation_bus.remove_handler(recorder)
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_after_commit(client: AsyncClient, session: AsyncSession, recorder: Recorder):
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$1.00"}])
+    assert recorder.calls == [("account", "acct")]
+
+    # A rolled back write publishes nothing.
+    await invalidation_bus.publish(session, "account", "acct")
+    await session.rollback()
+    assert recorder.calls == [("account", "acct")]
+
+    response = await client.post("/auth/register", json={"email": "new@example.com", "password": "secret"})
+    assert response.status_code == 201
+    assert recorder.calls[-1] == ("user", "new@example.com")
+
+@pytest.mark.asyncio
+async def test_summary_cache_is_evicted_by_writes(client: AsyncClient, session: AsyncSession):
+    summary_cache.clear()
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$1.00"}])
+    response = await client.get("/api/dashboard/summary", params={"account_identifier": "acct"})
+    assert response.json()["account"]["spend"] == 1.0
+    assert summary_cache.get("acct", True) is not None
+
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$7.00"}])
+    assert summary_cache.get("acct", True) is None
+    response = await client.get("/api/dashboard/summary", params={"account_identifier": "acct"})
+    assert response.json()["account"]["spend"] == 7.0
+
+def test_notifications_from_other_processes_evict_local_entries():
+    bus = InvalidationBus("test_channel")
+    cache = LocalCache(bus, "account", ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("a", 2, variant="compact")
+    cache.set("b", 3)
+
+    bus._on_notify(None, 0, "test_channel", json.dumps({"origin": bus.origin, "scope": "account", "key": "a"}))
+    assert cache.get("a") == 1  # Own notifications were already delivered at commit
+    bus._on_notify(None, 0, "test_channel", json.dumps({"origin": "other", "scope": "account", "key": "a"}))
+    assert cache.get("a") is None and cache.get("a", "compact") is None
+    assert cache.get("b") == 3
+    bus._on_notify(None, 0, "test_channel", json.dumps({"origin": "other", "scope": "user", "key": "b"}))
+    assert cache.get("b") == 3
+    bus.deliver(None, None)
+    assert cache.get("b") is None
+
+def test_values_computed_before_an_invalidation_are_not_cached():
+    bus = InvalidationBus("test_channel")
+    cache = LocalCache(bus, "account", ttl_seconds=60)
+    generation = cache.generation("a")
+    other = cache.generation("b")
+    bus.deliver("account", "a")  # A write lands while "a" is being computed
+    cache.set("a", "stale", generation=generation)
+    cache.set("b", "fresh", generation=other)
+    assert cache.get("a") is None
+    assert cache.get("b") == "fresh"
+
+    generation = cache.generation("b")
+    bus.deliver(None, None)
+    cache.set("b", "stale", generation=generation)
+    assert cache.get("b") is None
+    cache.set("a", "fresh", generation=cache.generation("a"))
+    assert cache.get("a") == "fresh"
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+@pytest.mark.asyncio
+async def test_postgres_notify_reaches_other_listeners():
+    import asyncio
+    from app.core.invalidation import listener_dsn
+
+    url = os.environ["TEST_POSTGRES_URL"]
+    publisher_bus = InvalidationBus("test_invalidation")
+    listener_bus = InvalidationBus("test_invalidation")
+    recorder = Recorder()
+    listener_bus.add_handler(recorder)
+    stop = asyncio.Event()
+    listener = asyncio.create_task(listener_bus.listen(listener_dsn(url), stop))
+    await asyncio.sleep(1)
+
+    pg_engine = create_async_engine(url)
+    async with AsyncSession(pg_engine) as pg_session:
+        await publisher_bus.publish(pg_session, "account", "acct")
+        await pg_session.commit()
+    for _ in range(50):
+        if ("account", "acct") in recorder.calls:
+            break
+        await asyncio.sleep(0.1)
+    stop.set()
+    await listener
+    await pg_engine.dispose()
+    assert ("account", "acct") in recorder.calls
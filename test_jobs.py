@@ -0,0 +1,169 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.settings import settings
+from app.crud import job_crud
+from app.models.royalty import Royalty
+from app.schemas.kdp import KDPPayload
+from app.services.ingest_scheduler import ingest_scheduler
+from app.services.job_worker import process_next_job
+from app.services.single_flight import ingest_coalescer
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_jobs.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+ROYALTY_HTML = """
+<div class="ui items no-margin unstackable">
+    <div class="item">
+        <img src="cover.jpg">
+        <div class="truncate-overflow">Queued Book</div>
+        <div class="sixteen wide computer column">
+            <div class="row">
+                <div class="right aligned column">$1.00</div>
+                <div class="right aligned column">$2.00</div>
+                <div class="right aligned column">$3.00</div>
+                <div class="right aligned column">$6.00</div>
+                <div class="right aligned column">$6.00</div>
+            </div>
+        </div>
+    </div>
+</div>
+"""
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+@pytest.mark.asyncio
+async def test_background_parse_returns_job(client: AsyncClient, session: AsyncSession):
+    payload = KDPPayload(accountIdentifier="queued_account", htmlContent=ROYALTY_HTML)
+    response = await client.post("/api/royalties/parse?background=true", json=payload.model_dump())
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "pending"
+    assert job["kind"] == "royalties"
+    assert "payload" not in job
+
+    assert await process_next_job(session) is True
+    assert await process_next_job(session) is False
+
+    response = await client.get(f"/api/jobs/{job['id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["result_count"] == 1
+
+    result = await session.exec(select(Royalty).where(Royalty.account_identifier == "queued_account"))
+    royalties = result.all()
+    assert [r.book_title for r in royalties] == ["Queued Book"]
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_marked_failed(client: AsyncClient, session: AsyncSession):
+    response = await client.post(
+        "/api/portfolios/parse_portfolios?background=true",
+        json={"accountIdentifier": "queued_account", "htmlContent": "<html></html>"},
+    )
+    job_id = response.json()["id"]
+
+    # Sabotage the job kind so the handler lookup fails on every attempt.
+    job = await job_crud.get_job_by_id(session, job_id)
+    job.kind = "unknown"
+    session.add(job)
+    await session.commit()
+
+    while await process_next_job(session):
+        pass
+
+    response = await client.get(f"/api/jobs/{job_id}")
+    data = response.json()
+    assert data["status"] == "failed"
+    assert data["attempts"] == 3
+    assert "Unknown job kind" in data["error"]
+
+@pytest.mark.asyncio
+async def test_get_unknown_job(client: AsyncClient):
+    response = await client.get("/api/jobs/999")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_older_jobs_for_same_account_are_superseded(client: AsyncClient, session: AsyncSession):
+    job_ids = []
+    for _ in range(3):
+        payload = KDPPayload(accountIdentifier="queued_account", htmlContent=ROYALTY_HTML)
+        response = await client.post("/api/royalties/parse?background=true", json=payload.model_dump())
+        job_ids.append(response.json()["id"])
+
+    while await process_next_job(session):
+        pass
+
+    statuses = [(await client.get(f"/api/jobs/{job_id}")).json()["status"] for job_id in job_ids]
+    assert statuses == ["superseded", "superseded", "done"]
+
+async def _started_at(job_id: int) -> datetime:
+    async with AsyncSession(engine) as other:
+        return (await job_crud.get_job_by_id(other, job_id)).started_at
+
+@pytest.mark.asyncio
+async def test_job_clock_starts_when_its_slot_is_granted(client: AsyncClient, session: AsyncSession):
+    payload = KDPPayload(accountIdentifier="slow_account", htmlContent=ROYALTY_HTML)
+    job_id = (await client.post("/api/royalties/parse?background=true", json=payload.model_dump())).json()["id"]
+
+    async with ingest_scheduler.slot("slow_account", 0):  # Another ingest holds the account's slot
+        worker = asyncio.create_task(process_next_job(session))
+        for _ in range(200):
+            if ingest_coalescer._pending.get(("royalties", "slow_account")):
+                break
+            await asyncio.sleep(0.01)
+        claimed_at = await _started_at(job_id)
+        await asyncio.sleep(0.05)
+
+    assert await worker is True
+    assert await _started_at(job_id) - claimed_at >= timedelta(seconds=0.05)
+    assert (await client.get(f"/api/jobs/{job_id}")).json()["status"] == "done"
+
+@pytest.mark.asyncio
+async def test_abandoned_job_on_its_last_attempt_is_failed(client: AsyncClient, session: AsyncSession, monkeypatch):
+    payload = KDPPayload(accountIdentifier="queued_account", htmlContent=ROYALTY_HTML)
+    job_id = (await client.post("/api/royalties/parse?background=true", json=payload.model_dump())).json()["id"]
+
+    job = await job_crud.get_job_by_id(session, job_id)
+    job.status = "running"
+    job.attempts = settings.JOB_MAX_ATTEMPTS
+    job.started_at = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS + 1)
+    session.add(job)
+    await session.commit()
+
+    monkeypatch.setattr(job_crud, "_next_abandoned_check", 0.0)
+    assert await process_next_job(session) is False
+
+    data = (await client.get(f"/api/jobs/{job_id}")).json()
+    assert data["status"] == "failed"
+    assert "stopped responding" in data["error"]
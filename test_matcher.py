@@ -0,0 +1,98 @@
+import random
+import time
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+from app.services.matcher import propose_matches
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_matcher.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def make_royalty(title: str) -> Royalty:
+    return Royalty(
+        account_identifier="acct",
+        book_title=title,
+        ebook_royalties="1.00",
+        print_royalties="0.00",
+        kenp_royalties="0.00",
+        total_royalties="1.00",
+        total_royalties_usd="1.00",
+    )
+
+def test_propose_matches_prefers_shared_rare_tokens():
+    portfolios = [(1, "01 - National Registry Paramedic Study Guide"), (2, "02 - Keto Cookbook"), (3, "03 - Sudoku Puzzles")]
+    royalties = [
+        (10, "National Registry Paramedic Study Guide: 500 Practice Questions", None),
+        (11, "The Easy Keto Cookbook for Beginners", None),
+        (12, "Sudoko Puzles Large Print", None),  # typos: matched through the trigram fallback
+        (13, "Unrelated Poetry Collection", None),
+    ]
+    proposals = {p.royalty_id: p.portfolio_id for p in propose_matches(royalties, portfolios, min_score=0.3)}
+    assert proposals == {10: 1, 11: 2, 12: 3}
+
+def test_propose_matches_scales_to_large_accounts():
+    rng = random.Random(1)
+    words = [f"word{i}" for i in range(3000)]
+    portfolios = [(i, " ".join(rng.sample(words, 3))) for i in range(3000)]
+    royalties = [(i, f"{portfolios[i % 3000][1]} {' '.join(rng.sample(words, 4))}", None) for i in range(5000)]
+
+    started = time.perf_counter()
+    proposals = propose_matches(royalties, portfolios, min_score=0.3)
+    assert time.perf_counter() - started < 1.0
+    assert len(proposals) > 0.9 * len(royalties)
+
+@pytest.mark.asyncio
+async def test_match_endpoint_applies_links(client: AsyncClient, session: AsyncSession):
+    session.add_all([
+        Portfolio(account_identifier="acct", portfolio_name="Keto Cookbook", spend="$1.00"),
+        Portfolio(account_identifier="acct", portfolio_name="Sudoku Puzzles", spend="$1.00"),
+        make_royalty("Keto Cookbook for Beginners"),
+        make_royalty("Sudoku Puzzles Volume 2"),
+    ])
+    await session.commit()
+
+    response = await client.post("/api/royalties/match", params={"account_identifier": "acct"})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert not any(p["applied"] for p in response.json())
+
+    response = await client.post("/api/royalties/match", params={"account_identifier": "acct", "apply": True})
+    assert all(p["applied"] for p in response.json())
+
+    response = await client.get("/api/royalties/")
+    assert all(r["portfolio_id"] is not None for r in response.json())
+
+    response = await client.post("/api/royalties/match", params={"account_identifier": "acct"})
+    assert response.json() == []
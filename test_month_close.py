@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import month_close_crud, royalty_crud, snapshot_crud
+from app.models.royalty import Royalty
+from app.services.month_close import close_due_month, seconds_until_next_close
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_month_close.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+async def add_snapshots(session: AsyncSession, account: str, values: list) -> None:
+    await snapshot_crud.record_snapshots(session, [
+        snapshot_crud.snapshot_row(account, item(title, total), captured_at) for title, total, captured_at in values
+    ])
+    await session.commit()
+
+async def last_month_values(session: AsyncSession) -> dict:
+    result = await session.exec(select(Royalty.account_identifier, Royalty.book_title, Royalty.last_month_royalty))
+    return {(account, title): value for account, title, value in result.all()}
+
+def test_month_boundaries_are_timezone_aware():
+    assert month_close_crud.month_cutoff("2026-09", "UTC") == datetime(2026, 10, 1)
+    assert month_close_crud.month_cutoff("2026-12", "UTC") == datetime(2027, 1, 1)
+    # Midnight in Los Angeles is 07:00 UTC during daylight saving time.
+    assert month_close_crud.month_cutoff("2026-09", "America/Los_Angeles") == datetime(2026, 10, 1, 7)
+    early = datetime(2026, 10, 1, 3, tzinfo=timezone.utc)
+    assert month_close_crud.previous_month(early, "UTC") == "2026-09"
+    assert month_close_crud.previous_month(early, "America/Los_Angeles") == "2026-08"
+    assert month_close_crud.previous_month(datetime(2027, 1, 5, tzinfo=timezone.utc), "UTC") == "2026-12"
+    assert seconds_until_next_close(datetime(2026, 10, 31, 23, 59, tzinfo=timezone.utc), "UTC") == 60 + 60
+
+@pytest.mark.asyncio
+async def test_close_month_sets_values_in_effect_at_month_end(session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 1), item("B", 2)])
+    await royalty_crud.upsert_royalty_data(session, "other", [item("C", 3)])
+    assert set((await last_month_values(session)).values()) == {None}
+    await add_snapshots(session, "acct", [
+        ("A", 5, datetime(2026, 9, 10)),
+        ("A", 12, datetime(2026, 9, 30, 23)),
+        ("A", 0.5, datetime(2026, 10, 1, 0, 30)),  # new month, after the cutoff
+        ("B", 7, datetime(2026, 10, 2)),
+    ])
+    await add_snapshots(session, "other", [("C", 9.25, datetime(2026, 8, 31))])
+
+    record = await month_close_crud.close_month(session, "2026-09", "UTC", batch_size=1)
+    assert (record.accounts, record.updated_titles, record.applied) == (2, 2, True)
+    assert await last_month_values(session) == {
+        ("acct", "A"): "12.00", ("acct", "B"): None, ("other", "C"): "9.25",
+    }
+
+    # Rerunning changes nothing; an older month is recorded but does not overwrite the newer close.
+    record = await month_close_crud.close_month(session, "2026-09", "UTC")
+    assert record.updated_titles == 0
+    record = await month_close_crud.close_month(session, "2026-08", "UTC")
+    assert record.applied is False
+    assert (await last_month_values(session))[("acct", "A")] == "12.00"
+
+    # Ingests no longer touch last_month_royalty.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 3), item("B", 2)])
+    assert (await last_month_values(session))[("acct", "A")] == "12.00"
+
+@pytest.mark.asyncio
+async def test_close_month_uses_unchanged_rows_without_snapshots(session: AsyncSession):
+    # Rows written before snapshots were recorded have no history at all.
+    session.add(Royalty(
+        account_identifier="acct", book_title="Legacy", ebook_royalties="4.40", print_royalties="0.00",
+        kenp_royalties="0.00", total_royalties="4.40", total_royalties_usd="4.40", updated_at=datetime(2026, 8, 1),
+    ))
+    session.add(Royalty(
+        account_identifier="acct", book_title="Touched", ebook_royalties="1.00", print_royalties="0.00",
+        kenp_royalties="0.00", total_royalties="1.00", total_royalties_usd="1.00", updated_at=datetime(2026, 10, 5),
+    ))
+    await session.commit()
+
+    record = await month_close_crud.close_month(session, "2026-09", "UTC")
+    assert record.updated_titles == 1
+    values = await last_month_values(session)
+    assert values[("acct", "Legacy")] == "4.40"
+    assert values[("acct", "Touched")] is None  # Written after the cutoff: its month-end value is unknown
+
+@pytest.mark.asyncio
+async def test_scheduler_closes_each_month_once(session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 1)])
+    await add_snapshots(session, "acct", [("A", 4, datetime(2026, 9, 15))])
+
+    record = await close_due_month(engine, now=datetime(2026, 10, 1, 0, 5, tzinfo=timezone.utc))
+    assert record.month == "2026-09"
+    assert record.updated_titles == 1
+    assert await close_due_month(engine, now=datetime(2026, 10, 20, tzinfo=timezone.utc)) is None
+    assert await month_close_crud.is_closed(session, "2026-09")
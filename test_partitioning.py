@@ -0,0 +1,69 @@
+import os
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from app.main import app  # noqa: F401  (registers every table)
+from app.db import partitioning
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+def test_partitioning_is_off_by_default():
+    assert not partitioning.PARTITIONED
+    assert [c.name for c in Royalty.__table__.primary_key] == ["id"]
+    assert [c.name for c in Portfolio.__table__.primary_key] == ["id"]
+    assert not Royalty.__table__.dialect_options["postgresql"]["partition_by"]
+
+def test_conversion_statements():
+    statements = partitioning.convert_to_partitioned(4)
+    assert "CREATE TABLE royalty_p3 PARTITION OF royalty_partitioned FOR VALUES WITH (MODULUS 4, REMAINDER 3)" in statements
+    assert "ALTER TABLE royalty ADD CONSTRAINT royalty_pkey PRIMARY KEY (id, account_identifier)" in statements
+    assert statements.index("DROP TABLE royalty") < statements.index("DROP TABLE portfolio")
+    assert statements[-1].startswith("ALTER TABLE royalty ADD CONSTRAINT royalty_portfolio_fkey")
+
+    statements = partitioning.convert_to_unpartitioned()
+    assert "ALTER TABLE portfolio ADD CONSTRAINT portfolio_pkey PRIMARY KEY (id)" in statements
+    assert not any("PARTITION" in statement for statement in statements)
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+@pytest.mark.asyncio
+async def test_postgres_account_queries_hit_one_partition():
+    pg_engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+    async with pg_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in partitioning.convert_to_partitioned(4):
+            await conn.execute(text(statement))
+        for index in range(40):
+            account = f"acct-{index % 8}"
+            portfolio_id = (await conn.execute(
+                insert(Portfolio).returning(Portfolio.id),
+                {"account_identifier": account, "portfolio_name": f"P{index}", "spend": "$0.00"},
+            )).scalar_one()
+            amounts = {field: "0.00" for field in (
+                "ebook_royalties", "print_royalties", "kenp_royalties", "total_royalties", "total_royalties_usd",
+            )}
+            await conn.execute(insert(Royalty), {
+                "account_identifier": account, "book_title": f"Title {index}", "portfolio_id": portfolio_id, **amounts,
+            })
+
+        plan = (await conn.execute(
+            text("EXPLAIN SELECT * FROM royalty WHERE account_identifier = 'acct-3'")
+        )).scalars().all()
+        scanned = {line.split(" on ")[1].split()[0] for line in plan if " on royalty_p" in line}
+        assert len(scanned) == 1
+
+        with pytest.raises(Exception):
+            # A royalty cannot point at another account's portfolio.
+            async with conn.begin_nested():
+                await conn.execute(text(
+                    "UPDATE royalty SET portfolio_id = (SELECT id FROM portfolio WHERE account_identifier = 'acct-1' LIMIT 1) "
+                    "WHERE account_identifier = 'acct-2'"
+                ))
+
+        for statement in partitioning.convert_to_unpartitioned():
+            await conn.execute(text(statement))
+        count = (await conn.execute(text("SELECT count(*) FROM royalty"))).scalar_one()
+        assert count == 40
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await pg_engine.dispose()
@@ -0,0 +1,183 @@
+import gzip
+import zlib
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.settings import settings
+from app.services.html_stream import parse_html_stream
+from app.services.ingest import (
+    extract_portfolio_rows, extract_portfolio_rows_from_tree, extract_royalty_rows, extract_royalty_rows_from_tree,
+)
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_raw_upload.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+ROYALTY_HTML = """
+<div class="ui items no-margin unstackable">
+    <div class="item">
+        <img src="cover.jpg">
+        <div class="truncate-overflow">
+            Raw Book Deluxe
+        </div>
+        <div class="sixteen wide computer column">
+            <div class="row">
+                <div class="right aligned column">$1.00</div>
+                <div class="right aligned column">$2.00</div>
+                <div class="right aligned column">$3.00</div>
+                <div class="right aligned column">$6.00</div>
+                <div class="right aligned column">$6.00</div>
+            </div>
+        </div>
+    </div>
+    <div class="item">
+        <img src="cover.jpg">
+        <div class="truncate-overflow">Raw Book Deluxe</div>
+        <div class="sixteen wide computer column">
+            <div class="row">
+                <div class="right aligned column">$1.50</div>
+                <div class="right aligned column">$0.00</div>
+                <div class="right aligned column">$0.00</div>
+                <div class="right aligned column">$1.50</div>
+                <div class="right aligned column">$1.50</div>
+            </div>
+        </div>
+    </div>
+    <div class="item">
+        <div class="truncate-overflow">Total</div>
+    </div>
+</div>
+"""
+
+PORTFOLIO_HTML = """
+<div>
+    <a data-e2e-id="entityNameRenderer" href="/cm/portfolios/1">Portfolio A</a>
+    <div data-e2e-id="tableCell_cell_spend"><div data-e2e-id="currencyRenderer">$10.00<br></div></div>
+</div>
+<div>
+    <a data-e2e-id="entityNameRenderer" href="/cm/portfolios/2">Portfolio B</a>
+    <div data-e2e-id="tableCell_cell_spend"><div data-e2e-id="currencyRenderer">$1,234.50</div></div>
+</div>
+"""
+
+def chunked(data: bytes, size: int = 7):
+    async def chunks():
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+    return chunks()
+
+@pytest.mark.asyncio
+async def test_tree_extractors_match_soup_extractors():
+    royalty_root = await parse_html_stream(chunked(ROYALTY_HTML.encode()), None, 1 << 20)
+    assert extract_royalty_rows_from_tree(royalty_root) == extract_royalty_rows(ROYALTY_HTML)
+    portfolio_root = await parse_html_stream(chunked(PORTFOLIO_HTML.encode()), None, 1 << 20)
+    assert extract_portfolio_rows_from_tree(portfolio_root) == extract_portfolio_rows(PORTFOLIO_HTML)
+
+@pytest.mark.asyncio
+async def test_raw_and_gzip_royalty_upload(client: AsyncClient):
+    response = await client.post(
+        "/api/royalties/parse",
+        params={"account_identifier": "raw_acct"},
+        content=ROYALTY_HTML.encode(),
+        headers={"Content-Type": "text/html; charset=utf-8"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["book_title"] == "Raw Book Deluxe"
+    assert data[0]["total_royalties_usd"] == "7.50"
+
+    response = await client.post(
+        "/api/royalties/parse",
+        content=gzip.compress(ROYALTY_HTML.replace("$1.50", "$2.50").encode()),
+        headers={"Content-Type": "text/html", "Content-Encoding": "gzip", "X-Account-Identifier": "raw_acct"},
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["total_royalties_usd"] == "8.50"
+
+@pytest.mark.asyncio
+async def test_upload_without_charset_is_read_as_utf8(client: AsyncClient):
+    response = await client.post(
+        "/api/royalties/parse",
+        params={"account_identifier": "utf8_acct"},
+        content=ROYALTY_HTML.replace("Raw Book Deluxe", "Café – Über Book").encode("utf-8"),
+        headers={"Content-Type": "text/html"},
+    )
+    assert response.status_code == 200
+    assert [r["book_title"] for r in response.json()] == ["Café – Über Book"]
+
+@pytest.mark.asyncio
+async def test_deflate_portfolio_upload(client: AsyncClient):
+    response = await client.post(
+        "/api/portfolios/parse_portfolios",
+        params={"account_identifier": "raw_acct"},
+        content=zlib.compress(PORTFOLIO_HTML.encode()),
+        headers={"Content-Type": "text/html", "Content-Encoding": "deflate"},
+    )
+    assert response.status_code == 200
+    assert [(p["portfolio_name"], p["spend"]) for p in response.json()] == [
+        ("Portfolio A", "$10.00"), ("Portfolio B", "$1,234.50"),
+    ]
+
+@pytest.mark.asyncio
+async def test_raw_upload_errors(client: AsyncClient, monkeypatch):
+    response = await client.post("/api/royalties/parse", content=b"<div></div>", headers={"Content-Type": "text/html"})
+    assert response.status_code == 400
+
+    response = await client.post(
+        "/api/royalties/parse",
+        params={"account_identifier": "raw_acct"},
+        content=b"\x00\x01",
+        headers={"Content-Type": "text/html", "Content-Encoding": "br"},
+    )
+    assert response.status_code == 415
+
+    # A small compressed body that inflates past the limit is cut off while decompressing.
+    monkeypatch.setattr(settings, "MAX_HTML_UPLOAD_BYTES", 1024)
+    response = await client.post(
+        "/api/royalties/parse",
+        params={"account_identifier": "raw_acct"},
+        content=gzip.compress(b"<div>" + b" " * 100000 + b"</div>"),
+        headers={"Content-Type": "text/html", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 413
+
+@pytest.mark.asyncio
+async def test_json_payload_still_accepted(client: AsyncClient):
+    response = await client.post(
+        "/api/royalties/parse", json={"accountIdentifier": "json_acct", "htmlContent": ROYALTY_HTML},
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["book_title"] == "Raw Book Deluxe"
+
+    response = await client.post("/api/royalties/parse", json={"accountIdentifier": "json_acct"})
+    assert response.status_code == 422
@@ -0,0 +1,163 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlalchemy import literal
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.core.amounts import parse_amount
+from app.crud import portfolio_crud, rollup_crud, royalty_crud
+from app.db import session as db_session
+from app.db.locks import lock_account
+from app.models.royalty import Royalty
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_rollups.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+@pytest.mark.asyncio
+async def test_rollups_follow_every_write_path(client: AsyncClient, session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$1,000.00"},
+        {"portfolio_name": "P2", "spend": "$5.50"},
+    ])
+    p1, p2 = [p.id for p in portfolios]
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10), item("B", 20), item("C", 30)])
+    a, b, c = [r.id for r in royalties]
+    assert await rollup_crud.check_rollups(session) == []
+
+    response = await client.patch(f"/api/royalties/{a}/link", json={"portfolio_id": p1})
+    assert response.status_code == 200
+    response = await client.post("/api/royalties/link_bulk", json={"links": [
+        {"royalty_id": b, "portfolio_id": p1},
+        {"royalty_id": c, "portfolio_id": p2},
+    ]})
+    assert response.status_code == 200
+    assert await rollup_crud.check_rollups(session) == []
+
+    # Changed values, a removed title and a moved link all adjust the portfolio totals.
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 15), item("C", 30), item("D", 1)])
+    await client.post("/api/royalties/unlink_bulk", json={"links": [{"royalty_id": c, "portfolio_id": p2}]})
+    await client.patch(f"/api/royalties/{c}/link", json={"portfolio_id": p1})
+    assert await rollup_crud.check_rollups(session) == []
+
+    response = await client.get("/api/dashboard/summary", params={"account_identifier": "acct"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["account"]["total_royalties_usd"] == 46.0
+    assert data["account"]["spend"] == 1005.5
+    assert data["account"]["title_count"] == 3
+    assert data["account"]["portfolio_count"] == 2
+    by_id = {p["portfolio_id"]: p for p in data["portfolios"]}
+    assert by_id[p1]["total_royalties_usd"] == 45.0
+    assert by_id[p1]["title_count"] == 2
+    assert by_id[p2]["total_royalties_usd"] == 0.0
+
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "$2.00"}])
+    assert await rollup_crud.check_rollups(session) == []
+
+@pytest.mark.asyncio
+async def test_rebuild_repairs_drift(client: AsyncClient, session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10)])
+    account = await rollup_crud.get_account_rollup(session, "acct")
+    account.total_royalties_usd = 999
+    session.add(account)
+    await session.commit()
+
+    assert len(await rollup_crud.check_rollups(session)) == 1
+    await rollup_crud.rebuild_rollups(session)
+    assert await rollup_crud.check_rollups(session) == []
+
+    response = await client.get("/api/dashboard/summary", params={"account_identifier": "missing"})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_link_with_stale_royalty_uses_current_row(session: AsyncSession):
+    portfolios = await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "P1", "spend": "$1.00"},
+        {"portfolio_name": "P2", "spend": "$1.00"},
+    ])
+    p1, p2 = [p.id for p in portfolios]
+    royalty_id = (await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10)]))[0].id
+    stale = await royalty_crud.get_royalty_by_id(session, royalty_id)
+
+    # Another request links the royalty after this one read it.
+    async with AsyncSession(engine) as other:
+        await royalty_crud.link_portfolio(other, await royalty_crud.get_royalty_by_id(other, royalty_id), p1)
+
+    linked = await royalty_crud.link_portfolio(session, stale, p2)
+    assert linked.portfolio_id == p2
+    assert await rollup_crud.check_rollups(session) == []
+
+@pytest.mark.asyncio
+async def test_rebuild_waits_for_concurrent_writers(session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(db_session, "_sqlite_writer", asyncio.Lock())
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10)])
+
+    async with AsyncSession(engine) as writer:
+        await lock_account(writer, "acct")
+        writer.add(Royalty(
+            account_identifier="acct", book_title="B", ebook_royalties="5.00", print_royalties="0.00",
+            kenp_royalties="0.00", total_royalties="5.00", total_royalties_usd="5.00",
+        ))
+        await writer.flush()
+        rebuild = asyncio.create_task(rollup_crud.rebuild_rollups(session))
+        await asyncio.sleep(0.1)
+        assert not rebuild.done()
+        await writer.commit()
+    assert await rebuild == (1, 0)
+
+    account = await rollup_crud.get_account_rollup(session, "acct")
+    assert (account.total_royalties_usd, account.title_count) == (15.0, 2)
+
+@pytest.mark.asyncio
+async def test_sql_amount_matches_parse_amount(client: AsyncClient, session: AsyncSession):
+    values = ["$1,234.56", "6.00", " 7 ", "-2.5", ".5", "", "N/A", "12abc", "1.2.3", "--"]
+    for value in values:
+        parsed = (await session.exec(select(rollup_crud.sql_amount(literal(value))))).one()
+        assert float(parsed) == parse_amount(value), value
+
+    # Malformed scraped values count as 0 in the rebuilt rollups and the analytics query alike.
+    p1 = (await portfolio_crud.upsert_portfolio_data(session, "acct", [{"portfolio_name": "P1", "spend": "N/A"}]))[0].id
+    royalties = await royalty_crud.upsert_royalty_data(session, "acct", [item("A", 10), {**item("B", 0), "totalRoyaltiesUSD": "--"}])
+    await royalty_crud.set_portfolio_links(session, {r.id: p1 for r in royalties})
+    assert await rollup_crud.check_rollups(session) == []
+    response = await client.get("/api/analytics/portfolios", params={"account_identifier": "acct"})
+    assert response.status_code == 200
@@ -0,0 +1,90 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.db.session import get_session
+from app.crud import portfolio_crud, royalty_crud, search_crud
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_search.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def item(title: str) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": "1.00",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": "1.00",
+        "totalRoyaltiesUSD": "1.00",
+    }
+
+async def search(client: AsyncClient, q: str, **params) -> list:
+    response = await client.get("/api/search", params={"account_identifier": "acct", "q": q, **params})
+    assert response.status_code == 200
+    return [(hit["kind"], hit["name"]) for hit in response.json()["results"]]
+
+@pytest.mark.asyncio
+async def test_substring_and_fuzzy_search(client: AsyncClient, session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [
+        item("Keto Cookbook for Beginners"), item("Mandala Coloring Book"), item("Paramedic Study Guide"),
+    ])
+    await portfolio_crud.upsert_portfolio_data(session, "acct", [
+        {"portfolio_name": "01 - Keto Cookbook", "spend": "$1.00"},
+        {"portfolio_name": "02 - Sudoku", "spend": "$1.00"},
+    ])
+    await royalty_crud.upsert_royalty_data(session, "other", [item("Keto Diet Other Account")])
+
+    assert await search(client, "KETO COOK") == [
+        ("portfolio", "01 - Keto Cookbook"), ("royalty", "Keto Cookbook for Beginners"),
+    ]
+    assert await search(client, "keto", kind="royalties") == [("royalty", "Keto Cookbook for Beginners")]
+    assert await search(client, "kb") == [("portfolio", "01 - Keto Cookbook"), ("royalty", "Keto Cookbook for Beginners")]
+
+    # Typos only match with fuzzy search.
+    assert await search(client, "paramedc studdy", fuzzy=False) == []
+    assert await search(client, "paramedc studdy") == [("royalty", "Paramedic Study Guide")]
+    assert await search(client, "xylophone") == []
+
+@pytest.mark.asyncio
+async def test_index_follows_writes(client: AsyncClient, session: AsyncSession):
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("Gardening Journal"), item("Fishing Log")])
+    assert await search(client, "journal") == [("royalty", "Gardening Journal")]
+
+    await royalty_crud.upsert_royalty_data(session, "acct", [item("Fishing Log")])
+    assert await search(client, "journal") == []
+
+    hits = await search_crud.search_titles(session, "acct", "fishing lgo")
+    assert [(hit.name, hit.score < 1) for hit in hits] == [("Fishing Log", True)]
+
+    response = await client.delete("/api/portfolios/portfolios/acct")
+    assert response.status_code == 202
+    response = await client.get("/api/search", params={"account_identifier": "acct", "q": "fishing"})
+    assert response.status_code == 404
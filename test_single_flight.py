@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app.services.single_flight import IngestCoalescer
+
+@pytest.mark.asyncio
+async def test_burst_runs_first_and_newest_only():
+    coalescer = IngestCoalescer()
+    release = asyncio.Event()
+    executed = []
+
+    def make_work(name):
+        async def work():
+            executed.append(name)
+            if name == "first":
+                await release.wait()
+            return name
+        return work
+
+    first = asyncio.create_task(coalescer.run("acct", make_work("first")))
+    await asyncio.sleep(0)
+    queued = [asyncio.create_task(coalescer.run("acct", make_work(f"payload-{i}"))) for i in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first == "first"
+    assert await asyncio.gather(*queued) == ["payload-2"] * 3
+    assert executed == ["first", "payload-2"]
+
+@pytest.mark.asyncio
+async def test_keys_are_independent_and_errors_propagate():
+    coalescer = IngestCoalescer()
+
+    async def fail():
+        raise ValueError("bad payload")
+
+    async def ok():
+        return "ok"
+
+    results = await asyncio.gather(coalescer.run("a", fail), coalescer.run("b", ok), return_exceptions=True)
+    assert isinstance(results[0], ValueError)
+    assert results[1] == "ok"
+    assert coalescer._running == {}
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_work():
+    coalescer = IngestCoalescer()
+    releases = {"first": asyncio.Event(), "older": asyncio.Event(), "newest": asyncio.Event()}
+    executed = []
+
+    def make_work(name):
+        async def work():
+            executed.append(name)
+            await releases[name].wait()
+            return name
+        return work
+
+    first = asyncio.create_task(coalescer.run("acct", make_work("first")))
+    await asyncio.sleep(0)
+    older = asyncio.create_task(coalescer.run("acct", make_work("older")))
+    newest = asyncio.create_task(coalescer.run("acct", make_work("newest")))
+    await asyncio.sleep(0)
+    releases["first"].set()
+    assert await first == "first"
+    await asyncio.sleep(0)
+    assert executed == ["first", "newest"]
+
+    # The caller whose payload is running goes away; the coalesced caller still gets the result.
+    newest.cancel()
+    await asyncio.sleep(0)
+    releases["newest"].set()
+    assert await older == "newest"
+    assert newest.cancelled()
+    assert executed == ["first", "newest"]
+    assert coalescer._running == {}
+
+@pytest.mark.asyncio
+async def test_runs_newest_caller_still_waiting_and_holds_cancelled_runner():
+    coalescer = IngestCoalescer()
+    releases = {name: asyncio.Event() for name in ("first", "older", "newest")}
+    executed = []
+    finished = []
+
+    def make_work(name):
+        async def work():
+            executed.append(name)
+            await releases[name].wait()
+            finished.append(name)
+            return name
+        return work
+
+    first = asyncio.create_task(coalescer.run("acct", make_work("first")))
+    await asyncio.sleep(0)
+    older = asyncio.create_task(coalescer.run("acct", make_work("older")))
+    newest = asyncio.create_task(coalescer.run("acct", make_work("newest")))
+    await asyncio.sleep(0)
+
+    # The newest caller leaves before its turn: its session is gone, so the older payload runs.
+    newest.cancel()
+    await asyncio.sleep(0)
+    releases["first"].set()
+    assert await first == "first"
+    await asyncio.sleep(0)
+    assert executed == ["first", "older"]
+
+    # The caller whose work is running is cancelled, but only returns once the work is done.
+    older.cancel()
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert not older.done()
+    releases["older"].set()
+    with pytest.raises(asyncio.CancelledError):
+        await older
+    assert finished == ["first", "older"]
+    assert coalescer._running == {} and coalescer._executing == {}
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app  # noqa: F401  (registers every table)
+from app.crud import royalty_crud
+from app.db import session as db_session
+from app.models.royalty import Royalty
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_sqlite_profile.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL)
+db_session.configure_sqlite(engine)
+
+@pytest_asyncio.fixture(name="tables")
+async def tables_fixture():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await engine.dispose()
+
+def item(title: str, total: float) -> dict:
+    return {
+        "bookTitle": title,
+        "eBookRoyalties": f"{total:.2f}",
+        "printRoyalties": "0.00",
+        "kenpRoyalties": "0.00",
+        "totalRoyalties": f"{total:.2f}",
+        "totalRoyaltiesUSD": f"{total:.2f}",
+    }
+
+@pytest.mark.asyncio
+async def test_pragmas_apply_to_every_connection(tables):
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+        assert (await conn.execute(text("PRAGMA cache_size"))).scalar() == -64 * 1024
+
+@pytest.mark.asyncio
+async def test_concurrent_ingests_queue_on_the_single_writer(tables):
+    async def ingest(account: str):
+        async with AsyncSession(engine) as session:
+            await royalty_crud.upsert_royalty_data(session, account, [item(f"T{n}", n) for n in range(50)])
+
+    await asyncio.gather(*[ingest(f"acct-{n}") for n in range(10)])
+    assert not db_session._sqlite_writer.locked()
+    async with AsyncSession(engine) as session:
+        rows = (await session.exec(select(Royalty.account_identifier))).all()
+    assert len(rows) == 500
+
+@pytest.mark.asyncio
+async def test_reads_do_not_wait_for_the_writer(tables):
+    async with AsyncSession(engine) as writer, AsyncSession(engine) as reader:
+        await db_session.acquire_writer(writer)
+        await db_session.acquire_writer(writer)  # reentrant within one transaction
+        assert db_session._sqlite_writer.locked()
+        await asyncio.wait_for(reader.exec(select(Royalty)), timeout=2)
+        await writer.rollback()
+        assert not db_session._sqlite_writer.locked()
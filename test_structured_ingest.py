@@ -0,0 +1,153 @@
+import gzip
+import json
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from app.main import app
+from app.api.ingest import _iter_lines
+from app.core.settings import settings
+from app.db.session import get_session
+from app.crud import deletion_crud, portfolio_crud, rollup_crud
+from app.models.portfolio import Portfolio
+from app.models.royalty import Royalty
+
+DATABASE_URL = "sqlite+aiosqlite:///./test_structured_ingest.db"
+engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def drop_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture():
+    await create_db_and_tables()
+    async with AsyncSession(engine) as session:
+        yield session
+    await drop_db_and_tables()
+
+@pytest_asyncio.fixture(name="client")
+async def client_fixture(session: AsyncSession):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+def royalty(title: str, total: float) -> dict:
+    return {"bookTitle": title, "eBookRoyalties": total, "totalRoyalties": total, "totalRoyaltiesUSD": total}
+
+@pytest.mark.asyncio
+async def test_json_batch_for_several_accounts(client: AsyncClient, session: AsyncSession):
+    response = await client.post("/api/ingest/v1", json={"accounts": [
+        {
+            "accountIdentifier": "acct-a",
+            "royalties": [royalty("Book", 1.5), royalty("Book", 2), royalty("Other", 3)],
+            "portfolios": [{"portfolio_name": "P1", "spend": 1000}, {"portfolio_name": "P1", "spend": 0.5}],
+        },
+        {"accountIdentifier": "acct-b", "royalties": [royalty("B Book", 4)]},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == 6
+    assert data["accounts"] == [
+        {"accountIdentifier": "acct-a", "royalties": 2, "portfolios": 1, "error": None},
+        {"accountIdentifier": "acct-b", "royalties": 1, "portfolios": None, "error": None},
+    ]
+
+    royalties = (await session.exec(select(Royalty).order_by(Royalty.account_identifier, Royalty.book_title))).all()
+    assert [(r.account_identifier, r.book_title, r.total_royalties_usd, r.ebook_royalties) for r in royalties] == [
+        ("acct-a", "Book", "3.50", "3.50"), ("acct-a", "Other", "3.00", "3.00"), ("acct-b", "B Book", "4.00", "4.00"),
+    ]
+    portfolio = (await session.exec(select(Portfolio))).one()
+    assert (portfolio.portfolio_name, portfolio.spend) == ("P1", "$1,000.50")
+    assert await rollup_crud.check_rollups(session) == []
+
+@pytest.mark.asyncio
+async def test_gzip_ndjson_replaces_account_rows(client: AsyncClient, session: AsyncSession):
+    lines = [
+        {"accountIdentifier": "acct-a", "royalties": [royalty("Old", 1)]},
+        {"accountIdentifier": "acct-b", "portfolios": []},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+    response = await client.post(
+        "/api/ingest/v1", content=gzip.compress(body.encode()),
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert [a["royalties"] for a in response.json()["accounts"]] == [1, None]
+
+    response = await client.post(
+        "/api/ingest/v1", content=json.dumps({"accountIdentifier": "acct-a", "royalties": [royalty("New", 2)]}),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    titles = (await session.exec(select(Royalty.book_title))).all()
+    assert titles == ["New"]
+
+@pytest.mark.asyncio
+async def test_strict_validation_writes_nothing(client: AsyncClient, session: AsyncSession):
+    # Unknown fields, numbers sent as strings and duplicate accounts are all rejected.
+    bad_batches = [
+        {"accounts": [{"accountIdentifier": "acct-a", "royalties": [{**royalty("Book", 1), "asin": "B00"}]}]},
+        {"accounts": [{"accountIdentifier": "acct-a", "royalties": [{**royalty("Book", 1), "totalRoyaltiesUSD": "1.00"}]}]},
+        {"accounts": [{"accountIdentifier": "acct-a"}, {"accountIdentifier": "acct-a"}]},
+        {"accounts": []},
+    ]
+    for batch in bad_batches:
+        response = await client.post("/api/ingest/v1", json=batch)
+        assert response.status_code == 422, batch
+
+    body = json.dumps({"accountIdentifier": "acct-a", "royalties": [royalty("Book", 1)]}) + "\n{\"accountIdentifier\": \"acct-b\", \"extra\": 1}\n"
+    response = await client.post("/api/ingest/v1", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 2, "extra"]
+    assert (await session.exec(select(Royalty))).all() == []
+
+@pytest.mark.asyncio
+async def test_ndjson_lines_split_across_chunks_and_are_capped(client: AsyncClient, session: AsyncSession, monkeypatch):
+    async def chunks():
+        for piece in (b'{"a"', b': 1}\n{"b": 2}\n', b"\n", b'{"c"', b"", b": 3}"):
+            yield piece
+
+    assert [line async for line in _iter_lines(chunks(), 100)] == [b'{"a": 1}', b'{"b": 2}', b"", b'{"c": 3}']
+
+    monkeypatch.setattr(settings, "MAX_INGEST_LINE_BYTES", 1024)
+    line = json.dumps({"accountIdentifier": "acct-a", "royalties": [royalty(f"Book {i}", i) for i in range(50)]})
+    response = await client.post("/api/ingest/v1", content=line + "\n", headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+    assert (await session.exec(select(Royalty))).all() == []
+
+@pytest.mark.asyncio
+async def test_batch_with_an_account_being_deleted_writes_nothing(client: AsyncClient, session: AsyncSession):
+    await deletion_crud.start_deletion(session, "acct-b")
+    response = await client.post("/api/ingest/v1", json={"accounts": [
+        {"accountIdentifier": "acct-a", "royalties": [royalty("Book", 1)]},
+        {"accountIdentifier": "acct-b", "royalties": [royalty("B Book", 2)]},
+    ]})
+    assert response.status_code == 409
+    assert (await session.exec(select(Royalty))).all() == []
+
+@pytest.mark.asyncio
+async def test_failed_account_is_reported_and_others_applied(client: AsyncClient, session: AsyncSession, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(portfolio_crud, "upsert_portfolio_data", fail)
+    response = await client.post("/api/ingest/v1", json={"accounts": [
+        {"accountIdentifier": "acct-a", "royalties": [royalty("Book", 1)]},
+        {"accountIdentifier": "acct-b", "royalties": [royalty("B Book", 2)], "portfolios": [{"portfolio_name": "P", "spend": 1}]},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["accounts"] == [
+        {"accountIdentifier": "acct-a", "royalties": 1, "portfolios": None, "error": None},
+        {"accountIdentifier": "acct-b", "royalties": 1, "portfolios": None, "error": "database went away"},
+    ]